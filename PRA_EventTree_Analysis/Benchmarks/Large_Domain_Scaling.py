@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Large_Domain_Scaling
+   :platform: Windows, Linux
+   :synopsis: Benchmark of grid post-processing time and memory by domain size
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Times the per-event grid post-processing of the branch scripts on
+synthetic MOD_FreeSurf2D output for domains that are the 200 x 70 study
+domain scaled by a factor in each direction. For each domain the solver
+output files are written to a scratch directory and then H.txt is read
+and masked, the face velocities are streamed in blocks of rows to the
+cell centers, and Topo.txt is read and rewritten. The best of REPEATS
+wall times and the peak traced memory in excess of the grids that are held
+for the event are reported with the log-log slope of time against cell
+count, which is about 1 for linear scaling. Before timing, the Grid_IO
+readers are checked against np.loadtxt on H.txt, U.txt, V.txt, and
+Topo.txt.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import sys
+import time
+import shutil
+import tempfile
+import tracemalloc
+import argparse
+import numpy as np
+# shared Flood Risk PRA modules are in the repository level Py_Modules
+#   directory.
+PY_MODULES_DIR = os.path.normpath( os.path.join( os.path.dirname(
+                    os.path.abspath( __file__ ) ), "..", "..", "Py_Modules" ) )
+if os.path.isdir( PY_MODULES_DIR ) and ( not PY_MODULES_DIR in sys.path ):
+    sys.path.append( PY_MODULES_DIR )
+# end if
+import Grid_IO as gio
+import Staggered_Grid as sgrid
+
+# parameters
+BASE_ROWS = 200
+BASE_COLS = 70
+SCALES = ( 1, 2, 4, 8, 16 )
+REPEATS = 3
+CHUNK_ROWS = 512
+DEPTH_CUTOFF = 0.01
+SOLVER_FMT = "%.6f\n"
+RNG_SEED = 31451
+OUT_CSV = "Large_Domain_Scaling.csv"
+
+
+# functions
+def writeSolverFiles( outDir, nRows, nCols ):
+    """Write synthetic solver output and Topo.txt for a domain.
+
+    Parameters
+    ----------
+    outDir : str
+        FQDN for the scratch directory.
+    nRows : int
+        Number of cell rows.
+    nCols : int
+        Number of cell columns.
+
+    Returns
+    -------
+    None.
+
+    """
+    # globals
+    global SOLVER_FMT, RNG_SEED
+    # start
+    RNG = np.random.default_rng( RNG_SEED )
+    for fName, numVals in [ [ "H.txt", nRows * nCols ],
+                            [ "U.txt", nRows * ( nCols + 1 ) ],
+                            [ "Hux.txt", nRows * ( nCols + 1 ) ],
+                            [ "V.txt", ( nRows + 1 ) * nCols ],
+                            [ "Hvy.txt", ( nRows + 1 ) * nCols ] ]:
+        Values = RNG.gamma( 0.5, 0.4, size=numVals )
+        gio.writeGrid( os.path.join( outDir, fName ),
+                       Values.reshape( ( -1, 1 ) ), cellFmt=SOLVER_FMT )
+    # end for
+    Topo = 90.0 + RNG.uniform( 0.0, 30.0, size=( nRows, nCols ) )
+    gio.writeGrid( os.path.join( outDir, "Topo.txt" ), Topo )
+    return
+
+
+def checkGridReads( runDir, nCols, chunkRows ):
+    """Check that the Grid_IO readers return the np.loadtxt values.
+
+    Parameters
+    ----------
+    runDir : str
+        FQDN for the directory with the solver output.
+    nCols : int
+        Number of cell columns.
+    chunkRows : int
+        Rows per block for iterGridRows.
+
+    Returns
+    -------
+    None.
+
+    Raises
+    ------
+    ValueError
+        If a reader does not return the np.loadtxt values.
+
+    """
+    # start
+    for fName, rowLen in [ [ "H.txt", nCols ], [ "U.txt", nCols + 1 ],
+                           [ "V.txt", nCols ], [ "Topo.txt", nCols ] ]:
+        inFile = os.path.join( runDir, fName )
+        for cType in [ np.float32, np.float64 ]:
+            RefVals = np.loadtxt( inFile, dtype=cType )
+            if not np.array_equal( gio.readGrid( inFile, dtype=cType ), RefVals ):
+                raise ValueError( "readGrid differs from np.loadtxt for %s" % inFile )
+            # end if
+            OutVals = gio.readGridInto( inFile, np.empty( RefVals.size, dtype=cType ) )
+            if not np.array_equal( OutVals, RefVals.reshape( -1 ) ):
+                raise ValueError( "readGridInto differs from np.loadtxt for %s" %
+                                  inFile )
+            # end if
+            OutVals = np.concatenate( list( gio.iterGridRows( inFile, rowLen,
+                                                chunkRows, dtype=cType ) ) )
+            if not np.array_equal( OutVals.reshape( -1 ), RefVals.reshape( -1 ) ):
+                raise ValueError( "iterGridRows differs from np.loadtxt for %s" %
+                                  inFile )
+            # end if
+        # end for
+    # end for
+    return
+
+
+def processEvent( runDir, nRows, nCols, chunkRows ):
+    """Grid post-processing for one event, as in processFlooding.
+
+    Parameters
+    ----------
+    runDir : str
+        FQDN for the directory with the solver output.
+    nRows : int
+        Number of cell rows.
+    nCols : int
+        Number of cell columns.
+    chunkRows : int
+        Rows per block for the face files.
+
+    Returns
+    -------
+    H : np.ndarray
+        ( nRows, nCols ) water depth.
+    UCell : np.ndarray
+        ( nRows, nCols ) x velocity.
+    VCell : np.ndarray
+        ( nRows, nCols ) y velocity.
+    Topo : np.ndarray
+        ( nRows, nCols ) topography.
+
+    """
+    # globals
+    global DEPTH_CUTOFF
+    # start
+    H = gio.readGridInto( os.path.join( runDir, "H.txt" ),
+                          np.empty( ( nRows, nCols ), dtype=np.float32 ) )
+    np.putmask( H, H <= DEPTH_CUTOFF, 0.0 )
+    UCell, VCell = sgrid.cellVelocityChunks(
+            gio.iterGridRows( os.path.join( runDir, "U.txt" ), nCols + 1, chunkRows ),
+            gio.iterGridRows( os.path.join( runDir, "Hux.txt" ), nCols + 1, chunkRows ),
+            gio.iterGridRows( os.path.join( runDir, "V.txt" ), nCols, chunkRows ),
+            gio.iterGridRows( os.path.join( runDir, "Hvy.txt" ), nCols, chunkRows ),
+            nRows, nCols, DEPTH_CUTOFF )
+    Topo = gio.readGrid( os.path.join( runDir, "Topo.txt" ), dtype=np.float64 )
+    gio.writeGrid( os.path.join( runDir, "Topo_Out.txt" ), Topo )
+    return H, UCell, VCell, Topo
+
+
+def benchDomain( scratchDir, scale, repeats, chunkRows ):
+    """Time and trace the post-processing for one scaled domain.
+
+    Parameters
+    ----------
+    scratchDir : str
+        FQDN for the scratch directory.
+    scale : int
+        Scale factor for the rows and columns of the study domain.
+    repeats : int
+        Number of timed repeats.
+    chunkRows : int
+        Rows per block for the face files.
+
+    Returns
+    -------
+    ResultDict : dict
+        Domain size, best time, and peak memory.
+
+    """
+    # globals
+    global BASE_ROWS, BASE_COLS
+    # start
+    nRows = BASE_ROWS * scale
+    nCols = BASE_COLS * scale
+    runDir = os.path.join( scratchDir, "S%03d" % scale )
+    os.makedirs( runDir, exist_ok=True )
+    writeSolverFiles( runDir, nRows, nCols )
+    checkGridReads( runDir, nCols, chunkRows )
+    AllTimes = list()
+    for _ in range( repeats ):
+        startTime = time.perf_counter()
+        processEvent( runDir, nRows, nCols, chunkRows )
+        AllTimes.append( time.perf_counter() - startTime )
+    # end for
+    tracemalloc.start()
+    EventGrids = processEvent( runDir, nRows, nCols, chunkRows )
+    peakBytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    fieldBytes = sum( [ x.nbytes for x in EventGrids ] )
+    shutil.rmtree( runDir, ignore_errors=True )
+    ResultDict = { "Scale" : scale, "Rows" : nRows, "Cols" : nCols,
+                   "Cells" : nRows * nCols, "Best_Time_s" : min( AllTimes ),
+                   "Time_per_MCell_s" : min( AllTimes ) / ( nRows * nCols / 1.0e6 ),
+                   "Field_MB" : fieldBytes / 1.0e6,
+                   "Peak_MB" : peakBytes / 1.0e6,
+                   "Overhead_MB" : ( peakBytes - fieldBytes ) / 1.0e6, }
+    return ResultDict
+
+
+def parseArgs( argList ):
+    """Parse the command line.
+
+    Parameters
+    ----------
+    argList : list
+        Command line arguments, usually sys.argv[1:].
+
+    Returns
+    -------
+    CmdArgs : argparse.Namespace
+        Parsed arguments.
+
+    """
+    # globals
+    global SCALES, REPEATS, CHUNK_ROWS, OUT_CSV
+    # start
+    Parser = argparse.ArgumentParser( description="Benchmark grid post-" \
+                                      "processing time and memory by domain size." )
+    Parser.add_argument( "--scales", type=int, nargs="+", default=list( SCALES ),
+                         help="Scale factors for the rows and columns of the " \
+                              "200 x 70 study domain." )
+    Parser.add_argument( "--repeats", type=int, default=REPEATS,
+                         help="Timed repeats for each domain." )
+    Parser.add_argument( "--chunk-rows", type=int, default=CHUNK_ROWS,
+                         help="Rows per block for the face files." )
+    Parser.add_argument( "--scratch", default=None,
+                         help="Scratch directory. Defaults to a temporary directory." )
+    Parser.add_argument( "--out", default=OUT_CSV, help="Output CSV file." )
+    return Parser.parse_args( argList )
+
+
+#standalone execution block
+if __name__ == "__main__":
+    CmdArgs = parseArgs( sys.argv[1:] )
+    if CmdArgs.scratch is None:
+        ScratchDir = tempfile.mkdtemp( prefix="FR-PRA_Bench_" )
+    else:
+        ScratchDir = os.path.normpath( os.path.abspath( CmdArgs.scratch ) )
+        os.makedirs( ScratchDir, exist_ok=True )
+    # end if
+    ResultList = list()
+    try:
+        for cScale in CmdArgs.scales:
+            ResultList.append( benchDomain( ScratchDir, cScale, CmdArgs.repeats,
+                                            CmdArgs.chunk_rows ) )
+            print( "%9d cells  %8.3f s  %6.3f s/Mcell  peak %8.1f MB  " \
+                   "overhead %7.1f MB" % ( ResultList[-1]["Cells"],
+                   ResultList[-1]["Best_Time_s"], ResultList[-1]["Time_per_MCell_s"],
+                   ResultList[-1]["Peak_MB"], ResultList[-1]["Overhead_MB"] ) )
+        # end for
+    finally:
+        if CmdArgs.scratch is None:
+            shutil.rmtree( ScratchDir, ignore_errors=True )
+        # end if
+    # end try
+    ColNames = list( ResultList[0].keys() )
+    with open( CmdArgs.out, 'w' ) as OF:
+        OF.write( "%s\n" % ",".join( ColNames ) )
+        for cResult in ResultList:
+            OF.write( "%s\n" % ",".join( [ str( cResult[x] ) for x in ColNames ] ) )
+        # end for
+    # end with
+    if len( ResultList ) > 1:
+        Cells = np.array( [ x["Cells"] for x in ResultList ], dtype=np.float64 )
+        Times = np.array( [ x["Best_Time_s"] for x in ResultList ], dtype=np.float64 )
+        slope = np.polyfit( np.log( Cells ), np.log( Times ), 1 )[0]
+        print( "log-log slope of time against cells: %5.3f" % slope )
+    # end if
+
+#EOF
@@ -3,12 +3,12 @@
 .. module:: Flooding_PRA
    :platform: Windows, Linux
    :synopsis: No Obstruction branch, inundation simulations
- 
+
 .. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
 
 Provides a Monte Carlo implementation to execute all inundation simulations
 for the No Obstruction branch of the event tree. This module is designed
-for parallelization by running independent Monte Carlo simulations, by 
+for parallelization by running independent Monte Carlo simulations, by
 future weather realization, on different computers.
 
 """
@@ -43,7 +43,29 @@ import sys
 import numpy as np
 #import scipy.stats as sstats
 import subprocess
+import atexit
 import shapely
+# shared Flood Risk PRA modules are in the repository level Py_Modules
+#   directory. These modules can also be copied next to this script.
+PY_MODULES_DIR = os.path.normpath( os.path.join( os.path.dirname(
+                    os.path.abspath( __file__ ) ), "..", "..", "..", "Py_Modules" ) )
+if os.path.isdir( PY_MODULES_DIR ) and ( not PY_MODULES_DIR in sys.path ):
+    sys.path.append( PY_MODULES_DIR )
+# end if
+import Run_Staging as rstage
+import Deck_Templates as dtempl
+import Grid_IO as gio
+import Field_Archive as farch
+import Results_Store as rstore
+import Event_Records as erec
+import Events_Cache as evc
+import Event_Plots as epl
+import Staggered_Grid as sgrid
+import Domain_Geometry as dgeom
+import Building_Inundation as binun
+import Building_Inventory as binv
+import Hazard_Stats as hstat
+import Hazard_Maps as hmap
 
 # parameters
 # 3,583 is the maximum realization + flood index count
@@ -52,13 +74,30 @@ import shapely
 START_REAL = 51
 END_REAL = 100
 MAX_REAL = 1000
+#   domain size. Replaced by NUMROWS and NUMCOLS from the input deck at the
+#   start of a run.
 NROWS = 200
 NCOLS = 70
+#   domain geometry from Domain_Geometry, built once from the input deck
+DOMAIN_GEOM = None
+#   building to grid cell incidence from Building_Inundation, built once
+#   from BUILDING_META or from the building inventory
+BUILD_INC = None
+#   building inventory workbook, with a "Buildings" sheet, or GeoJSON file
+#   relative to the working directory. If None, BUILDING_META and
+#   BUILDING_POLYS are used. The derived incidence is cached in
+#   BUILD_INC_CACHE_DIR, which defaults to next to the inventory when None.
+BUILD_INVENTORY = None
+BUILD_INC_CACHE_DIR = None
 DEPTH_CUTOFF = 0.01
 #   directories and file names
 IN_PRECIP_DIR = r'C:\Users\nicholas.martin\Documents\Flood_Risk_Model\Fr' \
                 r'io_Synthetic_Weather\Processed_Outputs'
 IN_PRE_XLSX = "All_Events_Summary-Processed.xlsx"
+#   indexed binary cache of the Events sheet. Made on first use in
+#   EVENTS_CACHE_DIR, which defaults to IN_PRECIP_DIR when None.
+USE_EVENTS_CACHE = True
+EVENTS_CACHE_DIR = None
 MOD_FILES_DIR = "Model_Files"
 SCRIPT_FILES_DIR = "Py_Scripts"
 INPUTS = "input.txt"
@@ -71,6 +110,66 @@ LOG_FILE = "FR-PRA_Log_R%04dto%04d.txt"
 RESULTS_DIR = "Results"
 V_FILE = "V.txt"
 U_FILE = "U.txt"
+MOD_EXE = "MOD_FreeSurf2D.exe"
+#   RAM-disk staging of per-event run directories. When USE_STAGING is True
+#   each event is run in its own directory under STAGE_ROOT, which defaults
+#   to /dev/shm when STAGE_ROOT is None. Only the files in RETAIN_FILES are
+#   copied to RESULTS_DIR, every FLUSH_BATCH events.
+USE_STAGING = False
+STAGE_ROOT = None
+FLUSH_BATCH = 20
+RETAIN_FILES = [ ]
+#   pre-staging of all event model input files with the stage command
+STAGE_DECKS_DIR = "Staged_Decks"
+STAGE_MANIFEST = "Stage_Manifest.csv"
+#   grid reading. Grids that do not change between events are memoized and,
+#   if GRID_SIDECAR is True, also cached as .npy files in GRID_CACHE_DIR,
+#   which defaults to next to the grid file when None.
+GRID_SIDECAR = False
+GRID_CACHE_DIR = None
+#   solver output faces are read and averaged to the cells in blocks of
+#   this many rows so that memory use is bounded for large domains
+GRID_CHUNK_ROWS = 512
+#   streaming per-cell hazard statistics over all events, saved in
+#   RESULTS_DIR. Saved statistics for other realization ranges are merged
+#   with Hazard_Stats.mergeReducerFiles.
+HAZARD_STATS = True
+HAZARD_STATS_FILE = "Hazard_Stats_R%04dto%04d.npz"
+HAZARD_REDUCER = None
+#   annual exceedance probability and return-period depth maps from the
+#   field archive with the hazard command, written to HAZARD_MAP_DIR in
+#   RESULTS_DIR. The annual maxima for START_REAL to END_REAL are saved in
+#   RESULTS_DIR for merging with those of other realizations. HAZARD_PROCS
+#   of None uses all CPUs. HAZARD_YEARS is the ( first year, last year )
+#   of every realization, the span of the synthetic weather events. None
+#   uses the span of the event dates in the field archive. GEO_ORIGIN is
+#   added to the model coordinates of the grids and GEO_PRJ is the
+#   projection WKT, if known.
+HAZARD_MAP_DIR = "Hazard_Maps"
+HAZARD_PROCS = None
+HAZARD_YEARS = ( 2024, 2065 )
+GEO_ORIGIN = ( 0.0, 0.0 )
+GEO_PRJ = None
+#   archive of the full H, U, and V fields for every event. Chunks are
+#   consolidated into memory-mappable files with the consolidate command,
+#   run once after all runs writing to the archive are done. The event
+#   maps are rendered from the archive with the render command.
+ARCHIVE_FIELDS = True
+FIELD_ARCHIVE_DIR = "Field_Archive"
+#   event map rendering with the render command. RENDER_PROCS of None uses
+#   all CPUs.
+PLOT_DPI = 600
+PREVIEW_DPI = 100
+RENDER_PROCS = None
+#   results output. The long-format table, one row per event and building,
+#   is always written to RESULTS_TABLE_DIR in RESULTS_DIR. The Excel
+#   workbook with one sheet per event is optional.
+RESULTS_TABLE_DIR = "Inundation_Table"
+RESULTS_TABLE_FMT = "parquet"
+WRITE_EXCEL = False
+#   event rows are streamed to disk during the run, STREAM_FLUSH events
+#   per segment file
+STREAM_FLUSH = 20
 #   obstruction location and information
 #   commented out for this branch.
 #OBS_LOC = ( [167,35], [167,36] )
@@ -80,11 +179,7 @@ U_FILE = "U.txt"
 #OBS_DEF_SEED = int( 62379 )
 #OBS_SAMPLER = None
 #OBS_GEV = sstats.genextreme( -0.1, loc=0, scale=0.5 )
-# tracking lists
-WATER_DEPTH_LIST = list()
-FLOOD_DEPTH_LIST = list()
-U_VEL_LIST = list()
-V_VEL_LIST = list()
+
 # inflow boundary information
 INFLOW_TOPO = { 28 : 111.667,
                 29 : 110.000,
@@ -300,153 +395,40 @@ def readRealizations( LogFile ):
     Returns
     -------
     RealDF : pd.DataFrame
-        Table that was worksheet with events.
+        Table that was worksheet with events. With the events cache, only
+        the events for START_REAL to END_REAL.
 
     """
     # imports
     import pandas as pd
     # globals
-    global IN_PRECIP_DIR, IN_PRE_XLSX
+    global IN_PRECIP_DIR, IN_PRE_XLSX, USE_EVENTS_CACHE, EVENTS_CACHE_DIR
+    global START_REAL, END_REAL
     # parameters
     # locals
     Infiler = os.path.normpath( os.path.join( IN_PRECIP_DIR, IN_PRE_XLSX ) )
+    if USE_EVENTS_CACHE:
+        try:
+            EvCache = evc.openEventsCache( Infiler, cacheDir=EVENTS_CACHE_DIR )
+            RealDF = evc.eventsFrame( evc.getRealRange( EvCache, START_REAL,
+                                                        END_REAL ) )
+            return RealDF
+        except OSError:
+            with open( LogFile, 'a' ) as LF:
+                LF.write( "Could not use events cache, reading %s \n" % Infiler )
+            # end with
+        # end try
+    # end if
     RealDF = pd.read_excel( Infiler, sheet_name="Events", header=0,
                             index_col=0, )
     return RealDF
 
 
-def adjustInflowBnds( inputFile, curDischarge, LogFile ):
-    """Adjust the inflow boundary condition specification to agree with discharge.
-
-    Parameters
-    ----------
-    inputFile : str
-        FQDN name for current inflow.
-    curDischarge : float
-        Discharge in cms.
-    LogFile : str
-        FQDN log file name.
-
-    Returns
-    -------
-    retStatus: 0 == success.
-
-    """
-    # imports
-    from copy import deepcopy
-    # globals
-    global INFLOW_TOPO, INFLOW_BOUND, NCOLS
-    # parameters
-    goodReturn = 0
-    badReturn = 1
-    KW_IN_VEL = "VELDYVEL"
-    KW_IN_DEP = "TDEPDYDEP"
-    CELL_LENGTH = 5.0
-    # locals
-    # start
-    # find the current inflow
-    NumBndSpec = len( INFLOW_BOUND )
-    bndIndex = -1
-    for iI in range( NumBndSpec ):
-        maxDischarge = INFLOW_BOUND[iI][0]
-        minDischarge = INFLOW_BOUND[iI][1]
-        if (curDischarge > minDischarge) and (curDischarge <= maxDischarge):
-            # then have found it
-            bndIndex = iI
-            break
-        # end if
-    # end for
-    # check
-    if bndIndex == -1:
-        # Then this is an error
-        errMsg = "Did not find boundary specification for discharge %6.2f!!!\n" % curDischarge
-        with open( LogFile, 'a' ) as LF:
-            LF.write( "%s" % errMsg )
-        # end if
-        return badReturn
-    # end if
-    # if made it here then need to read and process input file to set new
-    #   inflow boundaries.
-    with open( inputFile, 'r' ) as Inf:
-        AllLines = Inf.readlines()
-    # end with
-    OutLines = deepcopy( AllLines )
-    # now process
-    lCnt = 0
-    for tLine in AllLines:
-        stripLine = tLine.strip()
-        if len(stripLine) < 3:
-            lCnt += 1
-            continue
-        if stripLine[0] == "#":
-            lCnt += 1
-            continue
-        # end checks
-        if "=" in stripLine:
-            # see if need to process.
-            initSplit = stripLine.split("=")
-            if initSplit[0].strip() == KW_IN_DEP:
-                newDepths = [ 0.0 for x in range(NCOLS) ]
-                setLocs = INFLOW_BOUND[bndIndex][3]
-                numLocs = len( setLocs )
-                lowerDischarge = INFLOW_BOUND[bndIndex][1]
-                refElevation = INFLOW_BOUND[bndIndex][2]
-                topHeight = ( ( curDischarge - lowerDischarge) /
-                             ( float( numLocs ) * CELL_LENGTH * 1.0 ) )
-                adjElev = INFLOW_TOPO[setLocs[0]]
-                for cC in range(numLocs):
-                    if ( cC == 0 ) or ( cC == numLocs-1 ):
-                        newDepths[setLocs[cC]] = topHeight
-                    else:
-                        newDepths[setLocs[cC]]  = ( ( adjElev -
-                                                      INFLOW_TOPO[setLocs[cC]] )
-                                                    + topHeight )
-                    # end if
-                # end for
-                # make the new line
-                newLiner = "%s = " % KW_IN_DEP
-                for cC in range(NCOLS):
-                    newLiner += "%5.2f " % newDepths[cC]
-                # end for
-                newLiner += "\n"
-                # now assign
-                OutLines[lCnt] = newLiner
-                lCnt += 1
-            elif initSplit[0] == KW_IN_VEL:
-                newVels = [ 0.0 for x in range(NCOLS) ]
-                setLocs = INFLOW_BOUND[bndIndex][3]
-                for cC in setLocs:
-                    newVels[cC] = 1.0
-                # end for
-                # make the new line
-                newLiner = "%s = " % KW_IN_VEL
-                for cC in range(NCOLS):
-                    newLiner += "%5.2f " % newVels[cC]
-                # end for
-                newLiner += "\n"
-                # now assign
-                OutLines[lCnt] = newLiner
-                lCnt += 1
-            else:
-                lCnt += 1
-                continue
-            # end if
-        else:
-            lCnt += 1
-            continue
-        # end if
-    # end for
-    # now output the modified
-    with open( inputFile, 'w' ) as Inf:
-        Inf.writelines(OutLines)
-    # end with
-    # return
-    return goodReturn
-
-
-def adjustDepthandTopo( depFile, topoFile, curObs, LogFile ):
+def adjustDepthandTopo( depFile, topoFile, curObs, LogFile, DepBase=None,
+                        TopoBase=None ):
     """Adjust the water depth for the obstruction
 
+    Only the obstruction cells are patched into pre-rendered base grids.
 
     Parameters
     ----------
@@ -458,6 +440,12 @@ def adjustDepthandTopo( depFile, topoFile, curObs, LogFile ):
         Current obstruction depth as sampled from OBS_GEV
     LogFile : str
         String name for log file.
+    DepBase : dict, optional
+        Base depth grid from Grid_IO.makeGridBuffer. If None, then the
+        base depth grid is read from depFile. The default is None.
+    TopoBase : dict, optional
+        Base topography grid from Grid_IO.makeGridBuffer. If None, then
+        the base topography grid is read from topoFile. The default is None.
 
     Returns
     -------
@@ -480,8 +468,14 @@ def adjustDepthandTopo( depFile, topoFile, curObs, LogFile ):
     else:
         useObs = curObs
     # end if
-    newTopo = np.loadtxt( topoFile )
-    newH = np.loadtxt( depFile )
+    if ( DepBase is None ) or ( TopoBase is None ):
+        DepBase = gio.makeGridBuffer( gio.readGrid( depFile,
+                                                    dtype=np.float64 ) )
+        TopoBase = gio.makeGridBuffer( gio.readGrid( topoFile,
+                                                     dtype=np.float64 ) )
+    # end if
+    newTopo = TopoBase["grid"]
+    newH = DepBase["grid"]
     # check
     if ( newTopo.shape[0] != NROWS ) or ( newH.shape[0] != NROWS ):
         with open( LogFile, 'a' ) as LF:
@@ -496,46 +490,24 @@ def adjustDepthandTopo( depFile, topoFile, curObs, LogFile ):
         return badReturn
     # end if
     # if here then can process
-    existDepth1 = newH[OBS_LOC[0][0]-1, OBS_LOC[0][1]-1]
-    newDepth1 = existDepth1 - useObs
-    if newDepth1 <= 0.0:
-        newDepth1 = 0.0
-    # end if
-    newH[OBS_LOC[0][0]-1, OBS_LOC[0][1]-1] = newDepth1
-    existDepth2 = newH[OBS_LOC[1][0]-1, OBS_LOC[1][1]-1]
-    newDepth2 = existDepth2 - useObs
-    if newDepth2 <= 0.0:
-        newDepth2 = 0.0
-    # end if
-    newH[OBS_LOC[1][0]-1, OBS_LOC[1][1]-1] = newDepth2
-    existTopo1 = newTopo[OBS_LOC[0][0]-1, OBS_LOC[0][1]-1]
-    newTopo1 = existTopo1 + useObs
-    newTopo[OBS_LOC[0][0]-1, OBS_LOC[0][1]-1] = newTopo1
-    existTopo2 = newTopo[OBS_LOC[1][0]-1, OBS_LOC[1][1]-1]
-    newTopo2 = existTopo2 + useObs
-    newTopo[OBS_LOC[1][0]-1, OBS_LOC[1][1]-1] = newTopo2
-    # now write out depth
-    with open(depFile, 'w+') as OF:
-        for iI in range(NROWS):
-            for jJ in range(NCOLS):
-                OF.write('%6.2f   ' % newH[iI,jJ])
-            # end for
-            OF.write("\n")
-        # end for
+    obsRows = np.array( [ x[0]-1 for x in OBS_LOC ], dtype=np.int64 )
+    obsCols = np.array( [ x[1]-1 for x in OBS_LOC ], dtype=np.int64 )
+    newDepths = newH[obsRows, obsCols] - useObs
+    newDepths = np.where( newDepths <= 0.0, 0.0, newDepths )
+    newTopos = newTopo[obsRows, obsCols] + useObs
+    # now write out depth and topo
+    with open(depFile, 'wb') as OF:
+        OF.write( gio.patchGridCells( DepBase, obsRows, obsCols, newDepths ) )
     # end with
-    with open(topoFile, 'w+') as OF:
-        for iI in range(NROWS):
-            for jJ in range(NCOLS):
-                OF.write('%6.2f   ' % newTopo[iI,jJ])
-            # end for
-            OF.write("\n")
-        # end for
+    with open(topoFile, 'wb') as OF:
+        OF.write( gio.patchGridCells( TopoBase, obsRows, obsCols, newTopos ) )
     # end with
     # return
     return goodReturn
 
 
-def processFlooding( CWD, realNum, floodNum, curObs, curDis, LogFile ):
+def processFlooding( CWD, realNum, floodNum, curObs, curDis, LogFile,
+                     archiveDir=None, curDT=None ):
     """Determine flooding for this realization
 
     Parameters
@@ -552,172 +524,102 @@ def processFlooding( CWD, realNum, floodNum, curObs, curDis, LogFile ):
         Current input discharge
     LogFile : str
         Log file name.
+    archiveDir : str, optional
+        FQDN for the field archive directory. If None, the fields are not
+        archived. The default is None.
+    curDT : datetime-like, optional
+        Event date for the field archive. The default is None.
 
     Returns
     -------
-    inunDF : pd.DataFrame
+    BuildRec : np.ndarray
+        Inundation by building, Event_Records.BUILD_DTYPE records. Empty
+        on error.
+    MaxDict : dict
+        Event maximum water depth, flood depth, and velocities at the
+        buildings and over the domain.
 
     """
-    # imports
-    import pandas as pd
-    import matplotlib as mpl
-    import matplotlib.pyplot as plt
     # globals
     global TOPO, CALC_DEPTH, DEPTH_CUTOFF, NROWS, NCOLS, RESULTS_DIR
-    global NUM_BUILDS, BUILDING_META, BUILDING_POLYS, V_FILE, U_FILE
-    global FLOOD_DEPTH_LIST, U_VEL_LIST, V_VEL_LIST, WATER_DEPTH_LIST
+    global NUM_BUILDS, BUILDING_META, V_FILE, U_FILE
+    global GRID_SIDECAR, GRID_CACHE_DIR, DOMAIN_GEOM, INPUTS, BUILD_INC
+    global GRID_CHUNK_ROWS, HAZARD_REDUCER
     # parameters
     # locals
     # start
     cTopoFile = os.path.normpath( os.path.join( CWD, TOPO ) )
-    topo = np.loadtxt( cTopoFile, dtype=np.float32, )
+    # Topo.txt is rewritten for each event so is read each time
+    topo = gio.readGrid( cTopoFile, dtype=np.float32 )
     cDepFile = os.path.normpath( os.path.join( CWD, CALC_DEPTH ) )
-    H1Array = np.loadtxt( cDepFile, dtype=np.float32 )
-    H1Array = np.where( H1Array <= DEPTH_CUTOFF, 0.0, H1Array )
-    H = np.reshape( H1Array, (NROWS, NCOLS), order='C' ).copy()
-    # calculate inundation
-    InBuildDict = dict()
-    for cB in range(NUM_BUILDS):
-        cBId = BUILDING_META[cB][0]
-        cFoundElev = BUILDING_META[cB][1][0]
-        checkLocTuple = BUILDING_META[cB][1][1][2]
-        checkLocTopo = topo[checkLocTuple[0]-1, checkLocTuple[1]-1]
-        cFoundHeight = cFoundElev - checkLocTopo
-        cWaterDepth = H[checkLocTuple[0]-1, checkLocTuple[1]-1]
-        cInunDepth = cWaterDepth - cFoundHeight
-        if cInunDepth < 0.0:
-            cInunDepth = 0.0
+    H = gio.readGridInto( cDepFile, np.empty( ( NROWS, NCOLS ), dtype=np.float32 ) )
+    np.putmask( H, H <= DEPTH_CUTOFF, 0.0 )
+    # calculate inundation for all buildings at the check, perimeter, and
+    #   footprint cells
+    if BUILD_INC is None:
+        BUILD_INC = binun.metaIncidence( BUILDING_META, NROWS, NCOLS )
+    # end if
+    BuildRec = binun.inundationRecord( BUILD_INC, H, topo )
+    # cell center coordinates from the domain geometry, built on first use
+    if DOMAIN_GEOM is None:
+        DOMAIN_GEOM = dgeom.makeGeometry( os.path.join( CWD, INPUTS ),
+                            xIndexFile=os.path.join( CWD, "XINDEX.txt" ),
+                            yIndexFile=os.path.join( CWD, "YINDEX.txt" ),
+                            useSidecar=GRID_SIDECAR, sidecarDir=GRID_CACHE_DIR )
+    # end if
+    X_Pts = DOMAIN_GEOM["X"]
+    Y_Pts = DOMAIN_GEOM["Y"]
+    # need to get U and V, streamed in blocks of face rows
+    URows = gio.iterGridRows( os.path.join( CWD, U_FILE ), NCOLS + 1,
+                              GRID_CHUNK_ROWS )
+    HuxRows = gio.iterGridRows( os.path.join( CWD, "Hux.txt" ), NCOLS + 1,
+                                GRID_CHUNK_ROWS )
+    VRows = gio.iterGridRows( os.path.join( CWD, V_FILE ), NCOLS,
+                              GRID_CHUNK_ROWS )
+    HvyRows = gio.iterGridRows( os.path.join( CWD, "Hvy.txt" ), NCOLS,
+                                GRID_CHUNK_ROWS )
+    # mask dry faces and put on regular grid
+    plotU, plotV = sgrid.cellVelocityChunks( URows, HuxRows, VRows, HvyRows,
+                                             NROWS, NCOLS, DEPTH_CUTOFF )
+    # archive the full fields for this event
+    if not archiveDir is None:
+        retStatus = farch.initArchive( archiveDir, X_Pts, Y_Pts )
+        if retStatus != 0:
+            with open( LogFile, 'a' ) as LF:
+                LF.write( "Field archive %s has a different grid!!!\n" %
+                          archiveDir )
+            # end with
+            return erec.makeBuildRecord( 0 ), dict()
         # end if
-        # add to our output dictionary
-        InBuildDict[cBId] = [ checkLocTuple[0], checkLocTuple[1],
-                             checkLocTopo, cFoundElev, cFoundHeight,
-                             cWaterDepth, cInunDepth ]
-    # end for
-    # make a DataFrame
-    DataDict = { "Row" : np.array( [ InBuildDict[x][0] for x in range(1, NUM_BUILDS+1, 1) ], dtype=np.int32 ),
-                 "Column" : np.array( [ InBuildDict[x][1] for x in range(1, NUM_BUILDS+1, 1) ], dtype=np.int32 ),
-                 "Topo_m" : np.array( [ InBuildDict[x][2] for x in range(1, NUM_BUILDS+1, 1) ], dtype=np.float32 ),
-                 "FloorEl_m" : np.array( [ InBuildDict[x][3] for x in range(1, NUM_BUILDS+1, 1) ], dtype=np.float32 ),
-                 "FloorHeight_m" : np.array( [ InBuildDict[x][4] for x in range(1, NUM_BUILDS+1, 1) ], dtype=np.float32 ),
-                 "WaterDepth_m" : np.array( [ InBuildDict[x][5] for x in range(1, NUM_BUILDS+1, 1) ], dtype=np.float32 ),
-                 "FloodDepth_m" : np.array( [ InBuildDict[x][6] for x in range(1, NUM_BUILDS+1, 1) ], dtype=np.float32 ), }
-    InunDF = pd.DataFrame( index=[x for x in range(1, NUM_BUILDS+1, 1)], data=DataDict )
-    # make a plot
-    # make mesh grid
-    InFiler = os.path.normpath( os.path.join( CWD, "XINDEX.txt" ) )
-    XINDEX = np.loadtxt( InFiler, dtype=np.float32, )
-    InFiler = os.path.normpath( os.path.join( CWD, "YINDEX.txt" ) )
-    YINDEX = np.loadtxt( InFiler, dtype=np.float32, )
-    X_Pts = np.array( [ XINDEX[i] + ( 0.5*(XINDEX[i+1] - XINDEX[i]) )
-                        for i in range(NCOLS) ], dtype=np.float32)
-    Y_Pts = np.array( [ YINDEX[j] + ( 0.5*(YINDEX[j+1] - YINDEX[j]) )
-                        for j in range(NROWS) ], dtype=np.float32)
-    YV, XV = np.meshgrid( Y_Pts, X_Pts, indexing='ij' )
-    # need to get U and V
-    InFiler = os.path.normpath( os.path.join( CWD, U_FILE ) )
-    U1Array = np.loadtxt( InFiler, dtype=np.float32, )
-    InFiler = os.path.normpath( os.path.join( CWD, "Hux.txt" ) )
-    Hux1Array = np.loadtxt( InFiler, dtype=np.float32, )
-    Hux1Array = np.where( Hux1Array <= DEPTH_CUTOFF, 0.0, Hux1Array )
-    U1Array = np.where( Hux1Array <= DEPTH_CUTOFF, 0.0, U1Array )
-    InFiler = os.path.normpath( os.path.join( CWD, V_FILE ) )
-    V1Array = np.loadtxt( InFiler, dtype=np.float32, )
-    InFiler = os.path.normpath( os.path.join( CWD, "Hvy.txt" ) )
-    Hvy1Array = np.loadtxt( InFiler, dtype=np.float32, )
-    Hvy1Array = np.where( Hvy1Array <= DEPTH_CUTOFF, 0.0, Hvy1Array )
-    V1Array = np.where( Hvy1Array <= DEPTH_CUTOFF, 0.0, V1Array )
-    # put on regular grid
-    npU = np.zeros( (NROWS*NCOLS), dtype=np.float32 )
-    npV = np.zeros( (NROWS*NCOLS), dtype=np.float32 )
-    for iI in range( NROWS ):
-        for jJ in range(NCOLS):
-            cUm1 = ( ( iI * (NCOLS+1) ) + jJ )
-            cUp1 = ( ( iI * (NCOLS+1) ) + ( jJ+1 ) )
-            cVm1 = ( ( iI * NCOLS ) + jJ )
-            cVp1 = ( ( ( iI + 1 ) * NCOLS ) + jJ )
-            curNode = ( ( iI * NCOLS ) + jJ )
-            npU[curNode] = 0.5 * ( U1Array[cUm1] + U1Array[cUp1] )
-            npV[curNode] = 0.5 * ( V1Array[cVm1] + V1Array[cVp1] )
-        # end for
-    # end for
-    npU = np.where( np.abs( npU ) < 0.0001, 0.0, npU )
-    npV = np.where( np.abs( npV ) < 0.0001, 0.0, npV )
-    plotU = np.reshape( npU, (NROWS, NCOLS), order='C' ).copy()
-    plotV = np.reshape( npV, (NROWS, NCOLS), order='C' ).copy()
-    # contour intervals for water depth
-    CLevels = np.array( [x*0.5 for x in range(41)], dtype=np.float32 )
-    CLevels[0] = 0.01
-    # plot coordinates
-    xplotR = [ 100.0, 125.0, 150.0, 175.0, 200.0, 225.0, 250.0 ]
-    yplotR = [ 400.0, 500.0, 600.0, 700.0, 800.0, 900.0 ]
-    # output file name
-    OutFiler = "R%04d_Fl%02d_Focus_Area_WLVel.png" % ( realNum, floodNum )
-    OutFilePNG = os.path.normpath( os.path.join( CWD, RESULTS_DIR, OutFiler ) )
-    # plot
-    Fig1 = plt.figure()
-    Fig1.set_size_inches(5.0, 8.0)
-    ax11 = Fig1.add_subplot(1,1,1)
-    wd = ax11.contourf( XV, YV, H, levels=CLevels, cmap='Blues', vmin=0.01, vmax=20.0, zorder=20.0)
-    qv = ax11.quiver( XV[::3, 28:42:1], YV[::3, 28:42:1], plotU[::3, 28:42:1], plotV[::3, 28:42:1],
-                      headwidth=5, color='xkcd:tangerine', scale=30, zorder=50.0 )
-    ax11.set_ylabel( "Northing (m)", fontsize=10)
-    ax11.set_xlabel( "Easting (m)", fontsize=10)
-    ax11.set_xticks( xplotR )
-    ax11.set_yticks( yplotR )
-    cb = Fig1.colorbar( wd, ax=ax11, orientation='vertical',)
-    cb.ax.tick_params(labelsize=8)
-    cb.set_label( 'Water Depth (m)', fontsize=9 )
-    pCnt = 0
-    for tPoly in BUILDING_POLYS:
-        zLev = pCnt + 25.0
-        zAnno = pCnt + 50.0
-        pX, pY = tPoly.exterior.xy
-        cCCoords = tPoly.representative_point().coords[:][0]
-        labelstr = "%d" % (pCnt+1)
-        ax11.fill( pX, pY, edgecolor='xkcd:medium grey', facecolor='xkcd:medium grey', linewidth=1, zorder=zLev, alpha=1.0 )
-        ax11.text( cCCoords[0]-5.0, cCCoords[1]-5.0, labelstr, color='xkcd:cyan', fontsize=7, fontweight='normal', zorder=zAnno )
-        pCnt += 1
-    # end for
-    ax11.grid( visible=True, which='major', axis='y' )
-    ax11.set_xlim( (xplotR[0], xplotR[len(xplotR)-1]) )
-    ax11.set_ylim( (yplotR[0], yplotR[len(yplotR)-1]) )
-    ax11.tick_params(axis='both', which='major', labelsize=9)
-    ax11.xaxis.set_major_formatter( mpl.ticker.StrMethodFormatter( "{x:,.0f}" ) )
-    ax11.yaxis.set_major_formatter( mpl.ticker.StrMethodFormatter( "{x:,.0f}" ) )
-    Fig1.savefig( OutFilePNG, dpi=600 )
-    Fig1.clf()
-    plt.close(fig=Fig1)
-    # assign to our collation/summary tracking lists
-    WATER_DEPTH_LIST.append( float( InunDF["WaterDepth_m"].max() ) )
-    FLOOD_DEPTH_LIST.append( float( InunDF["FloodDepth_m"].max() ) )
-    U_VEL_LIST.append( float( npU.max() ) )
-    V_VEL_LIST.append( float( npV.max() ) )
+        farch.writeEventFields( archiveDir, realNum, floodNum, curDT, curDis,
+                                curObs, H, plotU, plotV )
+    # end if
+    # per-cell hazard statistics
+    if not HAZARD_REDUCER is None:
+        hstat.updateReducer( HAZARD_REDUCER, H, plotU, plotV )
+    # end if
+    # event maxima for the summary
+    MaxDict = { "Max_Water_Depth_m" : float( BuildRec["WaterDepth_m"].max() ),
+                "Max_Flood_Depth_m" : float( BuildRec["FloodDepth_m"].max() ),
+                "Max_U_mps" : float( plotU.max() ),
+                "Max_V_mps" : float( plotV.max() ), }
     # return
-    return InunDF
+    return BuildRec, MaxDict
 
 
-def outputSummary( CWD, ClRealList, FlIndList, DTList, PrecipList, DisList,
-                   ObsDepList, FloodDFList, LogFile ):
+def outputSummary( CWD, StreamDir, LogFile ):
     """Output the inundation and input configuration summary for these realizations.
 
+    The event rows streamed during the run are written to the results
+    table for this realization range one segment at a time and then the
+    stream is removed. The full table is only read for the Excel workbook.
+
     Parameters
     ----------
     CWD : str
         current working directory.
-    ClRealList : list
-        List of integers for climate realizations.
-    FlIndList : list
-        List of integers for flood indexes
-    DTList : list
-        List of pd.Timestamps for projected date of the flood.
-    PrecipList : list
-        List of floats for precipitation depth.
-    DisList : list
-        List of float discharges for scaled input discharge.
-    ObsDepList : list
-        List of floats for obstruction depth
-    FloodDFList : list of pd.DataFrame
-        List of DataFrames with the inundation summary
+    StreamDir : str
+        FQDN for the closed stream of event rows.
     LogFile : str
         FQDN for log file.
 
@@ -729,26 +631,34 @@ def outputSummary( CWD, ClRealList, FlIndList, DTList, PrecipList, DisList,
     # imports
     import pandas as pd
     # globals
-    global FLOOD_DEPTH_LIST, U_VEL_LIST, V_VEL_LIST, WATER_DEPTH_LIST
     global START_REAL, END_REAL
-    # globals
+    global RESULTS_TABLE_DIR, RESULTS_TABLE_FMT, WRITE_EXCEL
     # parameters
     # locals
     # start
+    # long-format table
+    TableDir = os.path.normpath( os.path.join( CWD, RESULTS_DIR, RESULTS_TABLE_DIR ) )
+    OutTable = rstore.writeStreamTable( StreamDir, TableDir, START_REAL, END_REAL,
+                                        reqFmt=RESULTS_TABLE_FMT )
+    shutil.rmtree( StreamDir, ignore_errors=True )
+    with open( LogFile, 'a' ) as LF:
+        LF.write( "Results table written to %s \n" % OutTable )
+    # end with
+    if not WRITE_EXCEL:
+        return
+    # end if
+    SummaryDF, FloodDFList = rstore.splitLongTable( rstore.readTableFile( OutTable ) )
+    if len( FloodDFList ) == 0:
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "No event rows so the Excel workbook is not written!!!\n" )
+        # end with
+        return
+    # end if
+    ClRealList = SummaryDF["Realization"].tolist()
+    FlIndList = SummaryDF["Flood Num."].tolist()
+    # output to Excel
     OutFiler = "R%04dto%04d_Flooding_Summary_All.xlsx" % (START_REAL, END_REAL )
     OutFP = os.path.normpath( os.path.join( CWD, RESULTS_DIR, OutFiler ) )
-    DataDict = { "Realization" : np.array( ClRealList, dtype=np.int32 ),
-                 "Flood Num." : np.array( FlIndList, dtype=np.int32 ),
-                 "Date" : DTList,
-                 "Precip_mm" : np.array( PrecipList, dtype=np.float32 ),
-                 "Discharge_cms" : np.array( DisList, dtype=np.float32 ),
-                 "Obstruction_Depth_m" : np.array( ObsDepList, dtype=np.float32 ),
-                 "Max_Water_Depth_m" : np.array( WATER_DEPTH_LIST, dtype=np.float32 ),
-                 "Max_Flood_Depth_m" : np.array( FLOOD_DEPTH_LIST, dtype=np.float32 ),
-                 "Max_U_mps" : np.array( U_VEL_LIST, dtype=np.float32 ),
-                 "Max_V_mps" : np.array( V_VEL_LIST, dtype=np.float32 ),}
-    SummaryDF = pd.DataFrame( data=DataDict )
-    # output to Excel
     writer = pd.ExcelWriter( OutFP )
     workbook  = writer.book
     format1 = workbook.add_format({'num_format': '#,##0.000'})
@@ -794,34 +704,47 @@ def outputSummary( CWD, ClRealList, FlIndList, DTList, PrecipList, DisList,
     return
 
 
-#standalone execution block
-# assumes that this module is executed within the same current directory
-# as the input file
-if __name__ == "__main__":
-    CWD = os.getcwd()
-    LogFile = os.path.normpath( os.path.join( CWD, LOG_FILE % ( START_REAL, END_REAL ) ) )
-    StartDT = dt.datetime.now()
-    with open( LogFile, 'w+' ) as LF:
-        LF.write( "Start of Flood Risk, Probabilistic Risk Assessment (PRA) - no blockages \n")
-        LF.write( "Start time: %s \n\n" % StartDT.strftime("%Y-%m-%d %H:%M"))
-    # end with
-    MFilesDir = os.path.normpath( os.path.join( CWD, MOD_FILES_DIR ) )
-    RealDF = readRealizations( LogFile )
-    # initialize tracking structures.
+def buildEventTable( RealDF, LogFile ):
+    """Make the table of events to simulate for START_REAL to END_REAL.
+
+    There is no obstruction for this branch so all obstruction depths
+    are 0.0.
+
+    Parameters
+    ----------
+    RealDF : pd.DataFrame
+        Table of events from readRealizations.
+    LogFile : str
+        FQDN log file name.
+
+    Returns
+    -------
+    EventDF : pd.DataFrame
+        One row per event with RealNum, FloodNum, DateTime, Precip_mm,
+        Discharge_cms, and Obstruction_Depth_m.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global START_REAL, END_REAL
+    # parameters
+    # locals
     ClRealList = list()
     FlIndList = list()
     DTList = list()
     PrecipList = list()
     DisList = list()
     ObsDepList = list()
-    FloodDFList = list()
-    # Now do by number of realizations
+    # start
+    # split by realization once; groups keep the worksheet order
+    RealGroups = { x : y for x, y in RealDF.groupby( "RealNum", sort=False ) }
     for rR in range(START_REAL, END_REAL+1):
-        # get the climate realization and use to set the seed and random sampler
+        # no obstruction sampling for this branch
         #curSeed = OBS_DEF_SEED + rR
-        #OBS_SAMPLER = np.random.RandomState( seed=curSeed )
+        #ObsSampler = np.random.RandomState( seed=curSeed )
         # get floods for only this realization
-        curRealDF = RealDF[RealDF["RealNum"] == rR].copy()
+        curRealDF = RealGroups.get( rR, RealDF.iloc[0:0] )
         # check to make sure that there are floods
         if len(curRealDF) <= 0:
             # log message
@@ -835,125 +758,891 @@ if __name__ == "__main__":
         # if made it here then have floods.
         flCnt = 1
         for indx, row in curRealDF.iterrows():
-            curInDischarge = float( row["Discharge_cms"] )
+            curObstruction = 0.0
             ClRealList.append( rR )
             FlIndList.append( flCnt )
             DTList.append( row["DateTime"] )
             PrecipList.append( float( row["Precip_mm"] ) )
-            DisList.append( curInDischarge )
-            # copy base files
-            srcFile = os.path.normpath( os.path.join( MFilesDir, INPUTS ) )
-            newInFile = os.path.normpath( os.path.join( CWD, INPUTS ) )
-            try:
-                oF = shutil.copyfile( srcFile, newInFile )
-            except:
-                OutStr = "Error copying file %s to %s !!!\n" % ( srcFile, newInFile )
-                with open( LogFile, 'a' ) as LF:
-                    LF.write("%s" % OutStr )
-                # end with
-                sys.exit([-1, OutStr])
-            # end try
-            srcFile = os.path.normpath( os.path.join( MFilesDir, DEPTH ) )
-            newDepFile = os.path.normpath( os.path.join( CWD, DEPTH ) )
-            try:
-                oF = shutil.copyfile( srcFile, newDepFile )
-            except:
-                OutStr = "Error copying file %s !!!\n" % DEPTH
-                with open( LogFile, 'a' ) as LF:
-                    LF.write("%s" % OutStr )
-                # end with
-                sys.exit([-1, OutStr])
-            # end try
-            srcFile = os.path.normpath( os.path.join( MFilesDir, TOPO ) )
-            newTopoFile = os.path.normpath( os.path.join( CWD, TOPO ) )
-            try:
-                oF = shutil.copyfile( srcFile, newTopoFile )
-            except:
-                OutStr = "Error copying file %s !!!\n" % TOPO
-                with open( LogFile, 'a' ) as LF:
-                    LF.write("%s" % OutStr )
-                # end with
-                sys.exit([-1, OutStr])
-            # end try
-            srcFile = os.path.normpath( os.path.join( MFilesDir, MANN ) )
-            dstFile = os.path.normpath( os.path.join( CWD, MANN ) )
-            try:
-                oF = shutil.copyfile( srcFile, dstFile )
-            except:
-                OutStr = "Error copying file %s !!!\n" % MANN
-                with open( LogFile, 'a' ) as LF:
-                    LF.write("%s" % OutStr )
-                # end with
-                sys.exit([-1, OutStr])
-            # end try
-            # update the input file for the new discharge.
-            retStatus = adjustInflowBnds( newInFile, curInDischarge, LogFile )
-            if retStatus != 0:
-                # then there was an error
-                with open( LogFile, 'a' ) as LF:
-                    OutStr = "Error in realization %d writing inflow boundary!!!\n" % rR
-                    LF.write( "%s" % OutStr )
-                # end with
-                sys.exit([-1, OutStr])
-            # end if
-            # get the current obstruction depth and set the seed for this realization
-            curObstruction = 0.0
-            #curObstruction = float( OBS_GEV.rvs( size=1,
-            #                                     random_state=OBS_SAMPLER )[0] )
-            #if curObstruction < 0.0:
-            #    curObstruction = 0.0
-            # end if
+            DisList.append( float( row["Discharge_cms"] ) )
             ObsDepList.append( curObstruction )
-            # write entry to the log file
-            with open( LogFile, 'a' ) as LF:
-                LF.write( "Climate realization %d, flood index %d, obstruction " \
-                          "depth %5.2f, discharge %6.2f \n" %
-                          (rR, flCnt, curObstruction, curInDischarge) )
-            # end with
-            # modify the depth file to reflect the obstruction
-            #retStatus = adjustDepthandTopo( newDepFile, newTopoFile,
-            #                                curObstruction, LogFile )
-            #if retStatus != 0:
-            #    # then there was an error
-            #    with open( LogFile, 'a' ) as LF:
-            #        OutStr = "Error in realization %d writing updated topo" \
-            #                 " and depth!!!\n" % rR
-            #        LF.write( "%s" % OutStr )
-            #    # end with
-            #    sys.exit([-1, OutStr])
-            ## end if
-            # now run
-            runResult = subprocess.run( ["MOD_FreeSurf2D.exe"], shell=True,
-                                        capture_output=True, text=True, )
-            if runResult.returncode != 0:
-                # then there was an error
-                with open( LogFile, 'a' ) as LF:
-                    LF.write( "%s\n\n" % print(runResult.stdout) )
-                    LF.write( "%s\n\n" % print(runResult.stderr) )
-                # end with
-                sys.exit([-1, "Error in MOD_FreeSurf2D execution"])
-            # end if
-            # process results
-            curFloodDF = processFlooding( CWD, rR, flCnt, curObstruction,
-                                          curInDischarge, LogFile )
-            if len( curFloodDF ) <= 0:
-                # then there was an error
-                with open( LogFile, 'a' ) as LF:
-                    OutStr = "Error in climate realization %d, flood index %d " \
-                             "collating outputs!!!\n" % (rR, flCnt)
-                    LF.write( "%s" % OutStr )
-                # end with
-                sys.exit([-1, OutStr])
-            # end if
-            # add to the tracking list
-            FloodDFList.append( curFloodDF )
-            # increment the counter
             flCnt += 1
         # end of flood index for
     # end of climate realization for
+    DataDict = { "RealNum" : np.array( ClRealList, dtype=np.int32 ),
+                 "FloodNum" : np.array( FlIndList, dtype=np.int32 ),
+                 "DateTime" : pd.to_datetime( pd.Series( DTList, dtype=object ) ),
+                 "Precip_mm" : np.array( PrecipList, dtype=np.float64 ),
+                 "Discharge_cms" : np.array( DisList, dtype=np.float64 ),
+                 "Obstruction_Depth_m" : np.array( ObsDepList, dtype=np.float64 ), }
+    EventDF = pd.DataFrame( data=DataDict )
+    # return
+    return EventDF
+
+
+def validateEvents( EventDF, DepBase, TopoBase, LogFile ):
+    """Check all event inputs before any simulation.
+
+    Checks that every discharge is covered by INFLOW_BOUND, that the
+    inflow boundary columns are in the domain, that obstruction depths are
+    finite and not negative, and that the base depth and topography grids
+    have NROWS by NCOLS cells. All problems are written to the log file.
+
+    Parameters
+    ----------
+    EventDF : pd.DataFrame
+        Events table from buildEventTable or readStagedEvents.
+    DepBase : dict
+        Base depth grid from Grid_IO.makeGridBuffer.
+    TopoBase : dict
+        Base topography grid from Grid_IO.makeGridBuffer.
+    LogFile : str
+        FQDN log file name.
+
+    Returns
+    -------
+    numBad : int
+        Number of problems found, 0 == all valid.
+
+    """
+    # imports
+    # globals
+    global INFLOW_BOUND, NROWS, NCOLS
+    # parameters
+    # locals
+    numBad = 0
+    ErrList = list()
+    # start
+    for gName, gBase in [ [ DEPTH, DepBase ], [ TOPO, TopoBase ] ]:
+        if gBase["grid"].shape != ( NROWS, NCOLS ):
+            ErrList.append( "Grid %s has shape %s instead of (%d, %d)!!!\n" %
+                            ( gName, str( gBase["grid"].shape ), NROWS, NCOLS ) )
+        # end if
+    # end for
+    curDis = EventDF["Discharge_cms"].to_numpy( dtype=np.float64 )
+    inBound = np.zeros( len( curDis ), dtype=bool )
+    for iI in range( len( INFLOW_BOUND ) ):
+        inBound |= ( ( curDis > INFLOW_BOUND[iI][1] ) &
+                     ( curDis <= INFLOW_BOUND[iI][0] ) )
+    # end for
+    curObs = EventDF["Obstruction_Depth_m"].to_numpy( dtype=np.float64 )
+    goodObs = np.isfinite( curObs ) & ( curObs >= 0.0 )
+    RealArray = EventDF["RealNum"].to_numpy()
+    FloodArray = EventDF["FloodNum"].to_numpy()
+    for iI in range( len( INFLOW_BOUND ) ):
+        if max( INFLOW_BOUND[iI][3] ) >= NCOLS:
+            ErrList.append( "Inflow boundary %d has columns outside of the " \
+                            "%d domain columns!!!\n" % ( iI, NCOLS ) )
+        # end if
+    # end for
+    for iI in np.flatnonzero( ~inBound ):
+        ErrList.append( "Climate realization %d, flood index %d, discharge " \
+                        "%6.2f has no boundary specification!!!\n" %
+                        ( RealArray[iI], FloodArray[iI], curDis[iI] ) )
+    # end for
+    for iI in np.flatnonzero( ~goodObs ):
+        ErrList.append( "Climate realization %d, flood index %d, obstruction " \
+                        "depth %s is invalid!!!\n" %
+                        ( RealArray[iI], FloodArray[iI], str( curObs[iI] ) ) )
+    # end for
+    numBad = len( ErrList )
+    if numBad > 0:
+        with open( LogFile, 'a' ) as LF:
+            LF.writelines( ErrList )
+        # end with
+    # end if
+    # return
+    return numBad
+
+
+def renderEventDeck( RunDir, curDischarge, curObs, DeckTemplates, DepBase,
+                     TopoBase, LogFile ):
+    """Write the complete set of model input files for one event.
+
+    Parameters
+    ----------
+    RunDir : str
+        FQDN for the run directory.
+    curDischarge : float
+        Input discharge in cms.
+    curObs : float
+        Obstruction depth.
+    DeckTemplates : dict
+        Model files held in memory, from Deck_Templates.loadDeckTemplates.
+    DepBase : dict
+        Base depth grid from Grid_IO.makeGridBuffer.
+    TopoBase : dict
+        Base topography grid from Grid_IO.makeGridBuffer.
+    LogFile : str
+        FQDN log file name.
+
+    Returns
+    -------
+    retStatus : int
+        0 == success, anything else is failure
+
+    """
+    # imports
+    # globals
+    global INFLOW_BOUND, INFLOW_TOPO, NCOLS, INPUTS, DEPTH, TOPO, MANN
+    # parameters
+    goodReturn = 0
+    badReturn = 1
+    # locals
+    # start
+    # render the input file for the new discharge.
+    retStatus, InDeckStr = dtempl.renderInputDeck( DeckTemplates,
+                                curDischarge, INFLOW_BOUND, INFLOW_TOPO, NCOLS )
+    if retStatus != 0:
+        errMsg = "Did not find boundary specification for discharge %6.2f!!!\n" % curDischarge
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "%s" % errMsg )
+        # end with
+        return badReturn
+    # end if
+    # write the model files from memory; Mann.txt never changes
+    newInFile = os.path.normpath( os.path.join( RunDir, INPUTS ) )
+    try:
+        with open( newInFile, 'w' ) as OF:
+            OF.write( InDeckStr )
+        # end with
+        dtempl.placeStatic( DeckTemplates, MANN, RunDir )
+        # depth and topo are not modified for this branch
+        dtempl.writeTemplateFile( DeckTemplates, DEPTH, RunDir )
+        dtempl.writeTemplateFile( DeckTemplates, TOPO, RunDir )
+    except OSError:
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Error writing model files to %s !!!\n" % RunDir )
+        # end with
+        return badReturn
+    # end try
+    # return
+    return goodReturn
+
+
+def stageEvents( EventDF, StageDir, DeckTemplates, DepBase, TopoBase,
+                 manifestOnly, LogFile ):
+    """Validate and pre-stage the model input files for all events.
+
+    A run directory with the complete, ready to run, model input files
+    is rendered for every event in StageDir. The manifest, STAGE_MANIFEST,
+    lists each event with its discharge, boundary specification index,
+    obstruction depth, and run directory name. The manifest is written
+    last so that its presence means that staging is complete.
+
+    Parameters
+    ----------
+    EventDF : pd.DataFrame
+        Events table from buildEventTable.
+    StageDir : str
+        FQDN for the staging directory.
+    DeckTemplates : dict
+        Model files held in memory, from Deck_Templates.loadDeckTemplates.
+    DepBase : dict
+        Base depth grid from Grid_IO.makeGridBuffer.
+    TopoBase : dict
+        Base topography grid from Grid_IO.makeGridBuffer.
+    manifestOnly : bool
+        Only write the manifest of per-event changes. Run directories are
+        then rendered from the manifest when the events are run.
+    LogFile : str
+        FQDN log file name.
+
+    Returns
+    -------
+    retStatus : int
+        0 == success, anything else is failure
+
+    """
+    # imports
+    # globals
+    global INFLOW_BOUND, STAGE_MANIFEST
+    # parameters
+    goodReturn = 0
+    badReturn = 1
+    # locals
+    # start
+    numBad = validateEvents( EventDF, DepBase, TopoBase, LogFile )
+    if numBad > 0:
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Staging stopped, %d invalid inputs!!!\n" % numBad )
+        # end with
+        return badReturn
+    # end if
+    os.makedirs( StageDir, exist_ok=True )
+    ManDF = EventDF.copy()
+    ManDF["BndIndex"] = [ dtempl.findBndIndex( x, INFLOW_BOUND ) for x in
+                          ManDF["Discharge_cms"].to_numpy() ]
+    EvDirList = list()
+    for indx, row in ManDF.iterrows():
+        if manifestOnly:
+            EvDirList.append( "" )
+            continue
+        # end if
+        EvName = "R%04d_Fl%02d" % ( row["RealNum"], row["FloodNum"] )
+        EvDir = os.path.normpath( os.path.join( StageDir, EvName ) )
+        os.makedirs( EvDir, exist_ok=True )
+        retStatus = renderEventDeck( EvDir, float( row["Discharge_cms"] ),
+                                     float( row["Obstruction_Depth_m"] ),
+                                     DeckTemplates, DepBase, TopoBase, LogFile )
+        if retStatus != 0:
+            with open( LogFile, 'a' ) as LF:
+                LF.write( "Error staging %s !!!\n" % EvName )
+            # end with
+            return badReturn
+        # end if
+        EvDirList.append( EvName )
+    # end for
+    ManDF["EventDir"] = EvDirList
+    ManDF.to_csv( os.path.normpath( os.path.join( StageDir, STAGE_MANIFEST ) ),
+                  index=False )
+    with open( LogFile, 'a' ) as LF:
+        LF.write( "Staged %d events in %s \n" % ( len( ManDF ), StageDir ) )
+    # end with
+    # return
+    return goodReturn
+
+
+def readStagedEvents( StageDir, LogFile ):
+    """Read the events for START_REAL to END_REAL from a staging manifest.
+
+    Parameters
+    ----------
+    StageDir : str
+        FQDN for the staging directory.
+    LogFile : str
+        FQDN log file name.
+
+    Returns
+    -------
+    EventDF : pd.DataFrame
+        Events table with the manifest columns. Empty if the manifest
+        could not be read.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global START_REAL, END_REAL, STAGE_MANIFEST
+    # start
+    InFiler = os.path.normpath( os.path.join( StageDir, STAGE_MANIFEST ) )
+    if not os.path.isfile( InFiler ):
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Staging manifest %s does not exist!!!\n" % InFiler )
+        # end with
+        return pd.DataFrame()
+    # end if
+    ManDF = pd.read_csv( InFiler, parse_dates=["DateTime"],
+                         keep_default_na=False )
+    EventDF = ManDF[( ManDF["RealNum"] >= START_REAL ) &
+                    ( ManDF["RealNum"] <= END_REAL )].copy()
+    EventDF.reset_index( drop=True, inplace=True )
+    # return
+    return EventDF
+
+
+def copyStagedDeck( EvDir, RunDir, DeckTemplates, LogFile ):
+    """Copy a staged, ready to run, set of model input files to a run directory.
+
+    Parameters
+    ----------
+    EvDir : str
+        FQDN for the staged event directory.
+    RunDir : str
+        FQDN for the run directory.
+    DeckTemplates : dict
+        Model files held in memory, from Deck_Templates.loadDeckTemplates.
+    LogFile : str
+        FQDN log file name.
+
+    Returns
+    -------
+    retStatus : int
+        0 == success, anything else is failure
+
+    """
+    # globals
+    global INPUTS, DEPTH, TOPO, MANN
+    # parameters
+    goodReturn = 0
+    badReturn = 1
+    # start
+    try:
+        for tName in [ INPUTS, DEPTH, TOPO ]:
+            shutil.copyfile( os.path.join( EvDir, tName ),
+                             os.path.join( RunDir, tName ) )
+        # end for
+        dtempl.placeStatic( DeckTemplates, MANN, RunDir )
+    except OSError:
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Error copying staged files from %s !!!\n" % EvDir )
+        # end with
+        return badReturn
+    # end try
+    # return
+    return goodReturn
+
+
+def renderPlots( CWD, RealNums, minFloodDepth, preview, numProcs, LogFile ):
+    """Render the event maps for START_REAL to END_REAL from the field
+    archive.
+
+    Parameters
+    ----------
+    CWD : str
+        Current working directory.
+    RealNums : list
+        Realizations to render. If None, all realizations.
+    minFloodDepth : float
+        Render only events with a maximum flood depth at the buildings
+        greater than this. If None, all events.
+    preview : bool
+        Render at PREVIEW_DPI instead of PLOT_DPI.
+    numProcs : int
+        Number of worker processes. If None, RENDER_PROCS.
+    LogFile : str
+        Log file name.
+
+    Returns
+    -------
+    retStatus : int
+        0 == success, 1 == failure.
+
+    """
+    # globals
+    global START_REAL, END_REAL, RESULTS_DIR, RESULTS_TABLE_DIR
+    global FIELD_ARCHIVE_DIR, BUILDING_POLYS, PLOT_DPI, PREVIEW_DPI
+    global RENDER_PROCS, BUILD_INVENTORY
+    # parameters
+    goodReturn = 0
+    badReturn = 1
+    # start
+    TableDir = os.path.normpath( os.path.join( CWD, RESULTS_DIR, RESULTS_TABLE_DIR ) )
+    ArchiveDir = os.path.normpath( os.path.join( CWD, FIELD_ARCHIVE_DIR ) )
+    OutDir = os.path.normpath( os.path.join( CWD, RESULTS_DIR ) )
+    EventDF = rstore.readResultsTable( TableDir, startReal=START_REAL,
+                                       endReal=END_REAL,
+                                       columns=[ "Realization", "Flood_Num",
+                                                 "Max_Flood_Depth_m" ] )
+    if len( EventDF ) == 0:
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "No results in %s to render!!!\n" % TableDir )
+        # end with
+        return badReturn
+    # end if
+    EventKeys = epl.selectEvents( EventDF, RealNums=RealNums,
+                                  minFloodDepth=minFloodDepth )
+    plotDPI = PREVIEW_DPI if preview else PLOT_DPI
+    if numProcs is None:
+        numProcs = RENDER_PROCS
+    # end if
+    BuildPolys = BUILDING_POLYS
+    if not BUILD_INVENTORY is None:
+        try:
+            BuildPolys = binv.readInventory( os.path.join( CWD,
+                                             BUILD_INVENTORY ) )["polys"]
+        except ( OSError, ValueError, KeyError ):
+            with open( LogFile, 'a' ) as LF:
+                LF.write( "Error reading building inventory %s !!!\n" %
+                          BUILD_INVENTORY )
+            # end with
+            return badReturn
+        # end try
+    # end if
+    try:
+        numDone, MissingKeys = epl.renderEvents( ArchiveDir, OutDir, EventKeys,
+                                    epl.buildingLayers( BuildPolys ),
+                                    dpi=plotDPI, numProcs=numProcs )
+    except OSError:
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Error reading field archive %s !!!\n" % ArchiveDir )
+        # end with
+        return badReturn
+    # end try
+    with open( LogFile, 'a' ) as LF:
+        LF.write( "Rendered %d of %d selected event maps at %d dpi \n" %
+                  ( numDone, len( EventKeys ), plotDPI ) )
+        for rR, flCnt in MissingKeys:
+            LF.write( "Realization %d, flood index %d not in field archive!!!\n" %
+                      ( rR, flCnt ) )
+        # end for
+    # end with
+    if len( MissingKeys ) > 0:
+        return badReturn
+    # end if
+    return goodReturn
+
+
+def mapHazard( CWD, MergeFiles, numProcs, LogFile ):
+    """Make the AEP and return-period depth maps for START_REAL to END_REAL
+    from the field archive.
+
+    Parameters
+    ----------
+    CWD : str
+        Current working directory.
+    MergeFiles : list
+        Saved annual maxima files to merge instead of reading the field
+        archive. If None, the field archive is used.
+    numProcs : int
+        Number of worker processes. If None, HAZARD_PROCS.
+    LogFile : str
+        Log file name.
+
+    Returns
+    -------
+    retStatus : int
+        0 == success, 1 == failure.
+
+    """
+    # globals
+    global START_REAL, END_REAL, RESULTS_DIR, FIELD_ARCHIVE_DIR
+    global HAZARD_MAP_DIR, HAZARD_PROCS, HAZARD_YEARS, GEO_ORIGIN, GEO_PRJ
+    global BUILDING_POLYS, BUILD_INVENTORY
+    # parameters
+    goodReturn = 0
+    badReturn = 1
+    # start
+    ArchiveDir = os.path.normpath( os.path.join( CWD, FIELD_ARCHIVE_DIR ) )
+    OutDir = os.path.normpath( os.path.join( CWD, RESULTS_DIR ) )
+    if numProcs is None:
+        numProcs = HAZARD_PROCS
+    # end if
+    BuildPolys = BUILDING_POLYS
+    if not BUILD_INVENTORY is None:
+        try:
+            BuildPolys = binv.readInventory( os.path.join( CWD,
+                                             BUILD_INVENTORY ) )["polys"]
+        except ( OSError, ValueError, KeyError ):
+            with open( LogFile, 'a' ) as LF:
+                LF.write( "Error reading building inventory %s !!!\n" %
+                          BUILD_INVENTORY )
+            # end with
+            return badReturn
+        # end try
+    # end if
+    try:
+        with np.load( os.path.join( ArchiveDir, farch.GRID_FILE ) ) as GF:
+            XPts = GF["X"]
+            YPts = GF["Y"]
+        # end with
+        if MergeFiles is None:
+            Annual = hmap.annualFromArchive( ArchiveDir,
+                                             range( START_REAL, END_REAL + 1 ),
+                                             simYears=HAZARD_YEARS,
+                                             numProcs=numProcs )
+            AnnFile = os.path.join( OutDir, hmap.ANNUAL_FMT %
+                                    ( START_REAL, END_REAL ) )
+            hmap.saveAnnual( Annual, AnnFile )
+            with open( LogFile, 'a' ) as LF:
+                LF.write( "Saved annual maxima for %d realization years to %s \n" %
+                          ( Annual["years"], AnnFile ) )
+            # end with
+        else:
+            Annual = hmap.mergeAnnualFiles( MergeFiles )
+        # end if
+    except OSError:
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Error reading field archive %s !!!\n" % ArchiveDir )
+        # end with
+        return badReturn
+    except ValueError as errV:
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Error merging annual maxima: %s !!!\n" % errV )
+        # end with
+        return badReturn
+    # end try
+    with open( LogFile, 'a' ) as LF:
+        LF.write( "Annual maxima for %d to %d, %d realization years \n" %
+                  ( Annual["span"][0], Annual["span"][1], Annual["years"] ) )
+        if Annual["excluded"] > 0:
+            LF.write( "%d events outside %d to %d are not in the annual " \
+                      "maxima!!!\n" % ( Annual["excluded"], Annual["span"][0],
+                                        Annual["span"][1] ) )
+        # end if
+    # end with
+    MapDir = os.path.join( OutDir, HAZARD_MAP_DIR )
+    MapNames = hmap.writeHazardMaps( MapDir, Annual, XPts, YPts,
+                                     epl.buildingLayers( BuildPolys ),
+                                     origin=GEO_ORIGIN, prjWkt=GEO_PRJ )
+    with open( LogFile, 'a' ) as LF:
+        LF.write( "Wrote %d hazard maps from %d realization years to %s \n" %
+                  ( len( MapNames ), Annual["years"], MapDir ) )
+    # end with
+    return goodReturn
+
+
+def consolidateFields( CWD, LogFile ):
+    """Consolidate the field archive chunks for memory-mapped reads.
+
+    Run only after all runs writing to FIELD_ARCHIVE_DIR are done, and
+    never at the same time as another consolidation.
+
+    Parameters
+    ----------
+    CWD : str
+        Current working directory.
+    LogFile : str
+        Log file name.
+
+    Returns
+    -------
+    retStatus : int
+        0 == success, 1 == failure.
+
+    """
+    # globals
+    global FIELD_ARCHIVE_DIR
+    # parameters
+    goodReturn = 0
+    badReturn = 1
+    # start
+    ArchiveDir = os.path.normpath( os.path.join( CWD, FIELD_ARCHIVE_DIR ) )
+    try:
+        numArch = farch.consolidateArchive( ArchiveDir )
+    except OSError:
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Error consolidating field archive %s !!!\n" % ArchiveDir )
+        # end with
+        return badReturn
+    # end try
+    if numArch == 0:
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "No event chunks in field archive %s !!!\n" % ArchiveDir )
+        # end with
+        return badReturn
+    # end if
+    with open( LogFile, 'a' ) as LF:
+        LF.write( "Field archive %s has %d events \n" % ( ArchiveDir, numArch ) )
+    # end with
+    return goodReturn
+
+
+def parseArgs( argList ):
+    """Parse the command line.
+
+    With no arguments the events for START_REAL to END_REAL are simulated.
+
+    Parameters
+    ----------
+    argList : list
+        Command line arguments without the script name.
+
+    Returns
+    -------
+    CmdArgs : argparse.Namespace
+        Parsed arguments. command is "run", "stage", "consolidate",
+        "render", or "hazard".
+
+    """
+    # imports
+    import argparse
+    # start
+    Parser = argparse.ArgumentParser( description="Flood Risk PRA inundation " \
+                                      "simulations for No Obstruction branch" )
+    Parser.add_argument( "command", nargs="?", default="run",
+                         choices=[ "run", "stage", "consolidate", "render",
+                                   "hazard" ],
+                         help="run simulates events; stage validates and " \
+                              "renders the model input files for all events; " \
+                              "consolidate collects the field archive chunks " \
+                              "after all runs are done; " \
+                              "render plots event maps from the field archive; " \
+                              "hazard makes AEP and return-period depth maps" )
+    Parser.add_argument( "--start", type=int, default=None,
+                         help="first realization, default START_REAL" )
+    Parser.add_argument( "--end", type=int, default=None,
+                         help="last realization, default END_REAL" )
+    Parser.add_argument( "--stage-dir", dest="stage_dir", default=None,
+                         help="staging directory; for run, use the staged " \
+                              "model input files in this directory" )
+    Parser.add_argument( "--manifest-only", dest="manifest_only",
+                         action="store_true",
+                         help="stage only the manifest of per-event changes" )
+    Parser.add_argument( "--reals", type=int, nargs="+", default=None,
+                         help="render only these realizations" )
+    Parser.add_argument( "--min-flood-depth", dest="min_flood_depth",
+                         type=float, default=None,
+                         help="render only events with a maximum flood depth " \
+                              "greater than this, m" )
+    Parser.add_argument( "--preview", action="store_true",
+                         help="render at PREVIEW_DPI" )
+    Parser.add_argument( "--procs", type=int, default=None,
+                         help="render or hazard worker processes, default " \
+                              "RENDER_PROCS or HAZARD_PROCS" )
+    Parser.add_argument( "--merge", nargs="+", default=None,
+                         help="hazard maps from these saved annual maxima " \
+                              "files instead of the field archive" )
+    CmdArgs = Parser.parse_args( argList )
+    return CmdArgs
+
+
+#standalone execution block
+# assumes that this module is executed within the same current directory
+# as the input file
+if __name__ == "__main__":
+    CWD = os.getcwd()
+    CmdArgs = parseArgs( sys.argv[1:] )
+    if not CmdArgs.start is None:
+        START_REAL = CmdArgs.start
+    # end if
+    if not CmdArgs.end is None:
+        END_REAL = CmdArgs.end
+    # end if
+    LogFile = os.path.normpath( os.path.join( CWD, LOG_FILE % ( START_REAL, END_REAL ) ) )
+    StartDT = dt.datetime.now()
+    # consolidation, rendering, and hazard maps add to the log of the
+    # simulations
+    logMode = 'a' if CmdArgs.command in [ "consolidate", "render", "hazard" ] else 'w+'
+    with open( LogFile, logMode ) as LF:
+        LF.write( "Start of Flood Risk, Probabilistic Risk Assessment (PRA) - no blockages \n")
+        LF.write( "Start time: %s \n\n" % StartDT.strftime("%Y-%m-%d %H:%M"))
+    # end with
+    # consolidate the field archive from all runs only
+    if CmdArgs.command == "consolidate":
+        retStatus = consolidateFields( CWD, LogFile )
+        if retStatus != 0:
+            sys.exit([-1, "Error consolidating field archive, see %s" % LogFile])
+        # end if
+        sys.exit(0)
+    # end if
+    # render event maps from stored results only
+    if CmdArgs.command == "render":
+        retStatus = renderPlots( CWD, CmdArgs.reals, CmdArgs.min_flood_depth,
+                                 CmdArgs.preview, CmdArgs.procs, LogFile )
+        if retStatus != 0:
+            sys.exit([-1, "Error rendering event maps, see %s" % LogFile])
+        # end if
+        sys.exit(0)
+    # end if
+    # hazard maps from the field archive or saved annual maxima only
+    if CmdArgs.command == "hazard":
+        retStatus = mapHazard( CWD, CmdArgs.merge, CmdArgs.procs, LogFile )
+        if retStatus != 0:
+            sys.exit([-1, "Error making hazard maps, see %s" % LogFile])
+        # end if
+        sys.exit(0)
+    # end if
+    MFilesDir = os.path.normpath( os.path.join( CWD, MOD_FILES_DIR ) )
+    DurResultsDir = os.path.normpath( os.path.join( CWD, RESULTS_DIR ) )
+    if CmdArgs.stage_dir is None:
+        StageDir = os.path.normpath( os.path.join( CWD, STAGE_DECKS_DIR ) )
+    else:
+        StageDir = os.path.normpath( os.path.abspath( CmdArgs.stage_dir ) )
+    # end if
+    # read the model files once and hold in memory
+    try:
+        DeckTemplates = dtempl.loadDeckTemplates( MFilesDir, INPUTS,
+                                                  [ DEPTH, TOPO, MANN ] )
+        DepBase = gio.makeGridBuffer( gio.readGrid(
+                            os.path.join( MFilesDir, DEPTH ), dtype=np.float64 ) )
+        TopoBase = gio.makeGridBuffer( gio.readGrid(
+                            os.path.join( MFilesDir, TOPO ), dtype=np.float64 ) )
+        # domain size and geometry from the input deck
+        DOMAIN_GEOM = dgeom.makeGeometry( os.path.join( MFilesDir, INPUTS ),
+                            xIndexFile=os.path.join( MFilesDir, "XINDEX.txt" ),
+                            yIndexFile=os.path.join( MFilesDir, "YINDEX.txt" ),
+                            useSidecar=GRID_SIDECAR, sidecarDir=GRID_CACHE_DIR )
+        NROWS = DOMAIN_GEOM["nrows"]
+        NCOLS = DOMAIN_GEOM["ncols"]
+        if BUILD_INVENTORY is None:
+            BUILD_INC = binun.metaIncidence( BUILDING_META, NROWS, NCOLS )
+        else:
+            BUILD_INC, BuildInv = binv.inventoryIncidence(
+                                os.path.join( CWD, BUILD_INVENTORY ),
+                                DOMAIN_GEOM, Topo=TopoBase["grid"],
+                                cacheDir=BUILD_INC_CACHE_DIR )
+            NUM_BUILDS = len( BUILD_INC["ids"] )
+            BUILDING_POLYS = list( BuildInv["polys"] )
+        # end if
+    except ( OSError, ValueError, KeyError ):
+        OutStr = "Error reading model files from %s !!!\n" % MFilesDir
+        with open( LogFile, 'a' ) as LF:
+            LF.write("%s" % OutStr )
+        # end with
+        sys.exit([-1, OutStr])
+    # end try
+    # get the events to simulate
+    if ( CmdArgs.command == "run" ) and ( not CmdArgs.stage_dir is None ):
+        EventDF = readStagedEvents( StageDir, LogFile )
+        if len( EventDF ) == 0:
+            OutStr = "No staged events for realizations %d to %d in %s!!!\n" % \
+                     ( START_REAL, END_REAL, StageDir )
+            with open( LogFile, 'a' ) as LF:
+                LF.write( "%s" % OutStr )
+            # end with
+            sys.exit([-1, OutStr])
+        # end if
+    else:
+        RealDF = readRealizations( LogFile )
+        EventDF = buildEventTable( RealDF, LogFile )
+    # end if
+    # stage only
+    if CmdArgs.command == "stage":
+        retStatus = stageEvents( EventDF, StageDir, DeckTemplates, DepBase,
+                                 TopoBase, CmdArgs.manifest_only, LogFile )
+        if retStatus != 0:
+            sys.exit([-1, "Error staging events, see %s" % LogFile])
+        # end if
+        EndDT = dt.datetime.now()
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Successful staging at %s \n" %
+                      EndDT.strftime("%Y-%m-%d %H:%M") )
+        # end with
+        sys.exit(0)
+    # end if
+    # check all inputs before any simulation
+    numBad = validateEvents( EventDF, DepBase, TopoBase, LogFile )
+    if numBad > 0:
+        OutStr = "Stopped before simulation, %d invalid inputs!!!\n" % numBad
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "%s" % OutStr )
+        # end with
+        sys.exit([-1, OutStr])
+    # end if
+    ArchiveDir = None
+    if ARCHIVE_FIELDS:
+        ArchiveDir = os.path.normpath( os.path.join( CWD, FIELD_ARCHIVE_DIR ) )
+    # end if
+    ModExe = MOD_EXE
+    PendFlushList = list()
+    if USE_STAGING:
+        StageRoot = rstage.getStageRoot( STAGE_ROOT )
+        ModExe = os.path.normpath( os.path.join( CWD, MOD_EXE ) )
+        # atexit is last in, first out so flush before removal on early exit
+        atexit.register( rstage.cleanupStaged )
+        atexit.register( rstage.flushRetained, PendFlushList, LogFile )
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Staging run directories in %s \n\n" % StageRoot )
+        # end with
+    # end if
+    # stream event rows to disk as events finish
+    TableDir = os.path.normpath( os.path.join( CWD, RESULTS_DIR, RESULTS_TABLE_DIR ) )
+    StreamDir = os.path.normpath( os.path.join( TableDir,
+                                  rstore.STREAM_FMT % ( START_REAL, END_REAL ) ) )
+    Stream = rstore.openStream( StreamDir, flushEvents=STREAM_FLUSH,
+                                reqFmt=RESULTS_TABLE_FMT )
+    # event records are held in a preallocated store until streamed
+    RecStore = erec.makeRecordStore( STREAM_FLUSH, NUM_BUILDS )
+    if HAZARD_STATS:
+        HAZARD_REDUCER = hstat.makeReducer( NROWS, NCOLS )
+    # end if
+    # Now do by event
+    for indx, row in EventDF.iterrows():
+        rR = int( row["RealNum"] )
+        flCnt = int( row["FloodNum"] )
+        curInDischarge = float( row["Discharge_cms"] )
+        curObstruction = float( row["Obstruction_Depth_m"] )
+        # set the run directoryfor this event
+        if USE_STAGING:
+            RunDir = rstage.makeStageDir( StageRoot, rR, flCnt, RESULTS_DIR )
+        else:
+            RunDir = CWD
+        # end if
+        # write entry to the log file
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Climate realization %d, flood index %d, obstruction " \
+                      "depth %5.2f, discharge %6.2f \n" %
+                      (rR, flCnt, curObstruction, curInDischarge) )
+        # end with
+        # write the model input files
+        if len( str( row.get( "EventDir", "" ) ) ) > 0:
+            EvDir = os.path.normpath( os.path.join( StageDir, row["EventDir"] ) )
+            retStatus = copyStagedDeck( EvDir, RunDir, DeckTemplates, LogFile )
+        else:
+            retStatus = renderEventDeck( RunDir, curInDischarge, curObstruction,
+                                         DeckTemplates, DepBase, TopoBase,
+                                         LogFile )
+        # end if
+        if retStatus != 0:
+            # then there was an error
+            with open( LogFile, 'a' ) as LF:
+                OutStr = "Error in realization %d writing model input files!!!\n" % rR
+                LF.write( "%s" % OutStr )
+            # end with
+            sys.exit([-1, OutStr])
+        # end if
+        # now run
+        runResult = subprocess.run( [ModExe], shell=True, cwd=RunDir,
+                                    capture_output=True, text=True, )
+        if runResult.returncode != 0:
+            # then there was an error
+            with open( LogFile, 'a' ) as LF:
+                LF.write( "%s\n\n" % print(runResult.stdout) )
+                LF.write( "%s\n\n" % print(runResult.stderr) )
+            # end with
+            sys.exit([-1, "Error in MOD_FreeSurf2D execution"])
+        # end if
+        # process results
+        curBuildRec, curMaxDict = processFlooding( RunDir, rR, flCnt, curObstruction,
+                                      curInDischarge, LogFile,
+                                      archiveDir=ArchiveDir,
+                                      curDT=row["DateTime"] )
+        if len( curBuildRec ) <= 0:
+            # then there was an error
+            with open( LogFile, 'a' ) as LF:
+                OutStr = "Error in climate realization %d, flood index %d " \
+                         "collating outputs!!!\n" % (rR, flCnt)
+                LF.write( "%s" % OutStr )
+            # end with
+            sys.exit([-1, OutStr])
+        # end if
+        # add to the record store and stream to disk when full
+        erec.appendEvent( RecStore, ( rR, flCnt, row["DateTime"],
+                                      float( row["Precip_mm"] ), curInDischarge,
+                                      curObstruction,
+                                      curMaxDict["Max_Water_Depth_m"],
+                                      curMaxDict["Max_Flood_Depth_m"],
+                                      curMaxDict["Max_U_mps"],
+                                      curMaxDict["Max_V_mps"] ), curBuildRec )
+        if RecStore["n"] >= STREAM_FLUSH:
+            rstore.appendStream( Stream, erec.longFrame( RecStore ),
+                                 numEvents=RecStore["n"] )
+            erec.clearStore( RecStore )
+        # end if
+        # queue retained artifacts and flush to durable storage by batch
+        if USE_STAGING:
+            RetainPairs = list()
+            for tName in RETAIN_FILES:
+                RetainPairs.append( ( tName, "R%04d_Fl%02d_%s" % ( rR, flCnt, tName ) ) )
+            # end for
+            rstage.queueRetained( PendFlushList, RunDir, DurResultsDir,
+                                  RetainPairs )
+            if len( PendFlushList ) >= FLUSH_BATCH:
+                rstage.flushRetained( PendFlushList, LogFile )
+            # end if
+        # end if
+    # end of event for
+    # flush any remaining staged artifacts
+    if len( PendFlushList ) > 0:
+        rstage.flushRetained( PendFlushList, LogFile )
+    # end if
+    # parallel runs can share the field archive, so it is consolidated
+    # once, with the consolidate command, after all runs are done
+    if ARCHIVE_FIELDS:
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Field archive chunks written to %s. Run the consolidate " \
+                      "command after all runs are done \n" % ArchiveDir )
+        # end with
+    # end if
+    # save the hazard statistics
+    if not HAZARD_REDUCER is None:
+        HazFile = os.path.normpath( os.path.join( DurResultsDir,
+                                    HAZARD_STATS_FILE % ( START_REAL, END_REAL ) ) )
+        os.makedirs( DurResultsDir, exist_ok=True )
+        hstat.saveReducer( HAZARD_REDUCER, HazFile )
+        with open( LogFile, 'a' ) as LF:
+            LF.write( "Hazard statistics for %d events saved to %s \n" %
+                      ( HAZARD_REDUCER["n"], HazFile ) )
+        # end with
+    # end if
     # output summary info
-    outputSummary( CWD, ClRealList, FlIndList, DTList, PrecipList, DisList,
-                   ObsDepList, FloodDFList, LogFile )
+    if RecStore["n"] > 0:
+        rstore.appendStream( Stream, erec.longFrame( RecStore ),
+                             numEvents=RecStore["n"] )
+        erec.clearStore( RecStore )
+    # end if
+    rstore.closeStream( Stream )
+    outputSummary( CWD, StreamDir, LogFile )
     # log file wrap up
     EndDT = dt.datetime.now()
     ETimeDelta = EndDT - StartDT
@@ -965,4 +1654,4 @@ if __name__ == "__main__":
     # end with
     # done
 
-#EOF
\ No newline at end of file
+#EOF
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Archive_Collation
+   :platform: Windows, Linux
+   :synopsis: One-pass parallel collation of archived results workbooks
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides the collation of the archived branch results workbooks,
+R####to####_Flooding_Summary_All.xlsx, into the building level table,
+FullHouseRealDF, and the total damage cost by climate realization. Each
+workbook is opened once, read-only, and all of its sheets are read in a
+single streaming pass. Workbooks are collated concurrently in a process
+pool. The long-format results tables from Results_Store can be collated
+to the same building level table without any workbooks.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# local modules
+import Damage_Cost as dcost
+
+# parameters
+XLSX_NAME_ROOT = "R%04dto%04d_Flooding_Summary_All.xlsx"
+SUMMARY_SHEET = "Summary"
+INUN_SHEET_FMT = "Inun_R%04d_Fl%02d"
+#   building sheet columns that are integers
+INT_COLS = [ "Row", "Column" ]
+
+
+# functions
+def readWorkbookSheets( inFile ):
+    """Read all sheets of a workbook in one read-only, streaming pass.
+
+    Parameters
+    ----------
+    inFile : str
+        FQDN for the workbook.
+
+    Returns
+    -------
+    SheetDict : dict
+        Sheet name to [ header list, list of row tuples ].
+
+    """
+    # imports
+    import openpyxl
+    # start
+    SheetDict = dict()
+    WBook = openpyxl.load_workbook( inFile, read_only=True, data_only=True )
+    try:
+        for WSheet in WBook.worksheets:
+            RowIter = WSheet.iter_rows( values_only=True )
+            Header = list( next( RowIter, tuple() ) )
+            SheetDict[WSheet.title] = [ Header, [ x for x in RowIter
+                                                  if x[0] is not None ] ]
+        # end for
+    finally:
+        WBook.close()
+    # end try
+    return SheetDict
+
+
+def sheetFrame( Header, Rows ):
+    """Make a DataFrame from a sheet with the index in the first column.
+
+    Parameters
+    ----------
+    Header : list
+        Header row.
+    Rows : list
+        Data rows.
+
+    Returns
+    -------
+    SheetDF : pd.DataFrame
+        Sheet table.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    SheetDF = pd.DataFrame.from_records( Rows, columns=[ "_Index" ] + Header[1:] )
+    SheetDF = SheetDF.set_index( "_Index" )
+    SheetDF.index.name = None
+    return SheetDF
+
+
+def addHouseCosts( HouseDF, realNum, costFunc=dcost.costCalcArray ):
+    """Add the realization, house index, and damage cost columns.
+
+    Parameters
+    ----------
+    HouseDF : pd.DataFrame
+        Building inundation for one event, building number index.
+    realNum : int
+        Climate realization.
+    costFunc : callable, optional
+        Vectorized damage cost of the flood depths. The default is
+        Damage_Cost.costCalcArray.
+
+    Returns
+    -------
+    HouseDF : pd.DataFrame
+        With Realization, House_Ind, and Cost_Estimate columns added.
+
+    """
+    # start
+    HouseDF["Realization"] = realNum
+    HouseDF["House_Ind"] = HouseDF.index
+    HouseDF["Cost_Estimate"] = costFunc( HouseDF["FloodDepth_m"].to_numpy() )
+    return HouseDF
+
+
+def collateWorkbook( inFile, costFunc=dcost.costCalcArray ):
+    """Collate one results workbook.
+
+    Parameters
+    ----------
+    inFile : str
+        FQDN for the workbook.
+    costFunc : callable, optional
+        Vectorized damage cost of the flood depths. The default is
+        Damage_Cost.costCalcArray.
+
+    Returns
+    -------
+    SumDF : pd.DataFrame
+        Summary sheet.
+    HouseDF : pd.DataFrame
+        Building inundation and cost for every event in the Summary sheet
+        order.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global SUMMARY_SHEET, INUN_SHEET_FMT, INT_COLS
+    # start
+    SheetDict = readWorkbookSheets( inFile )
+    SumDF = sheetFrame( *SheetDict[SUMMARY_SHEET] )
+    SumDF["Date"] = pd.to_datetime( SumDF["Date"] )
+    EventDF_List = list()
+    for cReal, cFl in zip( SumDF["Realization"].to_numpy( dtype=np.int64 ),
+                           SumDF["Flood Num."].to_numpy( dtype=np.int64 ) ):
+        cFlDF = sheetFrame( *SheetDict[INUN_SHEET_FMT % ( cReal, cFl )] )
+        for cCol in INT_COLS:
+            cFlDF[cCol] = cFlDF[cCol].astype( np.int64 )
+        # end for
+        EventDF_List.append( addHouseCosts( cFlDF, int( cReal ),
+                                            costFunc=costFunc ) )
+    # end for
+    if len( EventDF_List ) == 0:
+        return SumDF, pd.DataFrame()
+    # end if
+    HouseDF = pd.concat( EventDF_List, ignore_index=True )
+    return SumDF, HouseDF
+
+
+def listArchiveWorkbooks( inDir, startReal=1, finalReal=1000, realInc=50,
+                          nameRoot=XLSX_NAME_ROOT ):
+    """List the chunk workbooks, stopping at the first one that is missing.
+
+    Parameters
+    ----------
+    inDir : str
+        FQDN for the directory with the workbooks.
+    startReal : int, optional
+        First realization. The default is 1.
+    finalReal : int, optional
+        Last realization. The default is 1000.
+    realInc : int, optional
+        Realizations per workbook. The default is 50.
+    nameRoot : str, optional
+        Workbook name template. The default is XLSX_NAME_ROOT.
+
+    Returns
+    -------
+    FileList : list
+        FQDN workbook names.
+
+    """
+    # start
+    FileList = list()
+    for startInd in range( startReal, finalReal + 1, realInc ):
+        endInd = startInd + realInc - 1
+        InFiler = os.path.normpath( os.path.join( inDir, nameRoot % ( startInd, endInd ) ) )
+        if not os.path.isfile( InFiler ):
+            break
+        # end if
+        FileList.append( InFiler )
+    # end for
+    return FileList
+
+
+def realizationTotals( FullHouseRealDF ):
+    """Total damage cost by climate realization.
+
+    Parameters
+    ----------
+    FullHouseRealDF : pd.DataFrame
+        Building level table with Realization and Cost_Estimate.
+
+    Returns
+    -------
+    OverviewDF : pd.DataFrame
+        "Climate Realization" and "Total Cost" in realization order. Only
+        realizations with floods are included.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    UKeys, TotCost = dcost.groupSum( FullHouseRealDF["Cost_Estimate"].to_numpy(),
+                                     [ FullHouseRealDF["Realization"].to_numpy() ] )
+    DataDict = { "Climate Realization" : UKeys[0].astype( np.int32 ),
+                 "Total Cost" : TotCost.astype( np.float32 ), }
+    return pd.DataFrame( data=DataDict )
+
+
+def collateArchive( FileList, costFunc=dcost.costCalcArray, numProcs=None ):
+    """Collate chunk workbooks concurrently.
+
+    Parameters
+    ----------
+    FileList : list
+        FQDN workbooks, like from listArchiveWorkbooks.
+    costFunc : callable, optional
+        Vectorized damage cost of the flood depths. Must be a module level
+        function for the process pool. The default is
+        Damage_Cost.costCalcArray.
+    numProcs : int, optional
+        Number of worker processes. If None, the number of CPUs. If 1, no
+        pool is used. The default is None.
+
+    Returns
+    -------
+    FullHouseRealDF : pd.DataFrame
+        Building inundation and cost for all events.
+    SumListDF : pd.DataFrame
+        All Summary sheets.
+    OverviewDF : pd.DataFrame
+        Total cost by climate realization, from realizationTotals.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    numFiles = len( FileList )
+    if numProcs is None:
+        numProcs = os.cpu_count() or 1
+    # end if
+    if ( numProcs <= 1 ) or ( numFiles <= 1 ):
+        ResList = [ collateWorkbook( x, costFunc=costFunc ) for x in FileList ]
+    else:
+        with ProcessPoolExecutor( max_workers=min( numProcs, numFiles ) ) as Pool:
+            ResList = list( Pool.map( collateWorkbook, FileList,
+                                      [ costFunc ] * numFiles ) )
+        # end with
+    # end if
+    if numFiles == 0:
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    # end if
+    SumListDF = pd.concat( [ x[0] for x in ResList ], ignore_index=True )
+    FullHouseRealDF = pd.concat( [ x[1] for x in ResList ], ignore_index=True )
+    return FullHouseRealDF, SumListDF, realizationTotals( FullHouseRealDF )
+
+
+def collateLongTable( LongDF, costFunc=dcost.costCalcArray ):
+    """Make the building level table from a Results_Store long table.
+
+    Parameters
+    ----------
+    LongDF : pd.DataFrame
+        Long-format results, like from Results_Store.readResultsTable.
+    costFunc : callable, optional
+        Vectorized damage cost of the flood depths. The default is
+        Damage_Cost.costCalcArray.
+
+    Returns
+    -------
+    FullHouseRealDF : pd.DataFrame
+        Building inundation and cost for all events with the same columns
+        as from collateArchive.
+
+    """
+    # start
+    BuildCols = [ "Row", "Column", "Topo_m", "FloorEl_m", "FloorHeight_m",
+                  "WaterDepth_m", "FloodDepth_m" ]
+    FullHouseRealDF = LongDF[BuildCols].reset_index( drop=True ).copy()
+    FullHouseRealDF["Realization"] = LongDF["Realization"].to_numpy( dtype=np.int64 )
+    FullHouseRealDF["House_Ind"] = LongDF["Building"].to_numpy( dtype=np.int64 )
+    FullHouseRealDF["Cost_Estimate"] = costFunc( FullHouseRealDF["FloodDepth_m"].to_numpy() )
+    return FullHouseRealDF
+
+
+#EOF
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Building_Inventory
+   :platform: Windows, Linux
+   :synopsis: Building inventory loading and rasterization to grid cells
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides a building inventory, building numbers, floor elevations, and
+footprint polygons in model coordinates, that is read from a "Buildings"
+sheet in an Excel workbook, like Domain_Layout.xlsx, or from a GeoJSON
+feature collection. The perimeter, footprint, and check cells for each
+building are derived from the polygons with a shapely STRtree over the
+grid cells, so there are no hand-typed cell lists and no scan of every
+cell for every building.
+
+A footprint cell has its center inside of the building polygon. A
+perimeter cell shares an edge with the polygon boundary and is not a
+footprint cell. The check cell is the perimeter cell with the lowest
+ground elevation. For the 44 houses in the example study these rules give
+the same footprint and check cells as BUILDING_META. The incidence arrays
+are cached in a .npz file that is keyed by the inventory file and the
+grid.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import json
+import hashlib
+import numpy as np
+
+# local modules
+import Grid_IO as gio
+import Field_Archive as farch
+import Building_Inundation as binun
+
+# parameters
+INV_SHEET = "Buildings"
+ID_COL = "Building"
+FLOOR_COL = "FloorEl_m"
+GEOM_COL = "WKT"
+TABLE_EXTS = ( ".xlsx", ".xlsm", ".xls" )
+INC_CACHE_FMT = "%s.incidence.npz"
+INC_ARRAYS = ( "ids", "floorel", "row", "col", "check", "perim",
+               "perim_off", "foot", "foot_off" )
+
+
+# functions
+def makeInventory( BuildIds, FloorEls, Polys ):
+    """Make an inventory sorted by building number.
+
+    Parameters
+    ----------
+    BuildIds : sequence
+        Building numbers. Must be 1 to the number of buildings.
+    FloorEls : sequence
+        Floor elevation, m, for each building.
+    Polys : sequence
+        shapely footprint polygon, in model coordinates, for each building.
+
+    Returns
+    -------
+    Inventory : dict
+        "ids", "floorel", and "polys" arrays sorted by building number.
+
+    Raises
+    ------
+    ValueError
+        If the building numbers are not 1 to the number of buildings.
+
+    """
+    # start
+    BuildIds = np.asarray( BuildIds, dtype=np.int32 )
+    SortOrder = np.argsort( BuildIds, kind="stable" )
+    Inventory = dict()
+    Inventory["ids"] = BuildIds[SortOrder]
+    Inventory["floorel"] = np.asarray( FloorEls, dtype=np.float64 )[SortOrder]
+    PolyArray = np.empty( len( Polys ), dtype=object )
+    PolyArray[:] = list( Polys )
+    Inventory["polys"] = PolyArray[SortOrder]
+    if not np.array_equal( Inventory["ids"],
+                           np.arange( 1, len( BuildIds ) + 1, dtype=np.int32 ) ):
+        raise ValueError( "Building numbers must be 1 to %d" % len( BuildIds ) )
+    # end if
+    return Inventory
+
+
+def readInventoryTable( xlsxFile, sheetName=INV_SHEET ):
+    """Read an inventory from a workbook sheet with one row per building.
+
+    Parameters
+    ----------
+    xlsxFile : str
+        FQDN for the workbook.
+    sheetName : str, optional
+        Sheet name. The default is INV_SHEET.
+
+    Returns
+    -------
+    Inventory : dict
+        From makeInventory. The sheet has the building number in ID_COL,
+        the floor elevation in FLOOR_COL, and the footprint polygon as WKT
+        in GEOM_COL.
+
+    """
+    # imports
+    import pandas as pd
+    import shapely
+    # start
+    InvDF = pd.read_excel( xlsxFile, sheet_name=sheetName )
+    Polys = shapely.from_wkt( InvDF[GEOM_COL].astype( str ).to_numpy() )
+    return makeInventory( InvDF[ID_COL].to_numpy(),
+                          InvDF[FLOOR_COL].to_numpy(), Polys )
+
+
+def readInventoryGeoJSON( jsonFile ):
+    """Read an inventory from a GeoJSON feature collection.
+
+    Parameters
+    ----------
+    jsonFile : str
+        FQDN for the GeoJSON file. Coordinates are model coordinates and
+        each feature has ID_COL and FLOOR_COL properties.
+
+    Returns
+    -------
+    Inventory : dict
+        From makeInventory.
+
+    """
+    # imports
+    from shapely.geometry import shape
+    # start
+    with open( jsonFile, 'r' ) as JF:
+        FeatColl = json.load( JF )
+    # end with
+    Features = FeatColl["features"]
+    return makeInventory( [ x["properties"][ID_COL] for x in Features ],
+                          [ x["properties"][FLOOR_COL] for x in Features ],
+                          [ shape( x["geometry"] ) for x in Features ] )
+
+
+def readInventory( invFile ):
+    """Read an inventory from a workbook or a GeoJSON file.
+
+    Parameters
+    ----------
+    invFile : str
+        FQDN for the inventory file. Workbooks are identified by the
+        extensions in TABLE_EXTS.
+
+    Returns
+    -------
+    Inventory : dict
+        From makeInventory.
+
+    """
+    # globals
+    global TABLE_EXTS
+    # start
+    if os.path.splitext( invFile )[1].lower() in TABLE_EXTS:
+        return readInventoryTable( invFile )
+    # end if
+    return readInventoryGeoJSON( invFile )
+
+
+def writeInventoryGeoJSON( Inventory, outFile ):
+    """Write an inventory as a GeoJSON feature collection.
+
+    Parameters
+    ----------
+    Inventory : dict
+        From makeInventory.
+    outFile : str
+        FQDN for the output file.
+
+    Returns
+    -------
+    None.
+
+    """
+    # imports
+    from shapely.geometry import mapping
+    # start
+    Features = list()
+    for bId, floorEl, bPoly in zip( Inventory["ids"], Inventory["floorel"],
+                                    Inventory["polys"] ):
+        Features.append( { "type" : "Feature",
+                           "properties" : { ID_COL : int( bId ),
+                                            FLOOR_COL : float( floorEl ) },
+                           "geometry" : mapping( bPoly ) } )
+    # end for
+    with open( outFile, 'w' ) as OF:
+        json.dump( { "type" : "FeatureCollection", "features" : Features },
+                   OF, indent=1 )
+    # end with
+    return
+
+
+def cellBoxes( Geom ):
+    """Grid cells as shapely boxes.
+
+    Parameters
+    ----------
+    Geom : dict
+        Domain geometry from Domain_Geometry.
+
+    Returns
+    -------
+    Boxes : np.ndarray
+        Row major array of nrows * ncols box polygons.
+    Centers : np.ndarray
+        Row major array of nrows * ncols cell center points.
+
+    """
+    # imports
+    import shapely
+    # start
+    XFace = np.asarray( Geom["XFace"], dtype=np.float64 )
+    YFace = np.asarray( Geom["YFace"], dtype=np.float64 )
+    Y0, X0 = np.meshgrid( YFace[:-1], XFace[:-1], indexing='ij' )
+    Y1, X1 = np.meshgrid( YFace[1:], XFace[1:], indexing='ij' )
+    Boxes = shapely.box( X0.ravel(), Y0.ravel(), X1.ravel(), Y1.ravel() )
+    Centers = shapely.points( np.asarray( Geom["XV"], dtype=np.float64 ).ravel(),
+                              np.asarray( Geom["YV"], dtype=np.float64 ).ravel() )
+    return Boxes, Centers
+
+
+def rasterizeInventory( Inventory, Geom, Topo=None ):
+    """Derive the building cells from the footprint polygons.
+
+    The grid cells that intersect each polygon are found with one bulk
+    STRtree query. Footprint cells have their center inside of the
+    polygon. Perimeter cells share an edge with the polygon boundary and
+    are not footprint cells. The check cell is the perimeter cell with
+    the lowest ground elevation in Topo or, without Topo, the perimeter
+    cell closest to the polygon centroid.
+
+    Parameters
+    ----------
+    Inventory : dict
+        From makeInventory.
+    Geom : dict
+        Domain geometry from Domain_Geometry.
+    Topo : np.ndarray, optional
+        ( nrows, ncols ) ground elevation. Only perimeter cells are used,
+        so raised footprint cells do not matter. The default is None.
+
+    Returns
+    -------
+    Inc : dict
+        From Building_Inundation.makeIncidence.
+
+    Raises
+    ------
+    ValueError
+        If a building has no perimeter cells in the grid.
+
+    """
+    # imports
+    import shapely
+    # start
+    nRows = Geom["nrows"]
+    nCols = Geom["ncols"]
+    numBuilds = len( Inventory["ids"] )
+    Boxes, Centers = cellBoxes( Geom )
+    CellTree = shapely.STRtree( Boxes )
+    Polys = Inventory["polys"]
+    # intersects includes the cells that only touch the polygon
+    BuildIdx, CellIdx = CellTree.query( Polys, predicate="intersects" )
+    InFoot = shapely.contains( Polys[BuildIdx], Centers[CellIdx] )
+    EdgeLen = shapely.length( shapely.intersection( Boxes[CellIdx],
+                                    shapely.boundary( Polys[BuildIdx] ) ) )
+    InPerim = ( EdgeLen > 0.0 ) & ( ~InFoot )
+    # cells in row major order within each building
+    SortOrder = np.lexsort( ( CellIdx, BuildIdx ) )
+    BuildIdx = BuildIdx[SortOrder]
+    CellIdx = CellIdx[SortOrder]
+    InFoot = InFoot[SortOrder]
+    InPerim = InPerim[SortOrder]
+    if Topo is not None:
+        CheckVal = np.asarray( Topo, dtype=np.float64 ).ravel()[CellIdx]
+    else:
+        CentXY = shapely.get_coordinates( shapely.centroid( Polys ) )
+        CheckVal = np.hypot(
+            np.asarray( Geom["XV"], dtype=np.float64 ).ravel()[CellIdx] -
+                CentXY[BuildIdx, 0],
+            np.asarray( Geom["YV"], dtype=np.float64 ).ravel()[CellIdx] -
+                CentXY[BuildIdx, 1] )
+    # end if
+    CellRC = np.column_stack( [ ( CellIdx // nCols ) + 1,
+                                ( CellIdx % nCols ) + 1 ] ).tolist()
+    Starts = np.searchsorted( BuildIdx, np.arange( numBuilds + 1 ) )
+    CheckCells = list()
+    PerimCells = list()
+    FootCells = list()
+    for bI in range( numBuilds ):
+        bSlice = slice( Starts[bI], Starts[bI+1] )
+        PerimInds = np.arange( Starts[bI], Starts[bI+1] )[InPerim[bSlice]]
+        if len( PerimInds ) == 0:
+            raise ValueError( "Building %d has no perimeter cells in the grid" %
+                              Inventory["ids"][bI] )
+        # end if
+        CheckCells.append( CellRC[PerimInds[np.argmin( CheckVal[PerimInds] )]] )
+        PerimCells.append( [ CellRC[x] for x in PerimInds ] )
+        FootCells.append( [ CellRC[x] for x in
+                            np.arange( Starts[bI], Starts[bI+1] )[InFoot[bSlice]] ] )
+    # end for
+    return binun.makeIncidence( Inventory["ids"], Inventory["floorel"],
+                                CheckCells, PerimCells, FootCells, nRows, nCols )
+
+
+def incidenceKey( invFile, Geom, Topo=None ):
+    """Key for the cached incidence of an inventory on a grid.
+
+    Parameters
+    ----------
+    invFile : str
+        FQDN for the inventory file.
+    Geom : dict
+        Domain geometry from Domain_Geometry.
+    Topo : np.ndarray, optional
+        Ground elevation used for the check cells. The default is None.
+
+    Returns
+    -------
+    incKey : str
+        Inventory file size and modification time and a digest of the
+        grid faces and Topo.
+
+    """
+    # start
+    fileKey = gio.gridFileKey( invFile )
+    Digest = hashlib.sha1()
+    Digest.update( np.asarray( Geom["XFace"], dtype=np.float64 ).tobytes() )
+    Digest.update( np.asarray( Geom["YFace"], dtype=np.float64 ).tobytes() )
+    if Topo is not None:
+        Digest.update( np.ascontiguousarray( Topo, dtype=np.float64 ).tobytes() )
+    # end if
+    return "%d_%d_%s" % ( fileKey[0], fileKey[1], Digest.hexdigest() )
+
+
+def inventoryIncidence( invFile, Geom, Topo=None, cacheDir=None ):
+    """Read an inventory and get its incidence, from the cache if current.
+
+    Parameters
+    ----------
+    invFile : str
+        FQDN for the inventory file.
+    Geom : dict
+        Domain geometry from Domain_Geometry.
+    Topo : np.ndarray, optional
+        ( nrows, ncols ) ground elevation. Only perimeter cells are used,
+        so raised footprint cells do not matter. The default is None.
+    cacheDir : str, optional
+        FQDN for the directory for the incidence cache. If None, the cache
+        is written next to the inventory file. The default is None.
+
+    Returns
+    -------
+    Inc : dict
+        From Building_Inundation.makeIncidence.
+    Inventory : dict
+        From makeInventory.
+
+    """
+    # globals
+    global INC_CACHE_FMT, INC_ARRAYS
+    # start
+    invFile = os.path.normpath( os.path.abspath( invFile ) )
+    Inventory = readInventory( invFile )
+    if cacheDir is None:
+        cacheDir = os.path.dirname( invFile )
+    # end if
+    cacheFile = os.path.join( cacheDir,
+                              INC_CACHE_FMT % os.path.basename( invFile ) )
+    incKey = incidenceKey( invFile, Geom, Topo=Topo )
+    if os.path.isfile( cacheFile ):
+        try:
+            with np.load( cacheFile ) as CF:
+                if str( CF["key"] ) == incKey:
+                    Inc = { x : CF[x] for x in INC_ARRAYS }
+                    Inc["shape"] = ( int( Geom["nrows"] ), int( Geom["ncols"] ) )
+                    return Inc, Inventory
+                # end if
+            # end with
+        except ( OSError, ValueError, KeyError ):
+            # rebuild a bad cache
+            pass
+        # end try
+    # end if
+    Inc = rasterizeInventory( Inventory, Geom, Topo=Topo )
+    try:
+        os.makedirs( cacheDir, exist_ok=True )
+        farch.atomicSave( cacheFile, np.savez, key=np.array( incKey ),
+                          **{ x : Inc[x] for x in INC_ARRAYS } )
+    except OSError:
+        # the cache is optional
+        pass
+    # end try
+    return Inc, Inventory
+
+
+#EOF
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Damage_Cost
+   :platform: Windows, Linux
+   :synopsis: Inundation damage cost curve
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides the inundation damage cost curve for the building flood depths.
+The curve is a fourth degree polynomial in the flood depth, in meters,
+fit to the NFIP flood cost estimator. Cost is 0.0 for no inundation and
+is limited to MAX_COST.
+
+costCalc is the scalar form used in the analysis notebooks. costCalcArray
+evaluates the same curve with Horner's method over whole arrays, like the
+events by buildings flood depths, and costs are totalled by event,
+realization, building, or year with grouped sums instead of Python loops.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import numpy as np
+
+# parameters
+#   polynomial coefficients, A for x^4 to E for x^0
+ccA = -72769.0
+ccB = 414681.0
+ccC = -678009.0
+ccD = 498224.0
+ccE = 37110.0
+MAX_COST = 750000.0
+#   depth, m, at and above which cost is MAX_COST
+MAX_DEPTH = 2.75
+COST_COEFFS = ( ccA, ccB, ccC, ccD, ccE )
+
+
+# functions
+def costCalc( IDepth, ccA=ccA, ccB=ccB, ccC=ccC, ccD=ccD, ccE=ccE,
+              MAX_COST=MAX_COST ):
+    """ Custom inundation damage cost curve calculation.
+
+    Fourth degree polynomial with coefficients: A, B, C, D, E, and
+    cost limited to MAX_COST.
+
+    Args:
+        IDepth (float): depth of inundation in meters
+        ccA (float): A coefficient for x^4
+        ccB (float): B coefficient for x^3
+        ccC (float): C coefficient for x^2
+        ccD (float): D coefficient for x^1
+        ccE (float): E coefficient for x^0
+
+    Returns:
+        iCost (float): varies between 0.0 and MAX_COST
+    """
+    from math import pow
+    # check for positive depth and extrapolation.
+    if IDepth <= 0.0:
+        return 0.0
+    elif IDepth >= MAX_DEPTH:
+        return MAX_COST
+    # end if
+    # calculate the polynomial
+    estCost = ( ( ccA * pow( IDepth, 4.0 ) ) + ( ccB * pow( IDepth, 3.0 ) ) + ( ccC * pow(IDepth, 2.0) ) +
+                ( ccD * pow( IDepth, 1.0 ) ) + ccE )
+    if estCost > MAX_COST:
+        iCost = MAX_COST
+    elif estCost <= 0.0:
+        iCost = 0.0
+    else:
+        iCost = estCost
+    # end if
+    return iCost
+
+
+def hornerEval( X, Coeffs, out=None ):
+    """Evaluate a polynomial with Horner's method over an array.
+
+    Parameters
+    ----------
+    X : np.ndarray
+        float64 values.
+    Coeffs : sequence
+        Coefficients from the highest power to x^0.
+    out : np.ndarray, optional
+        float64 output array with the shape of X. The default is None.
+
+    Returns
+    -------
+    PolyVals : np.ndarray
+        Polynomial values, same shape as X.
+
+    """
+    # start
+    if out is None:
+        out = np.empty( X.shape, dtype=np.float64 )
+    # end if
+    out.fill( Coeffs[0] )
+    for cCoef in Coeffs[1:]:
+        np.multiply( out, X, out=out )
+        np.add( out, cCoef, out=out )
+    # end for
+    return out
+
+
+def costCalcArray( Depths, Coeffs=COST_COEFFS, maxCost=MAX_COST,
+                   maxDepth=MAX_DEPTH, out=None ):
+    """Damage cost for an array of flood depths.
+
+    Same clipping and saturation as costCalc with the polynomial evaluated
+    by hornerEval, so values can differ from costCalc in the last bits.
+    NaN depths give NaN costs, like costCalc.
+
+    Parameters
+    ----------
+    Depths : array-like
+        Flood depths, m. Any shape, like events by buildings.
+    Coeffs : sequence, optional
+        Polynomial coefficients from x^4 to x^0. The default is
+        COST_COEFFS.
+    maxCost : float, optional
+        Maximum cost. The default is MAX_COST.
+    maxDepth : float, optional
+        Depth at and above which the cost is maxCost. The default is
+        MAX_DEPTH.
+    out : np.ndarray, optional
+        float64 output array with the shape of Depths. The default is None.
+
+    Returns
+    -------
+    Costs : np.ndarray
+        float64 costs, same shape as Depths.
+
+    """
+    # start
+    Depths = np.asarray( Depths, dtype=np.float64 )
+    Costs = hornerEval( Depths, Coeffs, out=out )
+    np.clip( Costs, 0.0, maxCost, out=Costs )
+    np.putmask( Costs, Depths <= 0.0, 0.0 )
+    np.putmask( Costs, Depths >= maxDepth, maxCost )
+    return Costs
+
+
+def groupKeys( KeyList ):
+    """Group rows by one or more key arrays.
+
+    Parameters
+    ----------
+    KeyList : list of array-like
+        Key arrays of equal length, like realization and building.
+
+    Returns
+    -------
+    UKeys : list of np.ndarray
+        Unique key values, one array per key, in sorted key order.
+    Inverse : np.ndarray
+        int64 group index for each row.
+
+    """
+    # start
+    KeyList = [ np.asarray( x ).ravel() for x in KeyList ]
+    numRows = len( KeyList[0] )
+    if numRows == 0:
+        return [ x[:0] for x in KeyList ], np.zeros( 0, dtype=np.int64 )
+    # end if
+    if len( KeyList ) == 1:
+        UKey, Inverse = np.unique( KeyList[0], return_inverse=True )
+        return [ UKey ], Inverse.astype( np.int64, copy=False )
+    # end if
+    # last key is the primary sort key for lexsort
+    Order = np.lexsort( KeyList[::-1] )
+    IsNew = np.zeros( numRows, dtype=bool )
+    IsNew[0] = True
+    for cKey in KeyList:
+        SortKey = cKey[Order]
+        IsNew[1:] |= ( SortKey[1:] != SortKey[:-1] )
+    # end for
+    Inverse = np.empty( numRows, dtype=np.int64 )
+    Inverse[Order] = np.cumsum( IsNew ) - 1
+    FirstRows = Order[IsNew]
+    return [ x[FirstRows] for x in KeyList ], Inverse
+
+
+def groupSum( Values, KeyList ):
+    """Sum values by group.
+
+    Parameters
+    ----------
+    Values : array-like
+        Values to sum, like costs.
+    KeyList : list of array-like
+        Key arrays with the same length as Values.
+
+    Returns
+    -------
+    UKeys : list of np.ndarray
+        Unique key values from groupKeys.
+    Sums : np.ndarray
+        float64 sum for each group.
+
+    """
+    # start
+    UKeys, Inverse = groupKeys( KeyList )
+    Sums = np.bincount( Inverse, weights=np.asarray( Values, dtype=np.float64 ).ravel(),
+                        minlength=len( UKeys[0] ) )
+    return UKeys, Sums
+
+
+def costTotals( TableDF, by=( "Realization", ), costCol="Cost_Estimate",
+                depthCol="FloodDepth_m" ):
+    """Total damage cost by group for a building level table.
+
+    Parameters
+    ----------
+    TableDF : pd.DataFrame
+        Building level table, like FullHouseRealDF or a long-format
+        results table.
+    by : sequence, optional
+        Key columns. "Year" is taken from the "Date" column when it is not
+        a column. The default is ( "Realization", ).
+    costCol : str, optional
+        Cost column. If not in TableDF, costs are calculated from depthCol.
+        The default is "Cost_Estimate".
+    depthCol : str, optional
+        Flood depth column. The default is "FloodDepth_m".
+
+    Returns
+    -------
+    TotalDF : pd.DataFrame
+        The by columns and "Total_Cost", one row per group in key order.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    KeyList = list()
+    for cName in by:
+        if ( cName == "Year" ) and ( not cName in TableDF.columns ):
+            KeyList.append( pd.DatetimeIndex( TableDF["Date"] ).year.to_numpy() )
+        else:
+            KeyList.append( TableDF[cName].to_numpy() )
+        # end if
+    # end for
+    if costCol in TableDF.columns:
+        Costs = TableDF[costCol].to_numpy()
+    else:
+        Costs = costCalcArray( TableDF[depthCol].to_numpy() )
+    # end if
+    UKeys, Sums = groupSum( Costs, KeyList )
+    DataDict = dict()
+    for cName, cKey in zip( by, UKeys ):
+        DataDict[cName] = cKey
+    # end for
+    DataDict["Total_Cost"] = Sums
+    return pd.DataFrame( data=DataDict )
+
+
+#EOF
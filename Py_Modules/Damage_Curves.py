@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Damage_Curves
+   :platform: Windows, Linux
+   :synopsis: Registry of table-driven and polynomial depth-damage curves
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides a registry of depth-damage curves. Curves are either tables of
+depth and cost points, like the FEMA NFIP flood damage cost calculator
+table in Damage_Cost/NFIP_Cost_Estimator.xlsx, or polynomials like the
+fitted quartic in Damage_Cost. Tables are read once and held in the
+registry. Table curves are evaluated with vectorized piecewise linear or
+monotone cubic (PCHIP) interpolation.
+
+Several curves, like structure and contents curves or alternative
+coefficient sets, are evaluated together for an array of flood depths.
+For the events by buildings flood depths the result is an events by
+buildings by curves array so that damage model sensitivity can be
+studied from one set of depths.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import numpy as np
+
+# local modules
+import Damage_Cost as dcost
+
+# parameters
+NFIP_XLSX = os.path.normpath( os.path.join( os.path.dirname( os.path.abspath( __file__ ) ),
+                              "..", "Damage_Cost", "NFIP_Cost_Estimator.xlsx" ) )
+NFIP_SHEET = "Cost_of_flooding"
+#   0-based row of the column headers in NFIP_SHEET
+NFIP_HEADER_ROW = 3
+NFIP_DEPTH_COL = "Depth (m)"
+NFIP_COST_COL = "Cost ($)"
+INTERP_METHODS = ( "linear", "pchip" )
+#   registered curves by name
+CURVE_REGISTRY = dict()
+
+
+# functions
+def readCostTable( xlsxFile=NFIP_XLSX, sheetName=NFIP_SHEET,
+                   headerRow=NFIP_HEADER_ROW, depthCol=NFIP_DEPTH_COL,
+                   costCol=NFIP_COST_COL ):
+    """Read depth and cost points from a spreadsheet table.
+
+    Parameters
+    ----------
+    xlsxFile : str, optional
+        FQDN for the workbook. The default is NFIP_XLSX.
+    sheetName : str, optional
+        Sheet name. The default is NFIP_SHEET.
+    headerRow : int, optional
+        0-based row with the column headers. The default is
+        NFIP_HEADER_ROW.
+    depthCol : str, optional
+        Depth column, m. The default is NFIP_DEPTH_COL.
+    costCol : str, optional
+        Cost column. The default is NFIP_COST_COL.
+
+    Returns
+    -------
+    Depths : np.ndarray
+        float64 depths, m, in increasing order.
+    Costs : np.ndarray
+        float64 costs.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    TableDF = pd.read_excel( xlsxFile, sheet_name=sheetName, header=headerRow,
+                             usecols=[ depthCol, costCol ] )
+    # notes below the table have no cost
+    TableDF = TableDF.apply( pd.to_numeric, errors="coerce" ).dropna()
+    TableDF = TableDF.sort_values( depthCol, kind="stable" )
+    Depths = TableDF[depthCol].to_numpy( dtype=np.float64 )
+    Costs = TableDF[costCol].to_numpy( dtype=np.float64 )
+    return Depths, Costs
+
+
+def makeTableCurve( Depths, Costs, method="linear" ):
+    """Make a table curve.
+
+    Depths at or below 0.0 have no cost. Depths between 0.0 and the first
+    table depth have the first table cost, and depths beyond the last
+    table depth have the last table cost.
+
+    Parameters
+    ----------
+    Depths : array-like
+        Table depths, m, strictly increasing.
+    Costs : array-like
+        Table costs.
+    method : str, optional
+        "linear" or "pchip". The default is "linear".
+
+    Returns
+    -------
+    Curve : dict
+        "kind" is "table", "method", "x" and "y" are the points, and
+        "interp" is the PCHIP interpolator or None.
+
+    """
+    # globals
+    global INTERP_METHODS
+    # start
+    if not method in INTERP_METHODS:
+        raise ValueError( "Unknown interpolation method %s" % method )
+    # end if
+    Curve = dict()
+    Curve["kind"] = "table"
+    Curve["method"] = method
+    Curve["x"] = np.array( Depths, dtype=np.float64 )
+    Curve["y"] = np.array( Costs, dtype=np.float64 )
+    if np.any( np.diff( Curve["x"] ) <= 0.0 ):
+        raise ValueError( "Table depths must be strictly increasing" )
+    # end if
+    Curve["interp"] = None
+    if method == "pchip":
+        from scipy.interpolate import PchipInterpolator
+        Curve["interp"] = PchipInterpolator( Curve["x"], Curve["y"],
+                                             extrapolate=False )
+    # end if
+    return Curve
+
+
+def makePolyCurve( Coeffs=dcost.COST_COEFFS, maxCost=dcost.MAX_COST,
+                   maxDepth=dcost.MAX_DEPTH ):
+    """Make a polynomial curve, like the fitted quartic.
+
+    Parameters
+    ----------
+    Coeffs : sequence, optional
+        Coefficients from the highest power to x^0. The default is
+        Damage_Cost.COST_COEFFS.
+    maxCost : float, optional
+        Maximum cost. The default is Damage_Cost.MAX_COST.
+    maxDepth : float, optional
+        Depth at and above which the cost is maxCost. The default is
+        Damage_Cost.MAX_DEPTH.
+
+    Returns
+    -------
+    Curve : dict
+        "kind" is "poly" with "coeffs", "maxcost", and "maxdepth".
+
+    """
+    # start
+    Curve = dict()
+    Curve["kind"] = "poly"
+    Curve["coeffs"] = tuple( float( x ) for x in Coeffs )
+    Curve["maxcost"] = float( maxCost )
+    Curve["maxdepth"] = float( maxDepth )
+    return Curve
+
+
+def registerCurve( name, Curve ):
+    """Add or replace a curve in the registry.
+
+    Parameters
+    ----------
+    name : str
+        Curve name.
+    Curve : dict
+        From makeTableCurve or makePolyCurve.
+
+    Returns
+    -------
+    Curve : dict
+        The registered curve.
+
+    """
+    # globals
+    global CURVE_REGISTRY
+    # start
+    CURVE_REGISTRY[name] = Curve
+    return Curve
+
+
+def loadDefaultCurves( xlsxFile=NFIP_XLSX ):
+    """Register the NFIP table curves and the fitted quartic. The table is
+    only read if the NFIP curves are not already registered.
+
+    Parameters
+    ----------
+    xlsxFile : str, optional
+        FQDN for the NFIP workbook. The default is NFIP_XLSX.
+
+    Returns
+    -------
+    CurveNames : list
+        Names of the default curves.
+
+    """
+    # globals
+    global CURVE_REGISTRY
+    # start
+    CurveNames = [ "Quartic", "NFIP_Linear", "NFIP_PCHIP" ]
+    if not "Quartic" in CURVE_REGISTRY:
+        registerCurve( "Quartic", makePolyCurve() )
+    # end if
+    if ( not "NFIP_Linear" in CURVE_REGISTRY ) or \
+            ( not "NFIP_PCHIP" in CURVE_REGISTRY ):
+        Depths, Costs = readCostTable( xlsxFile=xlsxFile )
+        registerCurve( "NFIP_Linear", makeTableCurve( Depths, Costs, method="linear" ) )
+        registerCurve( "NFIP_PCHIP", makeTableCurve( Depths, Costs, method="pchip" ) )
+    # end if
+    return CurveNames
+
+
+def evalCurve( Curve, Depths, out=None ):
+    """Evaluate a curve for an array of flood depths.
+
+    Parameters
+    ----------
+    Curve : dict
+        From makeTableCurve or makePolyCurve.
+    Depths : array-like
+        Flood depths, m. Any shape.
+    out : np.ndarray, optional
+        float64 output array with the shape of Depths. Can be a strided
+        view. The default is None.
+
+    Returns
+    -------
+    Costs : np.ndarray
+        float64 costs, same shape as Depths. NaN depths give NaN costs.
+
+    """
+    # start
+    Depths = np.asarray( Depths, dtype=np.float64 )
+    if Curve["kind"] == "poly":
+        return dcost.costCalcArray( Depths, Coeffs=Curve["coeffs"],
+                                    maxCost=Curve["maxcost"],
+                                    maxDepth=Curve["maxdepth"], out=out )
+    # end if
+    if out is None:
+        out = np.empty( Depths.shape, dtype=np.float64 )
+    # end if
+    xPts = Curve["x"]
+    yPts = Curve["y"]
+    Clipped = np.clip( Depths, xPts[0], xPts[-1] )
+    if Curve["method"] == "linear":
+        out[...] = np.interp( Clipped, xPts, yPts )
+    else:
+        out[...] = Curve["interp"]( Clipped )
+    # end if
+    np.putmask( out, Depths <= 0.0, 0.0 )
+    np.putmask( out, np.isnan( Depths ), np.nan )
+    return out
+
+
+def evalCurves( Depths, CurveNames=None ):
+    """Evaluate several registered curves for an array of flood depths.
+
+    Parameters
+    ----------
+    Depths : array-like
+        Flood depths, m, like events by buildings.
+    CurveNames : list, optional
+        Registered curve names. If None, the default curves from
+        loadDefaultCurves. The default is None.
+
+    Returns
+    -------
+    Costs : np.ndarray
+        float64 costs with shape Depths.shape + ( number of curves, ). A
+        view of a curves first array.
+    CurveNames : list
+        Curve names in the order of the last axis.
+
+    """
+    # globals
+    global CURVE_REGISTRY
+    # start
+    if CurveNames is None:
+        CurveNames = loadDefaultCurves()
+    # end if
+    Depths = np.asarray( Depths, dtype=np.float64 )
+    # curves first so that each curve is written to contiguous memory
+    CurveCosts = np.empty( ( len( CurveNames ), ) + Depths.shape, dtype=np.float64 )
+    for iI, cName in enumerate( CurveNames ):
+        evalCurve( CURVE_REGISTRY[cName], Depths, out=CurveCosts[iI] )
+    # end for
+    return np.moveaxis( CurveCosts, 0, -1 ), list( CurveNames )
+
+
+#EOF
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Deck_Templates
+   :platform: Windows, Linux
+   :synopsis: In-memory MOD_FreeSurf2D input deck templates
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides an in-memory template for the MOD_FreeSurf2D input deck. The
+model files are read once and the input file is scanned once for the
+inflow boundary slots. Per-event decks are then rendered by substituting
+only the boundary slot lines. Files that never change, like Mann.txt, are
+hard-linked into run directories instead of copied.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import shutil
+
+# parameters
+KW_IN_VEL = "VELDYVEL"
+KW_IN_DEP = "TDEPDYDEP"
+CELL_LENGTH = 5.0
+
+
+# functions
+def findBndIndex( curDischarge, InflowBound ):
+    """Find the inflow boundary specification for a discharge.
+
+    Parameters
+    ----------
+    curDischarge : float
+        Discharge in cms.
+    InflowBound : dict
+        Inflow boundary specifications, INFLOW_BOUND in the branch scripts.
+        Values are [max discharge, min discharge, reference elevation,
+        list of column indexes].
+
+    Returns
+    -------
+    bndIndex : int
+        Key into InflowBound, -1 if no specification covers the discharge.
+
+    """
+    # start
+    for iI in range( len( InflowBound ) ):
+        maxDischarge = InflowBound[iI][0]
+        minDischarge = InflowBound[iI][1]
+        if (curDischarge > minDischarge) and (curDischarge <= maxDischarge):
+            return iI
+        # end if
+    # end for
+    return -1
+
+
+def inflowDepths( curDischarge, bndIndex, InflowBound, InflowTopo, numCols ):
+    """Calculate the Dirichlet total depth values across the inflow boundary.
+
+    Parameters
+    ----------
+    curDischarge : float
+        Discharge in cms.
+    bndIndex : int
+        Key into InflowBound from findBndIndex.
+    InflowBound : dict
+        Inflow boundary specifications.
+    InflowTopo : dict
+        Topographic elevation by column index for the inflow boundary.
+    numCols : int
+        Number of columns in the domain.
+
+    Returns
+    -------
+    newDepths : list
+        numCols depth values.
+
+    """
+    # globals
+    global CELL_LENGTH
+    # start
+    newDepths = [ 0.0 for x in range(numCols) ]
+    setLocs = InflowBound[bndIndex][3]
+    numLocs = len( setLocs )
+    lowerDischarge = InflowBound[bndIndex][1]
+    topHeight = ( ( curDischarge - lowerDischarge) /
+                 ( float( numLocs ) * CELL_LENGTH * 1.0 ) )
+    adjElev = InflowTopo[setLocs[0]]
+    for cC in range(numLocs):
+        if ( cC == 0 ) or ( cC == numLocs-1 ):
+            newDepths[setLocs[cC]] = topHeight
+        else:
+            newDepths[setLocs[cC]]  = ( ( adjElev - InflowTopo[setLocs[cC]] )
+                                        + topHeight )
+        # end if
+    # end for
+    return newDepths
+
+
+def inflowVels( bndIndex, InflowBound, numCols ):
+    """Dirichlet velocity values across the inflow boundary.
+
+    Parameters
+    ----------
+    bndIndex : int
+        Key into InflowBound from findBndIndex.
+    InflowBound : dict
+        Inflow boundary specifications.
+    numCols : int
+        Number of columns in the domain.
+
+    Returns
+    -------
+    newVels : list
+        numCols velocity values.
+
+    """
+    # start
+    newVels = [ 0.0 for x in range(numCols) ]
+    for cC in InflowBound[bndIndex][3]:
+        newVels[cC] = 1.0
+    # end for
+    return newVels
+
+
+def formatBndLine( keyWord, bndValues ):
+    """Make an input deck line for a boundary keyword.
+
+    Parameters
+    ----------
+    keyWord : str
+        Input deck keyword.
+    bndValues : list
+        Values, one per column.
+
+    Returns
+    -------
+    newLiner : str
+        Line with the end line character.
+
+    """
+    # start
+    newLiner = "%s = " % keyWord
+    newLiner += "".join( [ "%5.2f " % x for x in bndValues ] )
+    newLiner += "\n"
+    return newLiner
+
+
+def findSlots( AllLines ):
+    """Find the line indexes of the inflow boundary keywords in an input deck.
+
+    Parameters
+    ----------
+    AllLines : list
+        Input deck lines.
+
+    Returns
+    -------
+    SlotDict : dict
+        Keyword to line index for KW_IN_DEP and KW_IN_VEL. Keywords that
+        are not found are not in the dictionary.
+
+    """
+    # globals
+    global KW_IN_DEP, KW_IN_VEL
+    # start
+    SlotDict = dict()
+    lCnt = 0
+    for tLine in AllLines:
+        stripLine = tLine.strip()
+        if ( len(stripLine) < 3 ) or ( stripLine[0] == "#" ) or \
+                ( not "=" in stripLine ):
+            lCnt += 1
+            continue
+        # end checks
+        cKey = stripLine.split("=")[0].strip()
+        if cKey in [ KW_IN_DEP, KW_IN_VEL ]:
+            SlotDict[cKey] = lCnt
+        # end if
+        lCnt += 1
+    # end for
+    return SlotDict
+
+
+def loadDeckTemplates( modFilesDir, inputName, fileNames ):
+    """Read the model files once and hold them in memory.
+
+    Parameters
+    ----------
+    modFilesDir : str
+        FQDN for the model files directory.
+    inputName : str
+        Name of the input deck file, like input.txt.
+    fileNames : list
+        Other model file names to hold, like Depth.txt.
+
+    Returns
+    -------
+    Templates : dict
+        "dir" is modFilesDir, "input" is the list of input deck lines,
+        "slots" is the dictionary from findSlots, and "files" is a
+        dictionary of file name to file contents as bytes.
+
+    """
+    # start
+    Templates = dict()
+    Templates["dir"] = modFilesDir
+    with open( os.path.join( modFilesDir, inputName ), 'r' ) as Inf:
+        Templates["input"] = Inf.readlines()
+    # end with
+    Templates["slots"] = findSlots( Templates["input"] )
+    Templates["files"] = dict()
+    for tName in fileNames:
+        with open( os.path.join( modFilesDir, tName ), 'rb' ) as Inf:
+            Templates["files"][tName] = Inf.read()
+        # end with
+    # end for
+    return Templates
+
+
+def renderInputDeck( Templates, curDischarge, InflowBound, InflowTopo,
+                     numCols, setVelocity=False ):
+    """Render the input deck for one discharge.
+
+    Parameters
+    ----------
+    Templates : dict
+        From loadDeckTemplates.
+    curDischarge : float
+        Discharge in cms.
+    InflowBound : dict
+        Inflow boundary specifications.
+    InflowTopo : dict
+        Topographic elevation by column index for the inflow boundary.
+    numCols : int
+        Number of columns in the domain.
+    setVelocity : bool, optional
+        Also substitute the velocity slot. The original driver inflow
+        boundary rewrite never matched the velocity keyword, because the
+        keyword was compared without stripping, so the default of False
+        reproduces the archived runs.
+        The default is False.
+
+    Returns
+    -------
+    retStatus : int
+        0 == success, 1 == no boundary specification for the discharge.
+    deckStr : str
+        Rendered input deck, empty on failure.
+
+    """
+    # globals
+    global KW_IN_DEP, KW_IN_VEL
+    # parameters
+    goodReturn = 0
+    badReturn = 1
+    # start
+    bndIndex = findBndIndex( curDischarge, InflowBound )
+    if bndIndex == -1:
+        return badReturn, ""
+    # end if
+    OutLines = list( Templates["input"] )
+    if KW_IN_DEP in Templates["slots"]:
+        newDepths = inflowDepths( curDischarge, bndIndex, InflowBound,
+                                  InflowTopo, numCols )
+        OutLines[Templates["slots"][KW_IN_DEP]] = formatBndLine( KW_IN_DEP,
+                                                                  newDepths )
+    # end if
+    if setVelocity and ( KW_IN_VEL in Templates["slots"] ):
+        newVels = inflowVels( bndIndex, InflowBound, numCols )
+        OutLines[Templates["slots"][KW_IN_VEL]] = formatBndLine( KW_IN_VEL,
+                                                                  newVels )
+    # end if
+    return goodReturn, "".join( OutLines )
+
+
+def writeTemplateFile( Templates, fileName, runDir ):
+    """Write a held model file into a run directory from memory.
+
+    Parameters
+    ----------
+    Templates : dict
+        From loadDeckTemplates.
+    fileName : str
+        Model file name.
+    runDir : str
+        FQDN for the run directory.
+
+    Returns
+    -------
+    outFile : str
+        FQDN for the written file.
+
+    """
+    # start
+    outFile = os.path.normpath( os.path.join( runDir, fileName ) )
+    with open( outFile, 'wb' ) as OF:
+        OF.write( Templates["files"][fileName] )
+    # end with
+    return outFile
+
+
+def placeStatic( Templates, fileName, runDir ):
+    """Place an unchanging model file in a run directory. The file is
+    hard-linked to the model files directory when possible and copied
+    otherwise. A file that is already linked is reused.
+
+    Do not use for files that are modified in the run directory because
+    modification through a hard link also modifies the source.
+
+    Parameters
+    ----------
+    Templates : dict
+        From loadDeckTemplates.
+    fileName : str
+        Model file name.
+    runDir : str
+        FQDN for the run directory.
+
+    Returns
+    -------
+    outFile : str
+        FQDN for the placed file.
+
+    """
+    # start
+    srcFile = os.path.normpath( os.path.join( Templates["dir"], fileName ) )
+    outFile = os.path.normpath( os.path.join( runDir, fileName ) )
+    if os.path.exists( outFile ):
+        if os.path.samefile( srcFile, outFile ):
+            return outFile
+        # end if
+        os.remove( outFile )
+    # end if
+    try:
+        os.link( srcFile, outFile )
+    except OSError:
+        shutil.copyfile( srcFile, outFile )
+    # end try
+    return outFile
+
+
+#EOF
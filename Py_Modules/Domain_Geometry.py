@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Domain_Geometry
+   :platform: Windows, Linux
+   :synopsis: Cached, shareable MOD_FreeSurf2D domain geometry
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides the domain geometry for a MOD_FreeSurf2D model, built once and
+shared by all consumers. The domain size and cell dimensions, NUMROWS,
+NUMCOLS, DX, and DY, are read from the input deck, input.txt. Face
+coordinates are read from the solver index files, XINDEX.txt and
+YINDEX.txt, when available and are otherwise calculated from DX and DY.
+
+The geometry is a dictionary of read-only arrays: face coordinates, cell
+center coordinates, the cell center mesh grid, and named window slices
+and cell masks, like the focus area and the building cells. Geometries
+are memoized by input file. A geometry can be placed in shared memory
+once and attached by worker processes without copying the arrays.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import numpy as np
+
+# local modules
+import Grid_IO as gio
+
+# parameters
+DIM_KEYS = ( "NUMROWS", "NUMCOLS", "DX", "DY" )
+GEOM_ARRAYS = ( "XFace", "YFace", "X", "Y", "XV", "YV" )
+#   memoized geometries by ( FQDN input file, file keys )
+GEOM_MEMO = dict()
+
+
+# functions
+def readDeckDims( inputFile ):
+    """Read the domain size and cell dimensions from an input deck.
+
+    Parameters
+    ----------
+    inputFile : str
+        FQDN for input.txt.
+
+    Returns
+    -------
+    DimDict : dict
+        "NUMROWS" and "NUMCOLS" as int and "DX" and "DY" as float.
+
+    Raises
+    ------
+    ValueError
+        If a dimension keyword is missing.
+
+    """
+    # globals
+    global DIM_KEYS
+    # start
+    DimDict = dict()
+    with open( inputFile, 'r' ) as Inf:
+        for tLine in Inf:
+            stripLine = tLine.strip()
+            if ( len(stripLine) < 3 ) or ( stripLine[0] == "#" ) or \
+                    ( not "=" in stripLine ):
+                continue
+            # end checks
+            cKey, cVal = [ x.strip() for x in stripLine.split( "=", 1 ) ]
+            if cKey in DIM_KEYS:
+                DimDict[cKey] = cVal.split()[0]
+            # end if
+        # end for
+    # end with
+    for cKey in DIM_KEYS:
+        if not cKey in DimDict:
+            raise ValueError( "%s not found in %s" % ( cKey, inputFile ) )
+        # end if
+    # end for
+    DimDict["NUMROWS"] = int( DimDict["NUMROWS"] )
+    DimDict["NUMCOLS"] = int( DimDict["NUMCOLS"] )
+    DimDict["DX"] = float( DimDict["DX"] )
+    DimDict["DY"] = float( DimDict["DY"] )
+    return DimDict
+
+
+def faceCoords( numCells, cellSize, indexFile=None, useSidecar=False,
+                sidecarDir=None ):
+    """Face coordinates along one direction.
+
+    Parameters
+    ----------
+    numCells : int
+        Number of cells.
+    cellSize : float
+        Cell dimension, m.
+    indexFile : str, optional
+        FQDN for the solver index file. Used when it exists. The default
+        is None.
+    useSidecar : bool, optional
+        Cache the index file in a .npy sidecar, see
+        Grid_IO.readGridCached. The default is False.
+    sidecarDir : str, optional
+        FQDN for the sidecar directory. The default is None.
+
+    Returns
+    -------
+    Faces : np.ndarray
+        float32 numCells + 1 face coordinates.
+
+    """
+    # start
+    if ( not indexFile is None ) and os.path.isfile( indexFile ):
+        Faces = np.array( gio.readGridCached( indexFile, dtype=np.float32,
+                                  useSidecar=useSidecar, sidecarDir=sidecarDir ) ).ravel()
+        if len( Faces ) != numCells + 1:
+            raise ValueError( "%s has %d values, expected %d" %
+                              ( indexFile, len( Faces ), numCells + 1 ) )
+        # end if
+        return Faces
+    # end if
+    return ( np.arange( numCells + 1, dtype=np.float32 ) * np.float32( cellSize ) )
+
+
+def buildGeometry( DimDict, xIndexFile=None, yIndexFile=None,
+                   useSidecar=False, sidecarDir=None ):
+    """Build a geometry from the domain dimensions.
+
+    Parameters
+    ----------
+    DimDict : dict
+        From readDeckDims.
+    xIndexFile : str, optional
+        FQDN for XINDEX.txt. The default is None.
+    yIndexFile : str, optional
+        FQDN for YINDEX.txt. The default is None.
+    useSidecar : bool, optional
+        Cache the index files in .npy sidecars. The default is False.
+    sidecarDir : str, optional
+        FQDN for the sidecar directory. The default is None.
+
+    Returns
+    -------
+    Geom : dict
+        "nrows", "ncols", "dx", and "dy"; read-only float32 arrays "XFace"
+        and "YFace" for the faces, "X" and "Y" for the cell centers, and
+        "XV" and "YV" for the ( nrows, ncols ) cell center mesh grid; and
+        "windows" and "masks" dictionaries for named window slices and
+        cell masks.
+
+    """
+    # start
+    Geom = dict()
+    Geom["nrows"] = DimDict["NUMROWS"]
+    Geom["ncols"] = DimDict["NUMCOLS"]
+    Geom["dx"] = DimDict["DX"]
+    Geom["dy"] = DimDict["DY"]
+    Geom["XFace"] = faceCoords( Geom["ncols"], Geom["dx"], indexFile=xIndexFile,
+                                useSidecar=useSidecar, sidecarDir=sidecarDir )
+    Geom["YFace"] = faceCoords( Geom["nrows"], Geom["dy"], indexFile=yIndexFile,
+                                useSidecar=useSidecar, sidecarDir=sidecarDir )
+    XFace = Geom["XFace"]
+    YFace = Geom["YFace"]
+    Geom["X"] = XFace[:-1] + ( 0.5*( XFace[1:] - XFace[:-1] ) )
+    Geom["Y"] = YFace[:-1] + ( 0.5*( YFace[1:] - YFace[:-1] ) )
+    Geom["YV"], Geom["XV"] = np.meshgrid( Geom["Y"], Geom["X"], indexing='ij' )
+    for cName in GEOM_ARRAYS:
+        Geom[cName].setflags( write=False )
+    # end for
+    Geom["windows"] = dict()
+    Geom["masks"] = dict()
+    return Geom
+
+
+def makeGeometry( inputFile, xIndexFile=None, yIndexFile=None,
+                  useSidecar=False, sidecarDir=None ):
+    """Get the memoized geometry for an input deck and index files.
+
+    Parameters
+    ----------
+    inputFile : str
+        FQDN for input.txt.
+    xIndexFile : str, optional
+        FQDN for XINDEX.txt. If None or missing, faces are calculated
+        from DX. The default is None.
+    yIndexFile : str, optional
+        FQDN for YINDEX.txt. If None or missing, faces are calculated
+        from DY. The default is None.
+    useSidecar : bool, optional
+        Cache the index files in .npy sidecars. The default is False.
+    sidecarDir : str, optional
+        FQDN for the sidecar directory. The default is None.
+
+    Returns
+    -------
+    Geom : dict
+        From buildGeometry. Shared, do not modify the arrays.
+
+    """
+    # globals
+    global GEOM_MEMO
+    # start
+    inputFile = os.path.normpath( os.path.abspath( inputFile ) )
+    FileKeys = [ gio.gridFileKey( inputFile ) ]
+    for tFile in ( xIndexFile, yIndexFile ):
+        if ( not tFile is None ) and os.path.isfile( tFile ):
+            FileKeys.append( ( os.path.abspath( tFile ), gio.gridFileKey( tFile ) ) )
+        else:
+            FileKeys.append( None )
+        # end if
+    # end for
+    memoKey = ( inputFile, tuple( FileKeys ) )
+    if not memoKey in GEOM_MEMO:
+        GEOM_MEMO[memoKey] = buildGeometry( readDeckDims( inputFile ),
+                                            xIndexFile=xIndexFile,
+                                            yIndexFile=yIndexFile,
+                                            useSidecar=useSidecar,
+                                            sidecarDir=sidecarDir )
+    # end if
+    return GEOM_MEMO[memoKey]
+
+
+def windowSlices( Geom, name, xLim, yLim ):
+    """Row and column slices of the cells with centers inside a window.
+
+    Parameters
+    ----------
+    Geom : dict
+        From makeGeometry. The slices are cached in Geom["windows"].
+    name : str
+        Window name, like "Focus".
+    xLim : tuple
+        ( minimum x, maximum x ).
+    yLim : tuple
+        ( minimum y, maximum y ).
+
+    Returns
+    -------
+    RowSlice : slice
+        Rows in the window.
+    ColSlice : slice
+        Columns in the window.
+
+    """
+    # start
+    if not name in Geom["windows"]:
+        colStart = np.searchsorted( Geom["X"], xLim[0], side="left" )
+        colEnd = np.searchsorted( Geom["X"], xLim[1], side="right" )
+        rowStart = np.searchsorted( Geom["Y"], yLim[0], side="left" )
+        rowEnd = np.searchsorted( Geom["Y"], yLim[1], side="right" )
+        Geom["windows"][name] = ( slice( int( rowStart ), int( rowEnd ) ),
+                                  slice( int( colStart ), int( colEnd ) ) )
+    # end if
+    return Geom["windows"][name]
+
+
+def cellMask( Geom, name, RowCols=None ):
+    """Boolean mask of a set of cells.
+
+    Parameters
+    ----------
+    Geom : dict
+        From makeGeometry. The mask is cached in Geom["masks"].
+    name : str
+        Mask name, like "Buildings".
+    RowCols : sequence, optional
+        1-based ( row, column ) cells, as in BUILDING_META. Only needed
+        the first time a mask is requested. The default is None.
+
+    Returns
+    -------
+    Mask : np.ndarray
+        Read-only ( nrows, ncols ) bool array.
+
+    """
+    # start
+    if not name in Geom["masks"]:
+        Mask = np.zeros( ( Geom["nrows"], Geom["ncols"] ), dtype=bool )
+        if ( not RowCols is None ) and ( len( RowCols ) > 0 ):
+            RCArray = np.asarray( RowCols, dtype=np.int64 ).reshape( ( -1, 2 ) )
+            Mask[RCArray[:, 0] - 1, RCArray[:, 1] - 1] = True
+        # end if
+        Mask.setflags( write=False )
+        Geom["masks"][name] = Mask
+    # end if
+    return Geom["masks"][name]
+
+
+def shareGeometry( Geom ):
+    """Copy the geometry arrays and masks into one shared memory block.
+
+    Parameters
+    ----------
+    Geom : dict
+        From makeGeometry.
+
+    Returns
+    -------
+    ShmBlock : multiprocessing.shared_memory.SharedMemory
+        The block. The creator must keep it open while workers use it and
+        then close and unlink it.
+    GeomSpec : dict
+        Picklable description to pass to attachGeometry in workers.
+
+    """
+    # imports
+    from multiprocessing import shared_memory
+    # globals
+    global GEOM_ARRAYS
+    # start
+    ArrayList = [ ( x, Geom[x] ) for x in GEOM_ARRAYS ]
+    ArrayList += [ ( "mask:%s" % x, y ) for x, y in Geom["masks"].items() ]
+    Layout = list()
+    offset = 0
+    for cName, cArray in ArrayList:
+        # 8 byte alignment for every array
+        offset = ( ( offset + 7 ) // 8 ) * 8
+        Layout.append( ( cName, cArray.dtype.str, cArray.shape, offset ) )
+        offset += cArray.nbytes
+    # end for
+    ShmBlock = shared_memory.SharedMemory( create=True, size=max( offset, 1 ) )
+    for ( cName, cArray ), ( lName, lDtype, lShape, lOff ) in zip( ArrayList, Layout ):
+        ShmView = np.ndarray( lShape, dtype=lDtype, buffer=ShmBlock.buf, offset=lOff )
+        ShmView[...] = cArray
+    # end for
+    GeomSpec = { "shm" : ShmBlock.name, "layout" : Layout,
+                 "nrows" : Geom["nrows"], "ncols" : Geom["ncols"],
+                 "dx" : Geom["dx"], "dy" : Geom["dy"],
+                 "windows" : dict( Geom["windows"] ), }
+    return ShmBlock, GeomSpec
+
+
+def attachGeometry( GeomSpec ):
+    """Attach to a geometry in shared memory.
+
+    Parameters
+    ----------
+    GeomSpec : dict
+        From shareGeometry.
+
+    Returns
+    -------
+    Geom : dict
+        Same contents as from makeGeometry with read-only views of the
+        shared memory. "shm" holds the attached block, which is closed
+        with detachGeometry.
+
+    """
+    # imports
+    from multiprocessing import shared_memory
+    # start
+    ShmBlock = shared_memory.SharedMemory( name=GeomSpec["shm"] )
+    Geom = { "nrows" : GeomSpec["nrows"], "ncols" : GeomSpec["ncols"],
+             "dx" : GeomSpec["dx"], "dy" : GeomSpec["dy"],
+             "windows" : dict( GeomSpec["windows"] ), "masks" : dict(),
+             "shm" : ShmBlock, }
+    for lName, lDtype, lShape, lOff in GeomSpec["layout"]:
+        ShmView = np.ndarray( lShape, dtype=lDtype, buffer=ShmBlock.buf, offset=lOff )
+        ShmView.setflags( write=False )
+        if lName.startswith( "mask:" ):
+            Geom["masks"][lName[5:]] = ShmView
+        else:
+            Geom[lName] = ShmView
+        # end if
+    # end for
+    return Geom
+
+
+def detachGeometry( Geom ):
+    """Release the arrays of an attached geometry and close the block.
+
+    Parameters
+    ----------
+    Geom : dict
+        From attachGeometry. Not usable afterwards.
+
+    Returns
+    -------
+    None.
+
+    """
+    # globals
+    global GEOM_ARRAYS
+    # start
+    for cName in GEOM_ARRAYS:
+        Geom.pop( cName, None )
+    # end for
+    Geom["masks"].clear()
+    Geom.pop( "shm" ).close()
+    # return
+    return
+
+
+#EOF
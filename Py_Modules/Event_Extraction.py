@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Event_Extraction
+   :platform: Windows, Linux
+   :synopsis: Multi-threshold peaks-over-threshold event extraction with declustering
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides peaks-over-threshold event extraction from the synthetic Frio
+weather realizations for many thresholds. The daily precipitation for
+each realization is read once and stored as a sorted precipitation index,
+the depths sorted in ascending order with their dates and an offset per
+realization. The days over any threshold are then the tail of each
+realization's block, found by binary search, so exceedance counts for
+many thresholds come from one pass over the index without re-reading
+the realizations.
+
+Exceedances can be declustered with a runs method. Days over the
+threshold that are separated by no more than the separation window,
+in days, are one cluster and only the cluster peak is an event. The rule
+to estimate discharge from precipitation depth is a function argument.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import functools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# local modules
+import Events_Cache as evc
+import Weather_Ingest as wingest
+
+# parameters
+INDEX_FILES = { "values" : "PrecipIndex_Values.npy",
+                "dates" : "PrecipIndex_Dates.npy",
+                "offsets" : "PrecipIndex_Offsets.npy",
+                "reals" : "PrecipIndex_RealNums.npy", }
+DAY_SECONDS = 86400
+
+
+# functions
+def ratioScaling( Precip, baseDischarge=wingest.EST_25YR_DISCHARGE,
+                  baseDepth=wingest.NEW_25YR ):
+    """Discharge from precipitation depth by ratio to a base event. This is
+    the rule used for the Events sheet.
+
+    Parameters
+    ----------
+    Precip : np.ndarray
+        24-hour precipitation depths, mm.
+    baseDischarge : float, optional
+        Discharge, cms, for the base event. The default is
+        EST_25YR_DISCHARGE.
+    baseDepth : float, optional
+        Precipitation depth, mm, for the base event. The default is
+        NEW_25YR.
+
+    Returns
+    -------
+    Discharge : np.ndarray
+        Discharge, cms.
+
+    """
+    # start
+    return Precip * ( baseDischarge / baseDepth )
+
+
+def readPrecipSorted( inDir, realNum ):
+    """Read one realization and sort the daily depths.
+
+    Parameters
+    ----------
+    inDir : str
+        FQDN for the directory with the realization pickles.
+    realNum : int
+        Realization number.
+
+    Returns
+    -------
+    SortVals : np.ndarray
+        Daily precipitation depths in ascending order. Ties are in date
+        order.
+    SortDates : np.ndarray
+        datetime64[s] date for each depth.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    InFiler = os.path.normpath( os.path.join( inDir, wingest.FILE_TEMP % realNum ) )
+    PrecipSer = pd.read_pickle( InFiler, compression='zip' )[wingest.PRECIP_COL]
+    Precip = PrecipSer.to_numpy()
+    SortOrder = np.argsort( Precip, kind="stable" )
+    SortDates = PrecipSer.index.to_numpy().astype( "datetime64[s]" )[SortOrder]
+    return Precip[SortOrder], SortDates
+
+
+def buildPrecipIndex( inDir, indexDir, RealNums, numProcs=None ):
+    """Read the realizations in a process pool and write the sorted
+    precipitation index.
+
+    Parameters
+    ----------
+    inDir : str
+        FQDN for the directory with the realization pickles.
+    indexDir : str
+        FQDN for the index directory.
+    RealNums : list
+        Realization numbers.
+    numProcs : int, optional
+        Number of worker processes. If None, the number of CPUs. If 1, no
+        pool is used. The default is None.
+
+    Returns
+    -------
+    PIndex : dict
+        From loadPrecipIndex.
+
+    """
+    # globals
+    global INDEX_FILES
+    # start
+    RealNums = list( RealNums )
+    numReal = len( RealNums )
+    if numProcs is None:
+        numProcs = os.cpu_count() or 1
+    # end if
+    if ( numProcs <= 1 ) or ( numReal <= 1 ):
+        SortList = [ readPrecipSorted( inDir, rR ) for rR in RealNums ]
+    else:
+        with ProcessPoolExecutor( max_workers=numProcs ) as Pool:
+            SortList = list( Pool.map( readPrecipSorted, [ inDir ] * numReal,
+                                       RealNums,
+                                       chunksize=max( 1, numReal // ( 4 * numProcs ) ) ) )
+        # end with
+    # end if
+    Offsets = np.zeros( numReal + 1, dtype=np.int64 )
+    Offsets[1:] = np.cumsum( [ len( x[0] ) for x in SortList ] )
+    os.makedirs( indexDir, exist_ok=True )
+    OutDict = { "values" : np.concatenate( [ x[0] for x in SortList ] ),
+                "dates" : np.concatenate( [ x[1] for x in SortList ] ),
+                "offsets" : Offsets,
+                "reals" : np.array( RealNums, dtype=np.int32 ), }
+    # offsets last so that they mark a complete index
+    for kName in [ "values", "dates", "reals", "offsets" ]:
+        outFile = os.path.join( indexDir, INDEX_FILES[kName] )
+        tmpFile = "%s.%d.tmp" % ( outFile, os.getpid() )
+        with open( tmpFile, 'wb' ) as OF:
+            np.save( OF, OutDict[kName] )
+        # end with
+        os.replace( tmpFile, outFile )
+    # end for
+    return loadPrecipIndex( indexDir )
+
+
+def loadPrecipIndex( indexDir ):
+    """Open the sorted precipitation index memory-mapped.
+
+    Parameters
+    ----------
+    indexDir : str
+        FQDN for the index directory.
+
+    Returns
+    -------
+    PIndex : dict
+        "values" and "dates" are the sorted depths and dates, "offsets"
+        are the block starts by realization position, and "reals" are the
+        realization numbers.
+
+    """
+    # globals
+    global INDEX_FILES
+    # start
+    PIndex = dict()
+    for kName in INDEX_FILES.keys():
+        PIndex[kName] = np.load( os.path.join( indexDir, INDEX_FILES[kName] ),
+                                 mmap_mode="r" )
+    # end for
+    return PIndex
+
+
+def exceedanceCounts( PIndex, Thresholds ):
+    """Number of days at or over each threshold for each realization.
+
+    Parameters
+    ----------
+    PIndex : dict
+        From loadPrecipIndex.
+    Thresholds : array-like
+        Precipitation depths, mm.
+
+    Returns
+    -------
+    Counts : np.ndarray
+        ( realization, threshold ) counts, realizations in PIndex["reals"]
+        order.
+
+    """
+    # start
+    Thresholds = np.atleast_1d( np.asarray( Thresholds, dtype=np.float64 ) )
+    Offsets = PIndex["offsets"]
+    numReal = len( Offsets ) - 1
+    Counts = np.zeros( ( numReal, len( Thresholds ) ), dtype=np.int64 )
+    for iR in range( numReal ):
+        CurVals = PIndex["values"][Offsets[iR]:Offsets[iR+1]]
+        Counts[iR] = len( CurVals ) - np.searchsorted( CurVals,
+                                        Thresholds.astype( CurVals.dtype ),
+                                        side="left" )
+    # end for
+    return Counts
+
+
+def extractEvents( PIndex, threshold, window=0, scaleFunc=None ):
+    """Extract the events over a threshold, with optional declustering.
+
+    Parameters
+    ----------
+    PIndex : dict
+        From loadPrecipIndex.
+    threshold : float
+        Minimum 24-hour precipitation depth, mm.
+    window : int, optional
+        Separation window in days. Exceedances no more than window days
+        apart are one cluster and only the peak is kept. 0 keeps every
+        exceedance. The default is 0.
+    scaleFunc : callable, optional
+        Function of the precipitation depth array that returns discharge.
+        If None, ratioScaling. The default is None.
+
+    Returns
+    -------
+    Events : np.ndarray
+        Events_Cache.EVENTS_DTYPE records in realization and then date
+        order with RowIndex numbered from 0.
+
+    """
+    # start
+    if scaleFunc is None:
+        scaleFunc = ratioScaling
+    # end if
+    Offsets = PIndex["offsets"]
+    numReal = len( Offsets ) - 1
+    # exceedances are the tail of each realization block
+    ValList = list()
+    DateList = list()
+    RealList = list()
+    for iR in range( numReal ):
+        CurVals = PIndex["values"][Offsets[iR]:Offsets[iR+1]]
+        iStart = Offsets[iR] + np.searchsorted( CurVals,
+                                CurVals.dtype.type( threshold ), side="left" )
+        ValList.append( PIndex["values"][iStart:Offsets[iR+1]] )
+        DateList.append( PIndex["dates"][iStart:Offsets[iR+1]] )
+        RealList.append( np.full( Offsets[iR+1] - iStart, PIndex["reals"][iR],
+                                  dtype=np.int32 ) )
+    # end for
+    ExVals = np.concatenate( ValList )
+    ExDates = np.concatenate( DateList )
+    ExReals = np.concatenate( RealList )
+    # realization and then date order
+    DOrder = np.lexsort( ( ExDates, ExReals ) )
+    ExVals = ExVals[DOrder]
+    ExDates = ExDates[DOrder]
+    ExReals = ExReals[DOrder]
+    if ( window > 0 ) and ( len( ExVals ) > 0 ):
+        ExDays = ExDates.astype( np.int64 ) // DAY_SECONDS
+        NewClust = np.r_[ True, ( np.diff( ExDays ) > window ) |
+                                ( np.diff( ExReals ) != 0 ) ]
+        ClustID = np.cumsum( NewClust ) - 1
+        # peak of each cluster, first date on ties
+        POrder = np.lexsort( ( ExDays, -ExVals.astype( np.float64 ), ClustID ) )
+        ClStarts = np.flatnonzero( np.r_[ True, np.diff( ClustID[POrder] ) != 0 ] )
+        Keep = np.sort( POrder[ClStarts] )
+        ExVals = ExVals[Keep]
+        ExDates = ExDates[Keep]
+        ExReals = ExReals[Keep]
+    # end if
+    Events = np.zeros( len( ExVals ), dtype=evc.EVENTS_DTYPE )
+    Events["RowIndex"] = np.arange( len( ExVals ), dtype=np.int64 )
+    Events["RealNum"] = ExReals
+    Events["DateTime"] = ExDates
+    Events["Precip_mm"] = ExVals
+    Events["Discharge_cms"] = scaleFunc( ExVals )
+    return Events
+
+
+def extractMulti( PIndex, Thresholds, window=0, scaleFunc=None ):
+    """Extract the events for many thresholds.
+
+    Parameters
+    ----------
+    PIndex : dict
+        From loadPrecipIndex.
+    Thresholds : array-like
+        Precipitation depths, mm.
+    window : int, optional
+        Separation window in days, see extractEvents. The default is 0.
+    scaleFunc : callable, optional
+        Discharge rule, see extractEvents. The default is None.
+
+    Returns
+    -------
+    EventsDict : dict
+        Threshold to Events_Cache.EVENTS_DTYPE records.
+
+    """
+    # start
+    EventsDict = dict()
+    for tThresh in np.atleast_1d( Thresholds ):
+        EventsDict[float( tThresh )] = extractEvents( PIndex, float( tThresh ),
+                                                      window=window,
+                                                      scaleFunc=scaleFunc )
+    # end for
+    return EventsDict
+
+
+def makeRatioScaling( baseDischarge, baseDepth ):
+    """Make a ratioScaling discharge rule for another base event.
+
+    Parameters
+    ----------
+    baseDischarge : float
+        Discharge, cms, for the base event.
+    baseDepth : float
+        Precipitation depth, mm, for the base event.
+
+    Returns
+    -------
+    scaleFunc : callable
+        Discharge rule for extractEvents.
+
+    """
+    # start
+    return functools.partial( ratioScaling, baseDischarge=baseDischarge,
+                              baseDepth=baseDepth )
+
+
+#EOF
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Event_Plots
+   :platform: Windows, Linux
+   :synopsis: Deferred, parallel rendering of event inundation maps
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides rendering of the focus area water depth and velocity maps from
+the field archive, Field_Archive, after the Monte Carlo simulations. Maps
+are not made during the simulations. Events to render can be selected by
+realization and by the event maximum flood depth at the buildings, and
+the selected events are rendered in a process pool. A low resolution
+preview mode is available for quick checks.
+
+Each worker builds the static map layers, like the buildings, labels,
+axes, and colorbar, once in a map template. Only the water depth
+contours and the velocity vectors are updated for each event.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# local modules
+import Field_Archive as farch
+
+# parameters
+PLOT_FMT = "R%04d_Fl%02d_Focus_Area_WLVel.png"
+PLOT_DPI = 600
+PREVIEW_DPI = 100
+#   focus area plot extents
+XPLOT_R = [ 100.0, 125.0, 150.0, 175.0, 200.0, 225.0, 250.0 ]
+YPLOT_R = [ 400.0, 500.0, 600.0, 700.0, 800.0, 900.0 ]
+#   velocity vectors are plotted for every QUIVER_STEP row in QUIVER_COLS
+QUIVER_STEP = 3
+QUIVER_COLS = ( 28, 42 )
+#   events per process pool task. Each task builds one map template.
+RENDER_CHUNK = 50
+
+
+# functions
+def contourLevels():
+    """Water depth contour intervals.
+
+    Returns
+    -------
+    CLevels : np.ndarray
+        float32 levels, 0.01 and then 0.5 to 20.0 by 0.5.
+
+    """
+    # start
+    CLevels = np.array( [x*0.5 for x in range(41)], dtype=np.float32 )
+    CLevels[0] = 0.01
+    return CLevels
+
+
+def buildingLayers( BuildPolys ):
+    """Extract the building outlines and label locations for plotting.
+
+    Parameters
+    ----------
+    BuildPolys : list
+        shapely Polygon for each building, in building number order.
+
+    Returns
+    -------
+    PolyLayers : list
+        [ x list, y list, label x, label y ] for each building. Plain lists
+        so that they can be sent to worker processes.
+
+    """
+    # start
+    PolyLayers = list()
+    for tPoly in BuildPolys:
+        pX, pY = tPoly.exterior.xy
+        cCCoords = tPoly.representative_point().coords[:][0]
+        PolyLayers.append( [ list( pX ), list( pY ), float( cCCoords[0] ),
+                             float( cCCoords[1] ) ] )
+    # end for
+    return PolyLayers
+
+
+def makeMapTemplate( XPts, YPts, PolyLayers ):
+    """Build the static layers of the focus area map once.
+
+    The figure, axes, ticks, formatters, colorbar, building outlines, and
+    building labels do not change between events. Only the water depth
+    contours and the velocity vectors are updated with updateEventMap.
+
+    Parameters
+    ----------
+    XPts : np.ndarray
+        Cell center x coordinates, NCOLS.
+    YPts : np.ndarray
+        Cell center y coordinates, NROWS.
+    PolyLayers : list
+        From buildingLayers.
+
+    Returns
+    -------
+    Template : dict
+        "fig" and "ax" are the figure and axes, "XV" and "YV" are the mesh
+        grid, "levels" are the contour levels, "contour" is the current
+        contour set, and "quiver" is the velocity vector artist.
+
+    """
+    # imports
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import PatchCollection
+    from matplotlib.patches import Polygon
+    # globals
+    global XPLOT_R, YPLOT_R, QUIVER_STEP, QUIVER_COLS
+    # start
+    YV, XV = np.meshgrid( YPts, XPts, indexing='ij' )
+    CLevels = contourLevels()
+    qS = QUIVER_STEP
+    qC0, qC1 = QUIVER_COLS
+    xplotR = XPLOT_R
+    yplotR = YPLOT_R
+    ZeroGrid = np.zeros( XV.shape, dtype=np.float32 )
+    Fig1 = plt.figure()
+    Fig1.set_size_inches(5.0, 8.0)
+    ax11 = Fig1.add_subplot(1,1,1)
+    wd = ax11.contourf( XV, YV, ZeroGrid, levels=CLevels, cmap='Blues', vmin=0.01, vmax=20.0, zorder=20.0)
+    qv = ax11.quiver( XV[::qS, qC0:qC1:1], YV[::qS, qC0:qC1:1], ZeroGrid[::qS, qC0:qC1:1],
+                      ZeroGrid[::qS, qC0:qC1:1], headwidth=5, color='xkcd:tangerine', scale=30,
+                      zorder=50.0 )
+    ax11.set_ylabel( "Northing (m)", fontsize=10)
+    ax11.set_xlabel( "Easting (m)", fontsize=10)
+    ax11.set_xticks( xplotR )
+    ax11.set_yticks( yplotR )
+    cb = Fig1.colorbar( wd, ax=ax11, orientation='vertical',)
+    cb.ax.tick_params(labelsize=8)
+    cb.set_label( 'Water Depth (m)', fontsize=9 )
+    # all buildings in one collection
+    BuildPatches = [ Polygon( np.column_stack( [ pX, pY ] ), closed=True )
+                     for pX, pY, lX, lY in PolyLayers ]
+    ax11.add_collection( PatchCollection( BuildPatches, edgecolor='xkcd:medium grey',
+                                          facecolor='xkcd:medium grey', linewidth=1,
+                                          zorder=25.0, alpha=1.0 ), autolim=False )
+    pCnt = 0
+    for pX, pY, lX, lY in PolyLayers:
+        zAnno = pCnt + 50.0
+        labelstr = "%d" % (pCnt+1)
+        ax11.text( lX-5.0, lY-5.0, labelstr, color='xkcd:cyan', fontsize=7, fontweight='normal', zorder=zAnno )
+        pCnt += 1
+    # end for
+    ax11.grid( visible=True, which='major', axis='y' )
+    ax11.set_xlim( (xplotR[0], xplotR[len(xplotR)-1]) )
+    ax11.set_ylim( (yplotR[0], yplotR[len(yplotR)-1]) )
+    ax11.tick_params(axis='both', which='major', labelsize=9)
+    ax11.xaxis.set_major_formatter( mpl.ticker.StrMethodFormatter( "{x:,.0f}" ) )
+    ax11.yaxis.set_major_formatter( mpl.ticker.StrMethodFormatter( "{x:,.0f}" ) )
+    Template = { "fig" : Fig1, "ax" : ax11, "XV" : XV, "YV" : YV,
+                 "levels" : CLevels, "contour" : wd, "quiver" : qv, }
+    return Template
+
+
+def updateEventMap( Template, outFile, H, U, V, dpi=PLOT_DPI ):
+    """Update the event layers of a map template and write the image.
+
+    Parameters
+    ----------
+    Template : dict
+        From makeMapTemplate. The contour set is replaced.
+    outFile : str
+        FQDN for the output image.
+    H : np.ndarray
+        ( NROWS, NCOLS ) water depth.
+    U : np.ndarray
+        ( NROWS, NCOLS ) x velocity at cell centers.
+    V : np.ndarray
+        ( NROWS, NCOLS ) y velocity at cell centers.
+    dpi : int, optional
+        Output resolution. The default is PLOT_DPI.
+
+    Returns
+    -------
+    None.
+
+    """
+    # globals
+    global QUIVER_STEP, QUIVER_COLS
+    # start
+    qS = QUIVER_STEP
+    qC0, qC1 = QUIVER_COLS
+    # contour sets cannot be updated in place so are replaced
+    Template["contour"].remove()
+    Template["contour"] = Template["ax"].contourf( Template["XV"], Template["YV"], H,
+                                                   levels=Template["levels"], cmap='Blues',
+                                                   vmin=0.01, vmax=20.0, zorder=20.0 )
+    Template["quiver"].set_UVC( U[::qS, qC0:qC1:1], V[::qS, qC0:qC1:1] )
+    Template["fig"].savefig( outFile, dpi=dpi )
+    # return
+    return
+
+
+def closeMapTemplate( Template ):
+    """Close the figure of a map template.
+
+    Parameters
+    ----------
+    Template : dict
+        From makeMapTemplate.
+
+    Returns
+    -------
+    None.
+
+    """
+    # imports
+    import matplotlib.pyplot as plt
+    # start
+    Template["fig"].clf()
+    plt.close(fig=Template["fig"])
+    # return
+    return
+
+
+def plotEventMap( outFile, XPts, YPts, H, U, V, PolyLayers, dpi=PLOT_DPI ):
+    """Plot the focus area water depth and velocity map for one event.
+
+    Use makeMapTemplate and updateEventMap directly for many events.
+
+    Parameters
+    ----------
+    outFile : str
+        FQDN for the output image.
+    XPts : np.ndarray
+        Cell center x coordinates, NCOLS.
+    YPts : np.ndarray
+        Cell center y coordinates, NROWS.
+    H : np.ndarray
+        ( NROWS, NCOLS ) water depth.
+    U : np.ndarray
+        ( NROWS, NCOLS ) x velocity at cell centers.
+    V : np.ndarray
+        ( NROWS, NCOLS ) y velocity at cell centers.
+    PolyLayers : list
+        From buildingLayers.
+    dpi : int, optional
+        Output resolution. The default is PLOT_DPI.
+
+    Returns
+    -------
+    None.
+
+    """
+    # start
+    Template = makeMapTemplate( XPts, YPts, PolyLayers )
+    updateEventMap( Template, outFile, H, U, V, dpi=dpi )
+    closeMapTemplate( Template )
+    # return
+    return
+
+
+def selectEvents( EventDF, RealNums=None, minFloodDepth=None ):
+    """Select events to render.
+
+    Parameters
+    ----------
+    EventDF : pd.DataFrame
+        Events with "Realization", "Flood_Num", and, for minFloodDepth,
+        "Max_Flood_Depth_m". Repeated rows, like from the long-format
+        results table, are reduced to one row per event.
+    RealNums : list, optional
+        Realizations to keep. If None, all realizations. The default is
+        None.
+    minFloodDepth : float, optional
+        Keep only events with Max_Flood_Depth_m greater than this. If
+        None, no depth selection. The default is None.
+
+    Returns
+    -------
+    EventKeys : list
+        ( realization, flood index ) tuples in realization and flood order.
+
+    """
+    # start
+    SelDF = EventDF.drop_duplicates( subset=[ "Realization", "Flood_Num" ] )
+    if not RealNums is None:
+        SelDF = SelDF[SelDF["Realization"].isin( list( RealNums ) )]
+    # end if
+    if not minFloodDepth is None:
+        SelDF = SelDF[SelDF["Max_Flood_Depth_m"] > minFloodDepth]
+    # end if
+    SelDF = SelDF.sort_values( [ "Realization", "Flood_Num" ], kind="stable" )
+    return [ ( int( rR ), int( fF ) ) for rR, fF in
+             zip( SelDF["Realization"], SelDF["Flood_Num"] ) ]
+
+
+def renderChunk( archDir, outDir, EventKeys, PolyLayers, dpi=PLOT_DPI ):
+    """Render maps for a list of events from the consolidated archive.
+
+    Parameters
+    ----------
+    archDir : str
+        FQDN for the field archive directory.
+    outDir : str
+        FQDN for the output directory.
+    EventKeys : list
+        ( realization, flood index ) tuples.
+    PolyLayers : list
+        From buildingLayers.
+    dpi : int, optional
+        Output resolution. The default is PLOT_DPI.
+
+    Returns
+    -------
+    MissingKeys : list
+        Events that are not in the archive.
+
+    """
+    # imports
+    import matplotlib
+    # globals
+    global PLOT_FMT
+    # start
+    matplotlib.use( "Agg" )
+    ArchDict = farch.openArchive( archDir )
+    MissingKeys = list()
+    Template = None
+    for cKey in EventKeys:
+        if not cKey in ArchDict["index"]:
+            MissingKeys.append( cKey )
+            continue
+        # end if
+        if Template is None:
+            Template = makeMapTemplate( ArchDict["X"], ArchDict["Y"], PolyLayers )
+        # end if
+        eI = ArchDict["index"][cKey]
+        OutFilePNG = os.path.normpath( os.path.join( outDir, PLOT_FMT % cKey ) )
+        updateEventMap( Template, OutFilePNG, ArchDict["H"][eI],
+                        ArchDict["U"][eI], ArchDict["V"][eI], dpi=dpi )
+    # end for
+    if not Template is None:
+        closeMapTemplate( Template )
+    # end if
+    return MissingKeys
+
+
+def renderEvents( archDir, outDir, EventKeys, PolyLayers, dpi=PLOT_DPI,
+                  numProcs=None, chunkSize=RENDER_CHUNK ):
+    """Render maps for the selected events in a process pool.
+
+    Parameters
+    ----------
+    archDir : str
+        FQDN for the consolidated field archive directory.
+    outDir : str
+        FQDN for the output directory. Made if it does not exist.
+    EventKeys : list
+        ( realization, flood index ) tuples, like from selectEvents.
+    PolyLayers : list
+        From buildingLayers.
+    dpi : int, optional
+        Output resolution. Use PREVIEW_DPI for previews. The default is
+        PLOT_DPI.
+    numProcs : int, optional
+        Number of worker processes. If None, the number of CPUs. If 1, no
+        pool is used. The default is None.
+    chunkSize : int, optional
+        Events per task. The default is RENDER_CHUNK.
+
+    Returns
+    -------
+    numRendered : int
+        Number of maps written.
+    MissingKeys : list
+        Selected events that are not in the archive.
+
+    """
+    # start
+    os.makedirs( outDir, exist_ok=True )
+    ChunkList = [ EventKeys[x:x+chunkSize] for x in
+                  range( 0, len( EventKeys ), chunkSize ) ]
+    if numProcs is None:
+        numProcs = os.cpu_count() or 1
+    # end if
+    MissingKeys = list()
+    if ( numProcs <= 1 ) or ( len( ChunkList ) <= 1 ):
+        for cChunk in ChunkList:
+            MissingKeys.extend( renderChunk( archDir, outDir, cChunk,
+                                             PolyLayers, dpi=dpi ) )
+        # end for
+    else:
+        with ProcessPoolExecutor( max_workers=min( numProcs, len( ChunkList ) ) ) as Pool:
+            FutList = [ Pool.submit( renderChunk, archDir, outDir, cChunk,
+                                     PolyLayers, dpi=dpi ) for cChunk in ChunkList ]
+            for cFut in FutList:
+                MissingKeys.extend( cFut.result() )
+            # end for
+        # end with
+    # end if
+    return ( len( EventKeys ) - len( MissingKeys ) ), MissingKeys
+
+
+#EOF
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Event_Records
+   :platform: Windows, Linux
+   :synopsis: Array-backed store of event and building inundation records
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides a compact, array-backed store for the per-event results. Event
+attributes are one structured NumPy record per event and the building
+inundation is a structured ( event, building ) array. Both are
+preallocated and typed so that adding an event is a copy into the next
+row. DataFrames are only made on export.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import numpy as np
+
+# parameters
+#   event attributes, same names as the long-format results table
+EVENT_DTYPE = np.dtype( [ ( "Realization", np.int32 ),
+                          ( "Flood_Num", np.int32 ),
+                          ( "Date", "datetime64[s]" ),
+                          ( "Precip_mm", np.float32 ),
+                          ( "Discharge_cms", np.float32 ),
+                          ( "Obstruction_Depth_m", np.float32 ),
+                          ( "Max_Water_Depth_m", np.float32 ),
+                          ( "Max_Flood_Depth_m", np.float32 ),
+                          ( "Max_U_mps", np.float32 ),
+                          ( "Max_V_mps", np.float32 ), ] )
+#   building inundation for one event. Row to FloodDepth_m are for the
+#   check cell and then the perimeter and footprint cell statistics.
+BUILD_DTYPE = np.dtype( [ ( "Building", np.int32 ),
+                          ( "Row", np.int32 ),
+                          ( "Column", np.int32 ),
+                          ( "Topo_m", np.float32 ),
+                          ( "FloorEl_m", np.float32 ),
+                          ( "FloorHeight_m", np.float32 ),
+                          ( "WaterDepth_m", np.float32 ),
+                          ( "FloodDepth_m", np.float32 ),
+                          ( "Perim_Max_WaterDepth_m", np.float32 ),
+                          ( "Perim_Mean_WaterDepth_m", np.float32 ),
+                          ( "Perim_Max_FloodDepth_m", np.float32 ),
+                          ( "Perim_Mean_FloodDepth_m", np.float32 ),
+                          ( "Foot_Max_WaterDepth_m", np.float32 ),
+                          ( "Foot_Mean_WaterDepth_m", np.float32 ),
+                          ( "Foot_Max_FloodDepth_m", np.float32 ),
+                          ( "Foot_Mean_FloodDepth_m", np.float32 ), ] )
+
+
+# functions
+def makeBuildRecord( numBuilds ):
+    """Make an empty building inundation record for one event.
+
+    Parameters
+    ----------
+    numBuilds : int
+        Number of buildings.
+
+    Returns
+    -------
+    BuildRec : np.ndarray
+        numBuilds records of BUILD_DTYPE with the building numbers, 1 to
+        numBuilds, filled in.
+
+    """
+    # globals
+    global BUILD_DTYPE
+    # start
+    BuildRec = np.zeros( numBuilds, dtype=BUILD_DTYPE )
+    BuildRec["Building"] = np.arange( 1, numBuilds + 1, dtype=np.int32 )
+    return BuildRec
+
+
+def makeRecordStore( numEvents, numBuilds ):
+    """Preallocate a record store.
+
+    Parameters
+    ----------
+    numEvents : int
+        Initial event capacity. The store grows if more are added.
+    numBuilds : int
+        Number of buildings.
+
+    Returns
+    -------
+    Store : dict
+        "events" is the EVENT_DTYPE array, "builds" is the ( event,
+        building ) BUILD_DTYPE array, and "n" is the number of events.
+
+    """
+    # globals
+    global EVENT_DTYPE, BUILD_DTYPE
+    # start
+    numEvents = max( 1, int( numEvents ) )
+    Store = dict()
+    Store["events"] = np.zeros( numEvents, dtype=EVENT_DTYPE )
+    Store["builds"] = np.zeros( ( numEvents, numBuilds ), dtype=BUILD_DTYPE )
+    Store["n"] = 0
+    return Store
+
+
+def appendEvent( Store, EventVals, BuildRec ):
+    """Add an event to the store.
+
+    Parameters
+    ----------
+    Store : dict
+        From makeRecordStore.
+    EventVals : tuple
+        Event attributes in EVENT_DTYPE order.
+    BuildRec : np.ndarray
+        Building inundation, from makeBuildRecord.
+
+    Returns
+    -------
+    evIndex : int
+        Index of the event in the store.
+
+    """
+    # start
+    evIndex = Store["n"]
+    if evIndex >= len( Store["events"] ):
+        # amortized constant time growth
+        newCap = 2 * len( Store["events"] )
+        Store["events"] = np.resize( Store["events"], newCap )
+        NewBuilds = np.zeros( ( newCap, Store["builds"].shape[1] ),
+                              dtype=Store["builds"].dtype )
+        NewBuilds[:evIndex] = Store["builds"][:evIndex]
+        Store["builds"] = NewBuilds
+    # end if
+    Store["events"][evIndex] = EventVals
+    Store["builds"][evIndex] = BuildRec
+    Store["n"] = evIndex + 1
+    return evIndex
+
+
+def clearStore( Store ):
+    """Empty the store for reuse without reallocation.
+
+    Parameters
+    ----------
+    Store : dict
+        From makeRecordStore.
+
+    Returns
+    -------
+    None.
+
+    """
+    # start
+    Store["n"] = 0
+    return
+
+
+def eventsFrame( Store ):
+    """Export the event attributes.
+
+    Parameters
+    ----------
+    Store : dict
+        From makeRecordStore.
+
+    Returns
+    -------
+    EventDF : pd.DataFrame
+        One row per event.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    return pd.DataFrame( Store["events"][:Store["n"]] )
+
+
+def longFrame( Store ):
+    """Export the long-format table, one row per event and building.
+
+    Parameters
+    ----------
+    Store : dict
+        From makeRecordStore.
+
+    Returns
+    -------
+    LongDF : pd.DataFrame
+        Event attributes, repeated for each building, and then the building
+        inundation columns. Same columns as the long-format results table.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    numEvents = Store["n"]
+    numBuilds = Store["builds"].shape[1]
+    EvRep = np.repeat( Store["events"][:numEvents], numBuilds )
+    BuildFlat = Store["builds"][:numEvents].ravel()
+    DataDict = dict()
+    for cName in EvRep.dtype.names:
+        DataDict[cName] = EvRep[cName]
+    # end for
+    for cName in BuildFlat.dtype.names:
+        DataDict[cName] = BuildFlat[cName]
+    # end for
+    return pd.DataFrame( data=DataDict )
+
+
+#EOF
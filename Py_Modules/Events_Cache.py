@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Events_Cache
+   :platform: Windows, Linux
+   :synopsis: Indexed, memory-mapped cache of the synthetic weather Events table
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides an indexed binary cache of the Events table from the synthetic
+weather events summary workbook. The workbook is converted once to a
+structured .npy file that is sorted by realization, RealNum, and an
+index of the offset of the first event for every realization. The cache
+is opened memory-mapped and the events for a realization are a slice,
+without copying or scanning the table. The cache is rebuilt when the
+workbook size or modification time changes.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import numpy as np
+
+# parameters
+EVENTS_SHEET = "Events"
+CACHE_FMT = "%s.events.npy"
+INDEX_FMT = "%s.events_index.npz"
+EVENTS_DTYPE = np.dtype( [ ( "RowIndex", np.int64 ),
+                           ( "RealNum", np.int32 ),
+                           ( "DateTime", "datetime64[s]" ),
+                           ( "Precip_mm", np.float64 ),
+                           ( "Discharge_cms", np.float64 ), ] )
+#   source key of stores made by Weather_Ingest. These stores are the
+#   events catalog and are never rebuilt from a workbook.
+INGEST_KEY = ( -1, -1 )
+
+
+# functions
+def cacheFileNames( xlsxFile, cacheDir=None ):
+    """Cache file names for an events workbook.
+
+    Parameters
+    ----------
+    xlsxFile : str
+        FQDN for the events summary workbook.
+    cacheDir : str, optional
+        FQDN for the cache directory. If None, the workbook directory.
+        The default is None.
+
+    Returns
+    -------
+    cacheFile : str
+        FQDN for the events .npy file.
+    indexFile : str
+        FQDN for the index .npz file.
+
+    """
+    # globals
+    global CACHE_FMT, INDEX_FMT
+    # start
+    if cacheDir is None:
+        cacheDir = os.path.dirname( os.path.abspath( xlsxFile ) )
+    # end if
+    baseName = os.path.splitext( os.path.basename( xlsxFile ) )[0]
+    cacheFile = os.path.normpath( os.path.join( cacheDir, CACHE_FMT % baseName ) )
+    indexFile = os.path.normpath( os.path.join( cacheDir, INDEX_FMT % baseName ) )
+    return cacheFile, indexFile
+
+
+def eventsToRecords( RealDF ):
+    """Convert an events table to cache records.
+
+    Parameters
+    ----------
+    RealDF : pd.DataFrame
+        Events table with RealNum, DateTime, Precip_mm, and Discharge_cms.
+        The index is kept as RowIndex.
+
+    Returns
+    -------
+    Events : np.ndarray
+        EVENTS_DTYPE records in RealDF order.
+
+    """
+    # globals
+    global EVENTS_DTYPE
+    # start
+    Events = np.zeros( len( RealDF ), dtype=EVENTS_DTYPE )
+    Events["RowIndex"] = RealDF.index.to_numpy( dtype=np.int64 )
+    Events["RealNum"] = RealDF["RealNum"].to_numpy( dtype=np.int32 )
+    Events["DateTime"] = RealDF["DateTime"].to_numpy( dtype="datetime64[s]" )
+    Events["Precip_mm"] = RealDF["Precip_mm"].to_numpy( dtype=np.float64 )
+    Events["Discharge_cms"] = RealDF["Discharge_cms"].to_numpy( dtype=np.float64 )
+    return Events
+
+
+def saveEventsStore( Events, cacheFile, indexFile, srcKey=( 0, 0 ) ):
+    """Sort events by realization and write the events and index files.
+
+    Parameters
+    ----------
+    Events : np.ndarray
+        EVENTS_DTYPE records.
+    cacheFile : str
+        FQDN for the events .npy file.
+    indexFile : str
+        FQDN for the index .npz file.
+    srcKey : tuple, optional
+        ( size, modification time in ns ) of the source workbook. The
+        default is ( 0, 0 ) for no source workbook. INGEST_KEY marks an
+        ingested events catalog.
+
+    Returns
+    -------
+    numEvents : int
+        Number of events in the store.
+
+    """
+    # start
+    numEvents = len( Events )
+    # stable sort keeps the event order within each realization
+    Events = Events[np.argsort( Events["RealNum"], kind="stable" )]
+    maxReal = int( Events["RealNum"].max() ) if numEvents > 0 else 0
+    Offsets = np.searchsorted( Events["RealNum"],
+                               np.arange( 0, maxReal + 2, dtype=np.int64 ),
+                               side="left" ).astype( np.int64 )
+    os.makedirs( os.path.dirname( cacheFile ), exist_ok=True )
+    # events first and then the index so that the index marks completion
+    tmpFile = "%s.%d.tmp" % ( cacheFile, os.getpid() )
+    with open( tmpFile, 'wb' ) as OF:
+        np.save( OF, Events )
+    # end with
+    os.replace( tmpFile, cacheFile )
+    tmpFile = "%s.%d.tmp" % ( indexFile, os.getpid() )
+    with open( tmpFile, 'wb' ) as OF:
+        np.savez( OF, Offsets=Offsets,
+                  SrcKey=np.array( srcKey, dtype=np.int64 ) )
+    # end with
+    os.replace( tmpFile, indexFile )
+    return numEvents
+
+
+def loadEventsStore( cacheFile, indexFile ):
+    """Open an events store memory-mapped.
+
+    Parameters
+    ----------
+    cacheFile : str
+        FQDN for the events .npy file.
+    indexFile : str
+        FQDN for the index .npz file.
+
+    Returns
+    -------
+    Cache : dict
+        "events" is the memory-mapped EVENTS_DTYPE array sorted by
+        realization, "offsets" is the index where offsets[r] is the first
+        event of realization r, and "srckey" is the source workbook key.
+
+    """
+    # start
+    Cache = dict()
+    with np.load( indexFile ) as IF:
+        Cache["offsets"] = IF["Offsets"]
+        Cache["srckey"] = tuple( int( x ) for x in IF["SrcKey"] )
+    # end with
+    Cache["events"] = np.load( cacheFile, mmap_mode="r" )
+    return Cache
+
+
+def buildEventsCache( xlsxFile, cacheDir=None ):
+    """Convert the Events sheet to the indexed binary cache.
+
+    Parameters
+    ----------
+    xlsxFile : str
+        FQDN for the events summary workbook.
+    cacheDir : str, optional
+        FQDN for the cache directory. If None, the workbook directory.
+        The default is None.
+
+    Returns
+    -------
+    numEvents : int
+        Number of events in the cache.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global EVENTS_SHEET
+    # start
+    cacheFile, indexFile = cacheFileNames( xlsxFile, cacheDir=cacheDir )
+    fStat = os.stat( xlsxFile )
+    RealDF = pd.read_excel( xlsxFile, sheet_name=EVENTS_SHEET, header=0,
+                            index_col=0, )
+    return saveEventsStore( eventsToRecords( RealDF ), cacheFile, indexFile,
+                            srcKey=( fStat.st_size, fStat.st_mtime_ns ) )
+
+
+def openEventsCache( xlsxFile, cacheDir=None ):
+    """Open the events cache, building it first if missing or stale.
+
+    If the store was made by Weather_Ingest, with INGEST_KEY, or the
+    workbook does not exist, then the store is used as is. Delete an
+    ingested store to use the workbook instead.
+
+    Parameters
+    ----------
+    xlsxFile : str
+        FQDN for the events summary workbook.
+    cacheDir : str, optional
+        FQDN for the cache directory. If None, the workbook directory.
+        The default is None.
+
+    Returns
+    -------
+    Cache : dict
+        From loadEventsStore.
+
+    """
+    # globals
+    global INGEST_KEY
+    # start
+    cacheFile, indexFile = cacheFileNames( xlsxFile, cacheDir=cacheDir )
+    haveStore = os.path.isfile( cacheFile ) and os.path.isfile( indexFile )
+    if haveStore:
+        Cache = loadEventsStore( cacheFile, indexFile )
+        if ( Cache["srckey"] == INGEST_KEY ) or ( not os.path.isfile( xlsxFile ) ):
+            return Cache
+        # end if
+        fStat = os.stat( xlsxFile )
+        if Cache["srckey"] == ( fStat.st_size, fStat.st_mtime_ns ):
+            return Cache
+        # end if
+    # end if
+    buildEventsCache( xlsxFile, cacheDir=cacheDir )
+    return loadEventsStore( cacheFile, indexFile )
+
+
+def getRealization( Cache, realNum ):
+    """Events for one realization.
+
+    Parameters
+    ----------
+    Cache : dict
+        From openEventsCache.
+    realNum : int
+        Realization number.
+
+    Returns
+    -------
+    RealEvents : np.ndarray
+        EVENTS_DTYPE records. A read-only view into the cache.
+
+    """
+    # start
+    return getRealRange( Cache, realNum, realNum )
+
+
+def getRealRange( Cache, startReal, endReal ):
+    """Events for a range of realizations.
+
+    Parameters
+    ----------
+    Cache : dict
+        From openEventsCache.
+    startReal : int
+        First realization.
+    endReal : int
+        Last realization.
+
+    Returns
+    -------
+    RealEvents : np.ndarray
+        EVENTS_DTYPE records. A read-only view into the cache.
+
+    """
+    # start
+    Offsets = Cache["offsets"]
+    maxReal = len( Offsets ) - 2
+    startReal = min( max( int( startReal ), 0 ), maxReal + 1 )
+    endReal = min( max( int( endReal ), startReal - 1 ), maxReal )
+    return Cache["events"][Offsets[startReal]:Offsets[endReal + 1]]
+
+
+def eventsFrame( RealEvents ):
+    """Make a DataFrame like the Events sheet from cache records.
+
+    Parameters
+    ----------
+    RealEvents : np.ndarray
+        EVENTS_DTYPE records, like from getRealRange.
+
+    Returns
+    -------
+    RealDF : pd.DataFrame
+        Columns RealNum, DateTime, Precip_mm, and Discharge_cms with the
+        worksheet row index.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    DataDict = { "RealNum" : RealEvents["RealNum"].astype( np.int64 ),
+                 "DateTime" : RealEvents["DateTime"].astype( "datetime64[us]" ),
+                 "Precip_mm" : np.array( RealEvents["Precip_mm"] ),
+                 "Discharge_cms" : np.array( RealEvents["Discharge_cms"] ), }
+    RealDF = pd.DataFrame( index=np.array( RealEvents["RowIndex"] ),
+                           data=DataDict )
+    return RealDF
+
+
+#EOF
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Field_Archive
+   :platform: Windows, Linux
+   :synopsis: Per-event archive of simulated water depth and velocity fields
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides an appendable archive of the full water depth, H, and cell-centered
+velocity, U and V, fields for every simulated event. Fields are float32.
+Each event is written as its own compressed chunk, so parallel workers can
+write to the same archive. Event metadata, realization, flood index, date,
+discharge, and obstruction depth, are stored with each chunk.
+
+After all events are written, consolidateArchive collects the chunks into
+coordinate arrays and one ( event, row, col ) .npy file per field. These
+are opened memory-mapped by openArchive for fast random reads.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import glob
+import numpy as np
+
+# parameters
+ARCHIVE_FIELDS = ( "H", "U", "V" )
+#   one compressed chunk file per event
+CHUNK_DIR = "Chunks"
+CHUNK_FMT = "R%04d_Fl%02d.npz"
+#   consolidated coordinates and memory-mappable fields
+GRID_FILE = "Grid.npz"
+COORDS_FILE = "Coords.npz"
+FIELD_FMT = "Field_%s.npy"
+COORD_NAMES = ( "RealNum", "FloodNum", "DateTime", "Discharge_cms",
+                "Obstruction_Depth_m" )
+
+
+# functions
+def atomicSave( outFile, saveFunc, *args, **kwargs ):
+    """Save to a temporary file in the destination directory and then move
+    to outFile so that readers never see a partial file.
+
+    Parameters
+    ----------
+    outFile : str
+        FQDN for the output file.
+    saveFunc : callable
+        Save function that takes an open file, like np.savez_compressed.
+    *args, **kwargs
+        Passed to saveFunc after the open file.
+
+    Returns
+    -------
+    None.
+
+    """
+    # start
+    tmpFile = "%s.%d.tmp" % ( outFile, os.getpid() )
+    with open( tmpFile, 'wb' ) as OF:
+        saveFunc( OF, *args, **kwargs )
+    # end with
+    os.replace( tmpFile, outFile )
+    return
+
+
+def initArchive( archDir, XPts, YPts ):
+    """Create a field archive, or check an existing one.
+
+    Parameters
+    ----------
+    archDir : str
+        FQDN for the archive directory.
+    XPts : np.ndarray
+        Cell center x-coordinates, NCOLS values.
+    YPts : np.ndarray
+        Cell center y-coordinates, NROWS values.
+
+    Returns
+    -------
+    retStatus : int
+        0 == success, 1 == existing archive has a different grid.
+
+    """
+    # globals
+    global CHUNK_DIR, GRID_FILE
+    # parameters
+    goodReturn = 0
+    badReturn = 1
+    # start
+    os.makedirs( os.path.join( archDir, CHUNK_DIR ), exist_ok=True )
+    gridFile = os.path.join( archDir, GRID_FILE )
+    XPts = np.asarray( XPts, dtype=np.float64 )
+    YPts = np.asarray( YPts, dtype=np.float64 )
+    if os.path.isfile( gridFile ):
+        with np.load( gridFile ) as GF:
+            if ( not np.array_equal( GF["X"], XPts ) ) or \
+                    ( not np.array_equal( GF["Y"], YPts ) ):
+                return badReturn
+            # end if
+        # end with
+        return goodReturn
+    # end if
+    # same contents from every writer so a race here is harmless
+    atomicSave( gridFile, np.savez, X=XPts, Y=YPts )
+    return goodReturn
+
+
+def writeEventFields( archDir, realNum, floodNum, dateTime, discharge,
+                      obstruction, H, U, V ):
+    """Write the fields for one event as a compressed chunk.
+
+    Each event is its own chunk file so writers from parallel workers
+    never share a file.
+
+    Parameters
+    ----------
+    archDir : str
+        FQDN for the archive directory.
+    realNum : int
+        Realization number or index.
+    floodNum : int
+        Flood number or index within this realization.
+    dateTime : datetime-like
+        Event date.
+    discharge : float
+        Input discharge in cms.
+    obstruction : float
+        Obstruction depth.
+    H : np.ndarray
+        NROWS by NCOLS water depth.
+    U : np.ndarray
+        NROWS by NCOLS cell-centered x-velocity.
+    V : np.ndarray
+        NROWS by NCOLS cell-centered y-velocity.
+
+    Returns
+    -------
+    chunkFile : str
+        FQDN for the chunk file.
+
+    """
+    # globals
+    global CHUNK_DIR, CHUNK_FMT
+    # start
+    chunkFile = os.path.normpath( os.path.join( archDir, CHUNK_DIR,
+                                  CHUNK_FMT % ( realNum, floodNum ) ) )
+    atomicSave( chunkFile, np.savez_compressed,
+                H=np.asarray( H, dtype=np.float32 ),
+                U=np.asarray( U, dtype=np.float32 ),
+                V=np.asarray( V, dtype=np.float32 ),
+                RealNum=np.int32( realNum ), FloodNum=np.int32( floodNum ),
+                DateTime=np.datetime64( dateTime, "s" ),
+                Discharge_cms=np.float64( discharge ),
+                Obstruction_Depth_m=np.float64( obstruction ) )
+    return chunkFile
+
+
+def readEventFields( archDir, realNum, floodNum ):
+    """Read the fields and metadata for one event from its chunk.
+
+    Parameters
+    ----------
+    archDir : str
+        FQDN for the archive directory.
+    realNum : int
+        Realization number or index.
+    floodNum : int
+        Flood number or index within this realization.
+
+    Returns
+    -------
+    EventDict : dict
+        Field name and coordinate name to value. Empty if the event is
+        not in the archive.
+
+    """
+    # globals
+    global CHUNK_DIR, CHUNK_FMT
+    # start
+    chunkFile = os.path.join( archDir, CHUNK_DIR,
+                              CHUNK_FMT % ( realNum, floodNum ) )
+    if not os.path.isfile( chunkFile ):
+        return dict()
+    # end if
+    with np.load( chunkFile ) as CF:
+        EventDict = { x : CF[x] for x in CF.files }
+    # end with
+    return EventDict
+
+
+def consolidateArchive( archDir ):
+    """Collect all event chunks into coordinate arrays and one uncompressed
+    ( event, row, col ) array per field that can be memory-mapped.
+
+    Run once after all writers are done, like with the consolidate command
+    of the drivers. The field files and coordinates are replaced one at a
+    time, so consolidations must never overlap or the files can describe
+    different events. Events are sorted by realization and flood index.
+
+    Parameters
+    ----------
+    archDir : str
+        FQDN for the archive directory.
+
+    Returns
+    -------
+    numEvents : int
+        Number of events in the archive.
+
+    """
+    # globals
+    global ARCHIVE_FIELDS, CHUNK_DIR, COORDS_FILE, FIELD_FMT, COORD_NAMES
+    # start
+    ChunkList = sorted( glob.glob( os.path.join( archDir, CHUNK_DIR, "R*_Fl*.npz" ) ) )
+    numEvents = len( ChunkList )
+    if numEvents == 0:
+        return numEvents
+    # end if
+    CoordDict = { x : list() for x in COORD_NAMES }
+    for cFile in ChunkList:
+        with np.load( cFile ) as CF:
+            for cName in COORD_NAMES:
+                CoordDict[cName].append( CF[cName][()] )
+            # end for
+            if cFile == ChunkList[0]:
+                nRows, nCols = CF["H"].shape
+            # end if
+        # end with
+    # end for
+    CoordDict = { x : np.array( CoordDict[x] ) for x in COORD_NAMES }
+    SortOrder = np.lexsort( ( CoordDict["FloodNum"], CoordDict["RealNum"] ) )
+    CoordDict = { x : CoordDict[x][SortOrder] for x in COORD_NAMES }
+    # fields are written to temporary files one event at a time
+    TmpFiles = dict()
+    FieldMaps = dict()
+    for fName in ARCHIVE_FIELDS:
+        outFile = os.path.join( archDir, FIELD_FMT % fName )
+        TmpFiles[fName] = "%s.%d.tmp" % ( outFile, os.getpid() )
+        FieldMaps[fName] = np.lib.format.open_memmap( TmpFiles[fName],
+                                mode="w+", dtype=np.float32,
+                                shape=( numEvents, nRows, nCols ) )
+    # end for
+    for eI in range( numEvents ):
+        with np.load( ChunkList[SortOrder[eI]] ) as CF:
+            for fName in ARCHIVE_FIELDS:
+                FieldMaps[fName][eI] = CF[fName]
+            # end for
+        # end with
+    # end for
+    for fName in ARCHIVE_FIELDS:
+        FieldMaps[fName].flush()
+        del FieldMaps[fName]
+        os.replace( TmpFiles[fName], os.path.join( archDir, FIELD_FMT % fName ) )
+    # end for
+    # coordinates last so that they always describe the field files
+    atomicSave( os.path.join( archDir, COORDS_FILE ), np.savez, **CoordDict )
+    return numEvents
+
+
+def openArchive( archDir ):
+    """Open a consolidated archive for random reads.
+
+    Parameters
+    ----------
+    archDir : str
+        FQDN for the archive directory.
+
+    Returns
+    -------
+    ArchDict : dict
+        "coords" is a dictionary of coordinate arrays by event, "X" and "Y"
+        are the cell center coordinates, "index" maps ( realization, flood
+        index ) to event index, and each field name is a read-only
+        memory-mapped ( event, row, col ) array.
+
+    """
+    # globals
+    global ARCHIVE_FIELDS, GRID_FILE, COORDS_FILE, FIELD_FMT
+    # start
+    ArchDict = dict()
+    with np.load( os.path.join( archDir, COORDS_FILE ) ) as CF:
+        ArchDict["coords"] = { x : CF[x] for x in CF.files }
+    # end with
+    with np.load( os.path.join( archDir, GRID_FILE ) ) as GF:
+        ArchDict["X"] = GF["X"]
+        ArchDict["Y"] = GF["Y"]
+    # end with
+    ArchDict["index"] = { ( int( rR ), int( fF ) ) : eI for eI, ( rR, fF ) in
+                          enumerate( zip( ArchDict["coords"]["RealNum"],
+                                          ArchDict["coords"]["FloodNum"] ) ) }
+    for fName in ARCHIVE_FIELDS:
+        ArchDict[fName] = np.load( os.path.join( archDir, FIELD_FMT % fName ),
+                                   mmap_mode="r" )
+    # end for
+    return ArchDict
+
+
+#EOF
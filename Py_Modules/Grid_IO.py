@@ -0,0 +1,550 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Grid_IO
+   :platform: Windows, Linux
+   :synopsis: Reading and writing of MOD_FreeSurf2D grid files
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides fast input and output for the MOD_FreeSurf2D grid files. Topo.txt
+and Depth.txt are written with a fixed-width layout of NCOLS values per
+line. A pre-rendered base buffer for these grids allows writing an event
+grid by patching only the byte ranges of the modified cells. Whole grids
+are formatted with one string operation per block of rows.
+
+Grids are read with np.loadtxt. Grids that do not change between events,
+like XINDEX.txt, can be memoized and optionally cached in a .npy sidecar
+file that is keyed by the size and modification time of the text file.
+
+For domains with millions of cells, iterGridRows streams a grid file as
+blocks of rows and readGridInto fills a preallocated, possibly
+memory-mapped, array. Both parse blocks of about GRID_BLOCK_BYTES of
+whole lines. Grids are formatted in blocks of about GRID_FORMAT_VALUES
+values.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import io
+import os
+import glob
+import numpy as np
+
+# parameters
+#   cell format used by adjustDepthandTopo for Topo.txt and Depth.txt
+GRID_CELL_FMT = "%6.2f   "
+GRID_CELL_WIDTH = 9
+#   memoized grids by ( FQDN, dtype ). Value is [ file key, array ]
+GRID_MEMO = dict()
+GRID_MEMO_MAX = 32
+SIDECAR_FMT = "%s.%d_%d.npy"
+#   large grid files are parsed in blocks of about this many bytes
+GRID_BLOCK_BYTES = 1 << 20
+#   values per block when formatting grids
+GRID_FORMAT_VALUES = 1 << 16
+
+
+# functions
+def iterFormatGrid( Grid, cellFmt=GRID_CELL_FMT, chunkVals=GRID_FORMAT_VALUES ):
+    """Format a 2D grid as text in blocks of rows, one grid row per line.
+
+    Parameters
+    ----------
+    Grid : np.ndarray
+        2D array of values.
+    cellFmt : str, optional
+        Format for each cell, including the trailing separator. The
+        default is GRID_CELL_FMT.
+    chunkVals : int, optional
+        Approximate values per block. Blocks are whole rows. The default
+        is GRID_FORMAT_VALUES.
+
+    Yields
+    ------
+    blockBytes : bytes
+        Formatted rows.
+
+    """
+    # start
+    Grid = np.asarray( Grid )
+    nRows, nCols = Grid.shape
+    rowFmt = ( cellFmt * nCols ) + "\n"
+    chunkRows = max( 1, chunkVals // max( 1, nCols ) )
+    for r0 in range( 0, nRows, chunkRows ):
+        r1 = min( r0 + chunkRows, nRows )
+        blockStr = ( rowFmt * ( r1 - r0 ) ) % tuple( Grid[r0:r1].ravel().tolist() )
+        yield blockStr.encode( "ascii" )
+    # end for
+
+
+def formatGrid( Grid, cellFmt=GRID_CELL_FMT ):
+    """Format a 2D grid as text, one grid row per line.
+
+    Parameters
+    ----------
+    Grid : np.ndarray
+        2D array of values.
+    cellFmt : str, optional
+        Format for each cell, including the trailing separator. The
+        default is GRID_CELL_FMT.
+
+    Returns
+    -------
+    gridBytes : bytes
+        Formatted grid.
+
+    """
+    # start
+    return b"".join( iterFormatGrid( Grid, cellFmt=cellFmt ) )
+
+
+def writeGrid( outFile, Grid, cellFmt=GRID_CELL_FMT ):
+    """Write a 2D grid to a text file, one grid row per line.
+
+    Parameters
+    ----------
+    outFile : str
+        FQDN for the output file.
+    Grid : np.ndarray
+        2D array of values.
+    cellFmt : str, optional
+        Format for each cell. The default is GRID_CELL_FMT.
+
+    Returns
+    -------
+    None.
+
+    """
+    # start
+    with open( outFile, 'wb' ) as OF:
+        for blockBytes in iterFormatGrid( Grid, cellFmt=cellFmt ):
+            OF.write( blockBytes )
+        # end for
+    # end with
+    # return
+    return
+
+
+def makeGridBuffer( Grid, cellFmt=GRID_CELL_FMT, cellWidth=GRID_CELL_WIDTH ):
+    """Pre-render a base grid for cell patching.
+
+    Parameters
+    ----------
+    Grid : np.ndarray
+        2D array of base values.
+    cellFmt : str, optional
+        Format for each cell. The default is GRID_CELL_FMT.
+    cellWidth : int, optional
+        Width in bytes of each formatted cell. The default is
+        GRID_CELL_WIDTH.
+
+    Returns
+    -------
+    GridBase : dict
+        "grid" is a float64 copy of Grid, "buf" is the rendered bytes,
+        "fmt" and "width" are the cell format and width, "rowlen" is the
+        line length in bytes, and "fixed" is True when every rendered
+        cell has exactly cellWidth bytes so that byte offsets are valid.
+
+    """
+    # start
+    GridBase = dict()
+    GridBase["grid"] = np.array( Grid, dtype=np.float64 )
+    GridBase["buf"] = formatGrid( GridBase["grid"], cellFmt=cellFmt )
+    GridBase["fmt"] = cellFmt
+    GridBase["width"] = cellWidth
+    nRows, nCols = GridBase["grid"].shape
+    GridBase["rowlen"] = ( nCols * cellWidth ) + 1
+    GridBase["fixed"] = ( len( GridBase["buf"] ) == ( nRows * GridBase["rowlen"] ) )
+    return GridBase
+
+
+def patchGridCells( GridBase, rowInds, colInds, newVals ):
+    """Render a grid that is the base grid with some cells replaced.
+
+    Only the byte ranges of the replaced cells are rewritten in a copy of
+    the base buffer. All cells are formatted and placed with vectorized
+    operations so many modified cells, like a levee or culvert blockage,
+    do not need a Python loop. If the base or the new values do not fit
+    the fixed-width layout then the whole grid is formatted instead.
+
+    Parameters
+    ----------
+    GridBase : dict
+        From makeGridBuffer. Not modified.
+    rowInds : array-like
+        0-based row indexes of the cells to replace.
+    colInds : array-like
+        0-based column indexes of the cells to replace.
+    newVals : array-like
+        New cell values.
+
+    Returns
+    -------
+    gridBytes : bytes
+        Formatted grid.
+
+    """
+    # start
+    rowInds = np.atleast_1d( np.asarray( rowInds, dtype=np.int64 ) )
+    colInds = np.atleast_1d( np.asarray( colInds, dtype=np.int64 ) )
+    newVals = np.atleast_1d( np.asarray( newVals, dtype=np.float64 ) )
+    numCells = len( newVals )
+    cellWidth = GridBase["width"]
+    if numCells == 0:
+        return bytes( GridBase["buf"] )
+    # end if
+    cellStr = ( GridBase["fmt"] * numCells ) % tuple( newVals.tolist() )
+    if ( not GridBase["fixed"] ) or ( len( cellStr ) != numCells * cellWidth ):
+        newGrid = GridBase["grid"].copy()
+        newGrid[rowInds, colInds] = newVals
+        return formatGrid( newGrid, cellFmt=GridBase["fmt"] )
+    # end if
+    outArray = np.frombuffer( GridBase["buf"], dtype=np.uint8 ).copy()
+    cellBytes = np.frombuffer( cellStr.encode( "ascii" ), dtype=np.uint8 )
+    startOffs = ( rowInds * GridBase["rowlen"] ) + ( colInds * cellWidth )
+    byteInds = startOffs[:, np.newaxis] + np.arange( cellWidth, dtype=np.int64 )
+    outArray[byteInds.ravel()] = cellBytes
+    return outArray.tobytes()
+
+
+def parseGridBlock( rawBytes, dtype=np.float32 ):
+    """Parse a block of whole lines of grid file text with np.loadtxt.
+
+    Parameters
+    ----------
+    rawBytes : bytes
+        Block of file contents that ends at the end of a line.
+    dtype : np.dtype, optional
+        Output type. The default is np.float32.
+
+    Returns
+    -------
+    Values : np.ndarray
+        1D parsed values.
+
+    Raises
+    ------
+    ValueError
+        If a value could not be parsed, like for Fortran overflow fields.
+
+    """
+    # start
+    if len( rawBytes.strip() ) == 0:
+        return np.empty( 0, dtype=dtype )
+    # end if
+    return np.loadtxt( io.BytesIO( rawBytes ), dtype=dtype ).reshape( -1 )
+
+
+def iterGridBlocks( inFile, dtype=np.float32, blockBytes=GRID_BLOCK_BYTES ):
+    """Parse a grid file in blocks so that the text of the whole file is
+    never held in memory.
+
+    Parameters
+    ----------
+    inFile : str
+        FQDN for the grid file.
+    dtype : np.dtype, optional
+        Output type. The default is np.float32.
+    blockBytes : int, optional
+        Approximate bytes read per block. The default is GRID_BLOCK_BYTES.
+
+    Yields
+    ------
+    Values : np.ndarray
+        1D parsed values, in file order.
+
+    Raises
+    ------
+    ValueError
+        If a value could not be parsed.
+
+    """
+    # start
+    carryBytes = b""
+    with open( inFile, 'rb' ) as Inf:
+        while True:
+            rawBytes = Inf.read( blockBytes )
+            if len( rawBytes ) == 0:
+                break
+            # end if
+            rawBytes = carryBytes + rawBytes
+            # split after the last line end so no line is cut
+            cutInd = rawBytes.rfind( b"\n" )
+            if cutInd < 0:
+                carryBytes = rawBytes
+                continue
+            # end if
+            carryBytes = rawBytes[cutInd+1:]
+            Values = parseGridBlock( rawBytes[:cutInd+1], dtype=dtype )
+            if len( Values ) > 0:
+                yield Values
+            # end if
+        # end while
+    # end with
+    if len( carryBytes.strip() ) > 0:
+        yield parseGridBlock( carryBytes, dtype=dtype )
+    # end if
+
+
+def iterGridRows( inFile, rowLen, chunkRows, dtype=np.float32,
+                  blockBytes=GRID_BLOCK_BYTES ):
+    """Stream a grid file as blocks of rows.
+
+    Parameters
+    ----------
+    inFile : str
+        FQDN for the grid file.
+    rowLen : int
+        Values per grid row, like NCOLS for H.txt or NCOLS+1 for U.txt.
+    chunkRows : int
+        Rows per block. The last block can be smaller.
+    dtype : np.dtype, optional
+        Output type. The default is np.float32.
+    blockBytes : int, optional
+        Approximate bytes read per parse block. The default is
+        GRID_BLOCK_BYTES.
+
+    Yields
+    ------
+    RowBlock : np.ndarray
+        ( rows, rowLen ) values.
+
+    Raises
+    ------
+    ValueError
+        If a value could not be parsed or the number of values is not a
+        multiple of rowLen.
+
+    """
+    # start
+    chunkVals = int( rowLen ) * int( chunkRows )
+    PendList = list()
+    numPend = 0
+    for Values in iterGridBlocks( inFile, dtype=dtype, blockBytes=blockBytes ):
+        PendList.append( Values )
+        numPend += len( Values )
+        if numPend < chunkVals:
+            continue
+        # end if
+        Pending = np.concatenate( PendList ) if len( PendList ) > 1 else PendList[0]
+        numFull = ( numPend // chunkVals ) * chunkVals
+        for v0 in range( 0, numFull, chunkVals ):
+            yield Pending[v0:v0+chunkVals].reshape( ( chunkRows, rowLen ) )
+        # end for
+        PendList = [ Pending[numFull:] ]
+        numPend = numPend - numFull
+    # end for
+    if numPend > 0:
+        if ( numPend % rowLen ) != 0:
+            raise ValueError( "%s does not have rows of %d values" %
+                              ( inFile, rowLen ) )
+        # end if
+        yield np.concatenate( PendList ).reshape( ( -1, rowLen ) )
+    # end if
+
+
+def readGridInto( inFile, Out, blockBytes=GRID_BLOCK_BYTES ):
+    """Read a grid file into a preallocated array.
+
+    Parameters
+    ----------
+    inFile : str
+        FQDN for the grid file.
+    Out : np.ndarray
+        C-contiguous output array, which can be memory-mapped. Values are
+        filled in row major order and converted to Out.dtype.
+    blockBytes : int, optional
+        Approximate bytes read per parse block. The default is
+        GRID_BLOCK_BYTES.
+
+    Returns
+    -------
+    Out : np.ndarray
+        The filled output array.
+
+    Raises
+    ------
+    ValueError
+        If a value could not be parsed or the file does not have exactly
+        Out.size values.
+
+    """
+    # start
+    OutFlat = Out.reshape( -1 )
+    numFill = 0
+    for Values in iterGridBlocks( inFile, dtype=Out.dtype, blockBytes=blockBytes ):
+        if ( numFill + len( Values ) ) > OutFlat.size:
+            raise ValueError( "%s has more than %d values" %
+                              ( inFile, OutFlat.size ) )
+        # end if
+        OutFlat[numFill:numFill+len( Values )] = Values
+        numFill += len( Values )
+    # end for
+    if numFill != OutFlat.size:
+        raise ValueError( "%s has %d values, expected %d" %
+                          ( inFile, numFill, OutFlat.size ) )
+    # end if
+    return Out
+
+
+def readGrid( inFile, dtype=np.float32 ):
+    """Read a grid file with np.loadtxt.
+
+    Parameters
+    ----------
+    inFile : str
+        FQDN for the grid file.
+    dtype : np.dtype, optional
+        Output type. The default is np.float32.
+
+    Returns
+    -------
+    Values : np.ndarray
+        Grid values. 1D for one value per line and 2D for more than one
+        value per line.
+
+    """
+    # start
+    return np.loadtxt( inFile, dtype=dtype )
+
+
+def gridFileKey( inFile ):
+    """Key to identify the current version of a file.
+
+    Parameters
+    ----------
+    inFile : str
+        FQDN for the file.
+
+    Returns
+    -------
+    fileKey : tuple
+        ( size in bytes, modification time in ns ).
+
+    """
+    # start
+    fStat = os.stat( inFile )
+    return ( fStat.st_size, fStat.st_mtime_ns )
+
+
+def readGridCached( inFile, dtype=np.float32, useSidecar=False,
+                    sidecarDir=None ):
+    """Read a grid file that does not change between events.
+
+    The grid is memoized for the process. If useSidecar then a .npy copy
+    is also kept on disk and is used by later processes. Both are only
+    reused while the text file has the same size and modification time.
+
+    Parameters
+    ----------
+    inFile : str
+        FQDN for the grid file.
+    dtype : np.dtype, optional
+        Output type. The default is np.float32.
+    useSidecar : bool, optional
+        Read and write a .npy sidecar file. The default is False.
+    sidecarDir : str, optional
+        FQDN for the directory for sidecar files. If None, the sidecar is
+        written next to the grid file. The default is None.
+
+    Returns
+    -------
+    Values : np.ndarray
+        Grid values. Read only because the array is shared.
+
+    """
+    # globals
+    global GRID_MEMO, GRID_MEMO_MAX, SIDECAR_FMT
+    # start
+    inFile = os.path.normpath( os.path.abspath( inFile ) )
+    fileKey = gridFileKey( inFile )
+    memoKey = ( inFile, np.dtype( dtype ).str )
+    if memoKey in GRID_MEMO:
+        if GRID_MEMO[memoKey][0] == fileKey:
+            return GRID_MEMO[memoKey][1]
+        # end if
+        del GRID_MEMO[memoKey]
+    # end if
+    Values = None
+    if useSidecar:
+        if sidecarDir is None:
+            sidecarDir = os.path.dirname( inFile )
+        # end if
+        baseName = os.path.basename( inFile )
+        scFile = os.path.join( sidecarDir, SIDECAR_FMT % ( baseName,
+                                                   fileKey[0], fileKey[1] ) )
+        if os.path.isfile( scFile ):
+            try:
+                Values = np.load( scFile ).astype( dtype, copy=False )
+            except ( OSError, ValueError ):
+                Values = None
+            # end try
+        # end if
+        if Values is None:
+            Values = readGrid( inFile, dtype=dtype )
+            try:
+                # remove sidecars for older versions of the file
+                for oldFile in glob.glob( os.path.join( sidecarDir,
+                                          glob.escape( baseName ) + ".*_*.npy" ) ):
+                    os.remove( oldFile )
+                # end for
+                tmpFile = scFile + ".%d.tmp" % os.getpid()
+                with open( tmpFile, 'wb' ) as OF:
+                    np.save( OF, Values )
+                # end with
+                os.replace( tmpFile, scFile )
+            except OSError:
+                # the sidecar is optional
+                pass
+            # end try
+        # end if
+    else:
+        Values = readGrid( inFile, dtype=dtype )
+    # end if
+    Values.setflags( write=False )
+    if len( GRID_MEMO ) >= GRID_MEMO_MAX:
+        del GRID_MEMO[next( iter( GRID_MEMO ) )]
+    # end if
+    GRID_MEMO[memoKey] = [ fileKey, Values ]
+    return Values
+
+
+def clearGridCache():
+    """Clear the memoized grids.
+
+    Returns
+    -------
+    None.
+
+    """
+    # globals
+    global GRID_MEMO
+    # start
+    GRID_MEMO.clear()
+    return
+
+
+#EOF
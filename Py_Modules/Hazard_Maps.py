@@ -0,0 +1,840 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Hazard_Maps
+   :platform: Windows, Linux
+   :synopsis: Annual exceedance probability and return-period depth maps
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides annual exceedance probability, AEP, and return-period water depth
+maps from the climate ensemble. Event water depths in the field archive
+are grouped by realization and event year and reduced to the per-cell
+annual maximum of each realization year with one grouped reduction. Years
+without a simulated event have an annual maximum of zero. The simulated
+year span of each realization is given or taken from the event dates in
+the field archive. Events outside the span are counted and reported
+because they are not in any annual maximum.
+
+Realization ranges are reduced in a process pool. Each partial result
+holds the year span, the number of realization years, the count of
+events outside the span, the count of years with an annual maximum over
+each depth threshold, and the largest annual maxima for each cell.
+Enough maxima are kept for the return periods of MAX_YEARS years, so
+partial results for different realization ranges, or computers, are
+merged exactly. AEP maps are the fraction of years over a threshold and
+return-period depth maps are the empirical ( 1 - 1 / T ) quantile of the
+annual maxima, with the np.quantile "lower" method.
+
+Maps are written as ESRI ASCII grids, georeferenced by the model
+coordinates plus an optional origin and projection, and as PNG plots.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# local modules
+import Field_Archive as farch
+
+# parameters
+#   ( first year, last year ) of each realization. None uses the span of
+#   the event dates in the field archive.
+SIM_YEARS = None
+#   largest ensemble, 1,000 realizations of 2024 to 2065, for merging
+#   partials
+MAX_YEARS = 1000 * 42
+RETURN_PERIODS = ( 10, 25, 100 )
+AEP_THRESHOLDS = ( 0.15, 0.30, 0.60, 1.00, 2.00 )
+#   realizations per task
+ANNUAL_CHUNK = 25
+ANNUAL_FMT = "Annual_Maxima_R%04dto%04d.npz"
+AEP_NAME_FMT = "AEP_H_gt_%gm"
+RP_NAME_FMT = "H_%dyr"
+ASC_NODATA = -9999.0
+MAP_DPI = 300
+
+
+# functions
+def eventYears( DateTimes ):
+    """Calendar year of each event.
+
+    Parameters
+    ----------
+    DateTimes : np.ndarray
+        datetime64 event dates.
+
+    Returns
+    -------
+    Years : np.ndarray
+        int64 years.
+
+    """
+    # start
+    return np.asarray( DateTimes ).astype( "datetime64[Y]" ).astype( np.int64 ) + 1970
+
+
+def yearSpan( Years ):
+    """Year span of a set of events.
+
+    Parameters
+    ----------
+    Years : np.ndarray
+        Event years, like from eventYears.
+
+    Returns
+    -------
+    simYears : tuple
+        ( first year, last year ).
+
+    Raises
+    ------
+    ValueError
+        If there are no events.
+
+    """
+    # start
+    if len( Years ) == 0:
+        raise ValueError( "No events for the simulated year span" )
+    # end if
+    return ( int( np.min( Years ) ), int( np.max( Years ) ) )
+
+
+def yearsPerRealization( simYears ):
+    """Number of simulated years in each realization.
+
+    Parameters
+    ----------
+    simYears : tuple
+        ( first year, last year ).
+
+    Returns
+    -------
+    numYears : int
+        Years per realization.
+
+    """
+    # start
+    return int( simYears[1] ) - int( simYears[0] ) + 1
+
+
+def maxRank( numYears, returnPeriod ):
+    """Descending rank of the return-period depth among the annual maxima.
+
+    Parameters
+    ----------
+    numYears : int
+        Number of realization years.
+    returnPeriod : float
+        Return period, years.
+
+    Returns
+    -------
+    rank : int
+        1-based rank, largest first, of the np.quantile "lower" value at
+        1 - 1 / returnPeriod.
+
+    """
+    # start
+    return int( numYears - np.floor( ( 1.0 - ( 1.0 / returnPeriod ) ) *
+                                     ( numYears - 1 ) ) )
+
+
+def annualMaxima( HFields, EventIdx, RealNums, Years ):
+    """Per-cell annual maximum water depth for each realization year with
+    events.
+
+    Parameters
+    ----------
+    HFields : np.ndarray
+        ( events, nRows, nCols ) water depth, can be memory-mapped.
+    EventIdx : np.ndarray
+        Indexes into HFields of the events to reduce.
+    RealNums : np.ndarray
+        Realization of each event in EventIdx.
+    Years : np.ndarray
+        Year of each event in EventIdx.
+
+    Returns
+    -------
+    GroupKeys : np.ndarray
+        int64 ( groups, 2 ) realization and year.
+    AnnMax : np.ndarray
+        float32 ( groups, nRows, nCols ) annual maxima.
+
+    """
+    # start
+    EventIdx = np.asarray( EventIdx, dtype=np.int64 )
+    RealNums = np.asarray( RealNums, dtype=np.int64 )
+    Years = np.asarray( Years, dtype=np.int64 )
+    nRows, nCols = HFields.shape[1:]
+    if len( EventIdx ) == 0:
+        return ( np.zeros( ( 0, 2 ), dtype=np.int64 ),
+                 np.zeros( ( 0, nRows, nCols ), dtype=np.float32 ) )
+    # end if
+    SortOrder = np.lexsort( ( Years, RealNums ) )
+    SortReal = RealNums[SortOrder]
+    SortYear = Years[SortOrder]
+    IsStart = np.ones( len( SortOrder ), dtype=bool )
+    IsStart[1:] = ( SortReal[1:] != SortReal[:-1] ) | ( SortYear[1:] != SortYear[:-1] )
+    Starts = np.flatnonzero( IsStart )
+    HSorted = np.asarray( HFields[EventIdx[SortOrder]], dtype=np.float32 )
+    AnnMax = np.maximum.reduceat( HSorted, Starts, axis=0 )
+    GroupKeys = np.column_stack( [ SortReal[Starts], SortYear[Starts] ] )
+    return GroupKeys, AnnMax
+
+
+def topCount( returnPeriods=RETURN_PERIODS, maxYears=MAX_YEARS ):
+    """Number of largest annual maxima to keep for each cell.
+
+    Parameters
+    ----------
+    returnPeriods : sequence, optional
+        Return periods, years. The default is RETURN_PERIODS.
+    maxYears : int, optional
+        Largest number of realization years to be merged. The default is
+        MAX_YEARS.
+
+    Returns
+    -------
+    numTop : int
+        Largest rank from maxRank for up to maxYears years.
+
+    """
+    # start
+    return max( [ maxRank( maxYears, x ) for x in returnPeriods ] )
+
+
+def makeAnnual( nRows, nCols, simYears, thresholds=AEP_THRESHOLDS,
+                numTop=None ):
+    """Make an empty annual maxima partial result.
+
+    Parameters
+    ----------
+    nRows : int
+        Number of grid rows.
+    nCols : int
+        Number of grid columns.
+    simYears : tuple
+        ( first year, last year ) of each realization.
+    thresholds : sequence, optional
+        Water depth thresholds, m, for the AEP maps. The default is
+        AEP_THRESHOLDS.
+    numTop : int, optional
+        Largest annual maxima to keep for each cell. If None, from
+        topCount. The default is None.
+
+    Returns
+    -------
+    Annual : dict
+        "span" is the int64 first and last year, "years" the number of
+        realization years, "reals" the list of realizations, and
+        "excluded" the number of events outside the span. "thresholds"
+        are the depth thresholds and "exceed" the uint32 ( thresholds,
+        nRows, nCols ) count of years over each threshold. "numtop" and
+        "top" are the float32 ( up to numtop, nRows, nCols ) largest
+        annual maxima.
+
+    """
+    # start
+    if numTop is None:
+        numTop = topCount()
+    # end if
+    Annual = dict()
+    Annual["span"] = np.array( simYears, dtype=np.int64 )
+    Annual["years"] = 0
+    Annual["reals"] = np.zeros( 0, dtype=np.int64 )
+    Annual["excluded"] = 0
+    Annual["thresholds"] = np.asarray( thresholds, dtype=np.float64 )
+    Annual["exceed"] = np.zeros( ( len( thresholds ), nRows, nCols ),
+                                 dtype=np.uint32 )
+    Annual["numtop"] = int( numTop )
+    Annual["top"] = np.zeros( ( 0, nRows, nCols ), dtype=np.float32 )
+    return Annual
+
+
+def keepTop( Stack, numTop ):
+    """Keep the numTop largest values for each cell.
+
+    Parameters
+    ----------
+    Stack : np.ndarray
+        ( values, nRows, nCols ).
+    numTop : int
+        Values to keep.
+
+    Returns
+    -------
+    TopStack : np.ndarray
+        ( up to numTop, nRows, nCols ) in no particular order.
+
+    """
+    # start
+    if Stack.shape[0] <= numTop:
+        return Stack
+    # end if
+    return -np.partition( -Stack, numTop - 1, axis=0 )[:numTop]
+
+
+def addYears( Annual, RealNums, AnnMax, numExcluded=0 ):
+    """Add the annual maxima of some realizations.
+
+    Parameters
+    ----------
+    Annual : dict
+        From makeAnnual. Updated in place.
+    RealNums : sequence
+        Realizations that are added, including those without events.
+    AnnMax : np.ndarray
+        ( groups, nRows, nCols ) from annualMaxima for these realizations.
+    numExcluded : int, optional
+        Events of these realizations outside the year span. The default
+        is 0.
+
+    Returns
+    -------
+    None.
+
+    """
+    # start
+    Annual["years"] += len( RealNums ) * yearsPerRealization( Annual["span"] )
+    Annual["excluded"] += int( numExcluded )
+    Annual["reals"] = np.union1d( Annual["reals"],
+                                  np.asarray( RealNums, dtype=np.int64 ) )
+    for tI, thresh in enumerate( Annual["thresholds"] ):
+        Annual["exceed"][tI] += np.count_nonzero( AnnMax > thresh, axis=0 ).astype( np.uint32 )
+    # end for
+    Annual["top"] = keepTop( np.concatenate( [ Annual["top"], AnnMax ], axis=0 ),
+                             Annual["numtop"] )
+    return
+
+
+def mergeAnnual( AnnualA, AnnualB ):
+    """Merge partial results for different realizations.
+
+    Parameters
+    ----------
+    AnnualA : dict
+        From makeAnnual.
+    AnnualB : dict
+        From makeAnnual.
+
+    Returns
+    -------
+    Annual : dict
+        Merged partial result.
+
+    Raises
+    ------
+    ValueError
+        If the year spans, thresholds, or grids differ, or realizations
+        are in both.
+
+    """
+    # start
+    if not np.array_equal( AnnualA["span"], AnnualB["span"] ):
+        raise ValueError( "Annual maxima have different year spans, %s and %s" %
+                          ( AnnualA["span"].tolist(), AnnualB["span"].tolist() ) )
+    # end if
+    if ( not np.array_equal( AnnualA["thresholds"], AnnualB["thresholds"] ) ) or \
+            ( AnnualA["exceed"].shape != AnnualB["exceed"].shape ):
+        raise ValueError( "Annual maxima have different thresholds or grids" )
+    # end if
+    if len( np.intersect1d( AnnualA["reals"], AnnualB["reals"] ) ) > 0:
+        raise ValueError( "Annual maxima have realizations in common" )
+    # end if
+    Annual = dict()
+    Annual["span"] = AnnualA["span"]
+    Annual["years"] = AnnualA["years"] + AnnualB["years"]
+    Annual["reals"] = np.union1d( AnnualA["reals"], AnnualB["reals"] )
+    Annual["excluded"] = AnnualA["excluded"] + AnnualB["excluded"]
+    Annual["thresholds"] = AnnualA["thresholds"]
+    Annual["exceed"] = AnnualA["exceed"] + AnnualB["exceed"]
+    Annual["numtop"] = min( AnnualA["numtop"], AnnualB["numtop"] )
+    Annual["top"] = keepTop( np.concatenate( [ AnnualA["top"], AnnualB["top"] ],
+                                             axis=0 ), Annual["numtop"] )
+    return Annual
+
+
+def annualChunk( archDir, RealNums, simYears, thresholds, numTop ):
+    """Partial result for some realizations from the field archive.
+
+    Parameters
+    ----------
+    archDir : str
+        FQDN for the consolidated field archive directory.
+    RealNums : sequence
+        Realizations.
+    simYears : tuple
+        ( first year, last year ) of each realization. Events outside
+        are counted in "excluded" and skipped.
+    thresholds : sequence
+        Water depth thresholds, m.
+    numTop : int
+        Largest annual maxima to keep for each cell.
+
+    Returns
+    -------
+    Annual : dict
+        From makeAnnual.
+
+    """
+    # start
+    ArchDict = farch.openArchive( archDir )
+    Coords = ArchDict["coords"]
+    nRows, nCols = ArchDict["H"].shape[1:]
+    Annual = makeAnnual( nRows, nCols, simYears, thresholds=thresholds,
+                         numTop=numTop )
+    Years = eventYears( Coords["DateTime"] )
+    InReals = np.isin( Coords["RealNum"], RealNums )
+    InSpan = ( Years >= simYears[0] ) & ( Years <= simYears[1] )
+    EventIdx = np.flatnonzero( InReals & InSpan )
+    AnnMax = annualMaxima( ArchDict["H"], EventIdx, Coords["RealNum"][EventIdx],
+                           Years[EventIdx] )[1]
+    addYears( Annual, RealNums, AnnMax,
+              numExcluded=np.count_nonzero( InReals & ( ~InSpan ) ) )
+    return Annual
+
+
+def annualFromArchive( archDir, RealNums, simYears=SIM_YEARS,
+                       thresholds=AEP_THRESHOLDS, returnPeriods=RETURN_PERIODS,
+                       maxYears=MAX_YEARS, numProcs=None,
+                       chunkSize=ANNUAL_CHUNK ):
+    """Annual maxima partial result for realizations in the field archive,
+    reduced by realization range in a process pool.
+
+    Parameters
+    ----------
+    archDir : str
+        FQDN for the consolidated field archive directory.
+    RealNums : sequence
+        Realizations, including those without events in the archive.
+    simYears : tuple, optional
+        ( first year, last year ) of each realization. If None, the span
+        of all event dates in the archive. The default is SIM_YEARS.
+    thresholds : sequence, optional
+        Water depth thresholds, m. The default is AEP_THRESHOLDS.
+    returnPeriods : sequence, optional
+        Return periods, years. The default is RETURN_PERIODS.
+    maxYears : int, optional
+        Largest number of realization years to be merged. The default is
+        MAX_YEARS.
+    numProcs : int, optional
+        Number of worker processes. If None, the number of CPUs. If 1, no
+        pool is used. The default is None.
+    chunkSize : int, optional
+        Realizations per task. The default is ANNUAL_CHUNK.
+
+    Returns
+    -------
+    Annual : dict
+        From makeAnnual.
+
+    """
+    # start
+    RealNums = np.unique( np.asarray( RealNums, dtype=np.int64 ) )
+    if simYears is None:
+        simYears = yearSpan( eventYears( farch.openArchive( archDir )["coords"]["DateTime"] ) )
+    # end if
+    numYears = yearsPerRealization( simYears )
+    numTop = topCount( returnPeriods, max( maxYears, len( RealNums ) * numYears ) )
+    ChunkList = [ RealNums[x:x+chunkSize] for x in
+                  range( 0, len( RealNums ), chunkSize ) ]
+    if numProcs is None:
+        numProcs = os.cpu_count() or 1
+    # end if
+    if ( numProcs <= 1 ) or ( len( ChunkList ) <= 1 ):
+        return annualChunk( archDir, RealNums, simYears, thresholds, numTop )
+    # end if
+    Annual = None
+    with ProcessPoolExecutor( max_workers=min( numProcs, len( ChunkList ) ) ) as Pool:
+        FutList = [ Pool.submit( annualChunk, archDir, cChunk, simYears,
+                                 thresholds, numTop ) for cChunk in ChunkList ]
+        for cFut in FutList:
+            if Annual is None:
+                Annual = cFut.result()
+            else:
+                Annual = mergeAnnual( Annual, cFut.result() )
+            # end if
+        # end for
+    # end with
+    return Annual
+
+
+def saveAnnual( Annual, outFile ):
+    """Save a partial result to a .npz file.
+
+    Parameters
+    ----------
+    Annual : dict
+        From makeAnnual.
+    outFile : str
+        FQDN for the output file.
+
+    Returns
+    -------
+    None.
+
+    """
+    # start
+    SaveDict = dict( Annual )
+    SaveDict["years"] = np.int64( Annual["years"] )
+    SaveDict["excluded"] = np.int64( Annual["excluded"] )
+    SaveDict["numtop"] = np.int64( Annual["numtop"] )
+    farch.atomicSave( outFile, np.savez, **SaveDict )
+    return
+
+
+def loadAnnual( inFile ):
+    """Load a partial result from a .npz file.
+
+    Parameters
+    ----------
+    inFile : str
+        FQDN for the file from saveAnnual.
+
+    Returns
+    -------
+    Annual : dict
+        Same as from makeAnnual.
+
+    """
+    # start
+    with np.load( inFile ) as AF:
+        Annual = { x : AF[x] for x in AF.files }
+    # end with
+    Annual["years"] = int( Annual["years"] )
+    Annual["excluded"] = int( Annual["excluded"] )
+    Annual["numtop"] = int( Annual["numtop"] )
+    return Annual
+
+
+def mergeAnnualFiles( FileList ):
+    """Merge saved partial results, like from runs of different
+    realizations.
+
+    Parameters
+    ----------
+    FileList : list
+        FQDN for each file from saveAnnual.
+
+    Returns
+    -------
+    Annual : dict
+        Merged partial result.
+
+    """
+    # start
+    Annual = loadAnnual( FileList[0] )
+    for inFile in FileList[1:]:
+        Annual = mergeAnnual( Annual, loadAnnual( inFile ) )
+    # end for
+    return Annual
+
+
+def aepMaps( Annual ):
+    """Empirical annual exceedance probability maps.
+
+    Parameters
+    ----------
+    Annual : dict
+        From makeAnnual.
+
+    Returns
+    -------
+    MapDict : dict
+        AEP_NAME_FMT name to float32 ( nRows, nCols ) fraction of
+        realization years with an annual maximum water depth over the
+        threshold.
+
+    """
+    # globals
+    global AEP_NAME_FMT
+    # start
+    MapDict = dict()
+    for tI, thresh in enumerate( Annual["thresholds"] ):
+        MapDict[AEP_NAME_FMT % thresh] = ( Annual["exceed"][tI] /
+                                           max( Annual["years"], 1 ) ).astype( np.float32 )
+    # end for
+    return MapDict
+
+
+def returnLevelMaps( Annual, returnPeriods=RETURN_PERIODS ):
+    """Empirical return-period water depth maps.
+
+    Parameters
+    ----------
+    Annual : dict
+        From makeAnnual.
+    returnPeriods : sequence, optional
+        Return periods, years. The default is RETURN_PERIODS.
+
+    Returns
+    -------
+    MapDict : dict
+        RP_NAME_FMT name to float32 ( nRows, nCols ) water depth.
+
+    Raises
+    ------
+    ValueError
+        If not enough annual maxima were kept for a return period.
+
+    """
+    # globals
+    global RP_NAME_FMT
+    # start
+    numKept, nRows, nCols = Annual["top"].shape
+    # largest first
+    TopSorted = -np.sort( -Annual["top"], axis=0 )
+    MapDict = dict()
+    for retPer in returnPeriods:
+        rank = maxRank( Annual["years"], retPer )
+        if rank <= numKept:
+            MapDict[RP_NAME_FMT % retPer] = TopSorted[rank - 1]
+        elif numKept < Annual["numtop"]:
+            # every annual maximum with an event is kept so the rest are 0.0
+            MapDict[RP_NAME_FMT % retPer] = np.zeros( ( nRows, nCols ),
+                                                      dtype=np.float32 )
+        else:
+            raise ValueError( "Only %d annual maxima kept for the %g year " \
+                              "depth of %d years" % ( numKept, retPer,
+                                                      Annual["years"] ) )
+        # end if
+    # end for
+    return MapDict
+
+
+def cellFaces( Centers ):
+    """Cell face coordinates from cell center coordinates.
+
+    Parameters
+    ----------
+    Centers : np.ndarray
+        Cell center coordinates.
+
+    Returns
+    -------
+    Faces : np.ndarray
+        float64 face coordinates, one more than the centers.
+
+    """
+    # start
+    Centers = np.asarray( Centers, dtype=np.float64 )
+    Faces = np.empty( len( Centers ) + 1, dtype=np.float64 )
+    Faces[1:-1] = 0.5 * ( Centers[:-1] + Centers[1:] )
+    Faces[0] = Centers[0] - ( Faces[1] - Centers[0] )
+    Faces[-1] = Centers[-1] + ( Centers[-1] - Faces[-2] )
+    return Faces
+
+
+def writeAsciiGrid( outFile, Grid, XPts, YPts, origin=( 0.0, 0.0 ),
+                    prjWkt=None, nodata=ASC_NODATA ):
+    """Write a grid as an ESRI ASCII grid.
+
+    Row 1 of the model is the southern row, so rows are written in
+    reverse order.
+
+    Parameters
+    ----------
+    outFile : str
+        FQDN for the .asc file.
+    Grid : np.ndarray
+        ( nRows, nCols ) values. NaN are written as nodata.
+    XPts : np.ndarray
+        Cell center x coordinates.
+    YPts : np.ndarray
+        Cell center y coordinates.
+    origin : tuple, optional
+        ( x, y ) of the model origin in the output coordinate system. The
+        default is ( 0.0, 0.0 ).
+    prjWkt : str, optional
+        Projection WKT for a .prj file next to the grid. The default is
+        None.
+    nodata : float, optional
+        No data value. The default is ASC_NODATA.
+
+    Returns
+    -------
+    None.
+
+    """
+    # start
+    XFace = cellFaces( XPts )
+    YFace = cellFaces( YPts )
+    DX = np.diff( XFace )
+    DY = np.diff( YFace )
+    nRows, nCols = Grid.shape
+    HeadLines = [ "ncols %d\n" % nCols, "nrows %d\n" % nRows,
+                  "xllcorner %.6f\n" % ( XFace[0] + origin[0] ),
+                  "yllcorner %.6f\n" % ( YFace[0] + origin[1] ) ]
+    if np.allclose( DX, DX[0] ) and np.allclose( DY, DX[0] ):
+        HeadLines.append( "cellsize %.6f\n" % DX[0] )
+    elif np.allclose( DX, DX[0] ) and np.allclose( DY, DY[0] ):
+        HeadLines.extend( [ "dx %.6f\n" % DX[0], "dy %.6f\n" % DY[0] ] )
+    else:
+        raise ValueError( "ESRI ASCII grids need uniform cell sizes" )
+    # end if
+    HeadLines.append( "NODATA_value %g\n" % nodata )
+    OutGrid = np.where( np.isfinite( Grid ), Grid, nodata )[::-1]
+    with open( outFile, 'w' ) as OF:
+        OF.writelines( HeadLines )
+        np.savetxt( OF, OutGrid, fmt="%.6g" )
+    # end with
+    if not prjWkt is None:
+        with open( os.path.splitext( outFile )[0] + ".prj", 'w' ) as OF:
+            OF.write( prjWkt )
+        # end with
+    # end if
+    return
+
+
+def plotHazardMap( outFile, XPts, YPts, Grid, title, cbarLabel, PolyLayers,
+                   cmap="Blues", dpi=MAP_DPI ):
+    """Plot a hazard map for the whole domain.
+
+    Parameters
+    ----------
+    outFile : str
+        FQDN for the image file.
+    XPts : np.ndarray
+        Cell center x coordinates.
+    YPts : np.ndarray
+        Cell center y coordinates.
+    Grid : np.ndarray
+        ( nRows, nCols ) values. Zero and smaller are not colored.
+    title : str
+        Plot title.
+    cbarLabel : str
+        Colorbar label.
+    PolyLayers : list
+        From Event_Plots.buildingLayers.
+    cmap : str, optional
+        Colormap name. The default is "Blues".
+    dpi : int, optional
+        Output resolution. The default is MAP_DPI.
+
+    Returns
+    -------
+    None.
+
+    """
+    # imports
+    import matplotlib as mpl
+    mpl.use( "Agg" )
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import PatchCollection
+    from matplotlib.patches import Polygon
+    # start
+    XFace = cellFaces( XPts )
+    YFace = cellFaces( YPts )
+    Fig1 = plt.figure()
+    Fig1.set_size_inches(5.0, 8.0)
+    ax11 = Fig1.add_subplot(1,1,1)
+    # color scale from zero, also when nothing is over zero
+    maxVal = max( float( np.nanmax( Grid ) ), 0.01 )
+    pm = ax11.pcolormesh( XFace, YFace, np.ma.masked_less_equal( Grid, 0.0 ),
+                          cmap=cmap, vmin=0.0, vmax=maxVal, shading='flat',
+                          zorder=20.0 )
+    BuildPatches = [ Polygon( np.column_stack( [ pX, pY ] ), closed=True )
+                     for pX, pY, lX, lY in PolyLayers ]
+    ax11.add_collection( PatchCollection( BuildPatches, edgecolor='xkcd:medium grey',
+                                          facecolor='none', linewidth=0.5,
+                                          zorder=25.0 ), autolim=False )
+    cb = Fig1.colorbar( pm, ax=ax11, orientation='vertical',)
+    cb.ax.tick_params(labelsize=8)
+    cb.set_label( cbarLabel, fontsize=9 )
+    ax11.set_title( title, fontsize=10 )
+    ax11.set_aspect( 'equal' )
+    ax11.set_xlim( ( XFace[0], XFace[-1] ) )
+    ax11.set_ylim( ( YFace[0], YFace[-1] ) )
+    ax11.set_ylabel( "Northing (m)", fontsize=10)
+    ax11.set_xlabel( "Easting (m)", fontsize=10)
+    ax11.tick_params(axis='both', which='major', labelsize=9)
+    ax11.xaxis.set_major_formatter( mpl.ticker.StrMethodFormatter( "{x:,.0f}" ) )
+    ax11.yaxis.set_major_formatter( mpl.ticker.StrMethodFormatter( "{x:,.0f}" ) )
+    Fig1.tight_layout()
+    Fig1.savefig( outFile, dpi=dpi )
+    plt.close( Fig1 )
+    return
+
+
+def writeHazardMaps( outDir, Annual, XPts, YPts, PolyLayers,
+                     returnPeriods=RETURN_PERIODS, origin=( 0.0, 0.0 ),
+                     prjWkt=None, dpi=MAP_DPI ):
+    """Write the AEP and return-period maps as grids and plots.
+
+    Parameters
+    ----------
+    outDir : str
+        FQDN for the output directory. Made if it does not exist.
+    Annual : dict
+        From makeAnnual.
+    XPts : np.ndarray
+        Cell center x coordinates.
+    YPts : np.ndarray
+        Cell center y coordinates.
+    PolyLayers : list
+        From Event_Plots.buildingLayers.
+    returnPeriods : sequence, optional
+        Return periods, years. The default is RETURN_PERIODS.
+    origin : tuple, optional
+        ( x, y ) of the model origin for the grids. The default is
+        ( 0.0, 0.0 ).
+    prjWkt : str, optional
+        Projection WKT for the grids. The default is None.
+    dpi : int, optional
+        Plot resolution. The default is MAP_DPI.
+
+    Returns
+    -------
+    MapNames : list
+        Names of the maps written, as name.asc and name.png.
+
+    """
+    # start
+    os.makedirs( outDir, exist_ok=True )
+    MapList = list()
+    for thresh, ( mName, mGrid ) in zip( Annual["thresholds"],
+                                         aepMaps( Annual ).items() ):
+        MapList.append( [ mName, mGrid, "AEP of Water Depth > %g m" % thresh,
+                          "Annual Exceedance Probability", "YlOrRd" ] )
+    # end for
+    for retPer, ( mName, mGrid ) in zip( returnPeriods,
+                                         returnLevelMaps( Annual, returnPeriods ).items() ):
+        MapList.append( [ mName, mGrid, "%g-year Water Depth" % retPer,
+                          "Water Depth (m)", "Blues" ] )
+    # end for
+    for mName, mGrid, mTitle, cbLabel, cmap in MapList:
+        writeAsciiGrid( os.path.join( outDir, "%s.asc" % mName ), mGrid,
+                        XPts, YPts, origin=origin, prjWkt=prjWkt )
+        plotHazardMap( os.path.join( outDir, "%s.png" % mName ), XPts, YPts,
+                       mGrid, "%s, %d years" % ( mTitle, Annual["years"] ),
+                       cbLabel, PolyLayers, cmap=cmap, dpi=dpi )
+    # end for
+    return [ x[0] for x in MapList ]
+
+
+#EOF
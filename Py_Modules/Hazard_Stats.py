@@ -0,0 +1,592 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Hazard_Stats
+   :platform: Windows, Linux
+   :synopsis: Streaming per-cell hazard statistics across events
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides a streaming reducer for per-cell hazard statistics over all
+events. Each event's water depth and cell velocity fields are consumed as
+they are produced, or from the field archive, and only O(cells) state is
+kept: the running maximum, the Welford running mean and sum of squared
+deviations, the count of events with a water depth over each threshold,
+and a quantile sketch.
+
+The sketch for a cell is a histogram with logarithmic buckets, so every
+value at or above SKETCH_MIN is represented within a relative error of
+SKETCH_ALPHA, like DDSketch. Smaller values, like dry cells, are counted
+implicitly as zero. Reducers from parallel workers are merged exactly for
+the maximum, the exceedance counts, and the sketches, and with the
+pairwise update of Chan et al. for the mean and variance. The reducer is
+a dictionary of arrays that is saved to and loaded from a .npz file.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# local modules
+import Field_Archive as farch
+
+# parameters
+#   fields from each event. VMag is the velocity magnitude and HV is the
+#   depth velocity product
+STAT_FIELDS = ( "H", "VMag", "HV" )
+#   water depth thresholds, m, for the exceedance counts
+DEPTH_THRESHOLDS = ( 0.15, 0.30, 0.60, 1.00, 2.00 )
+#   fields with quantile sketches
+SKETCH_FIELDS = ( "H", )
+SKETCH_ALPHA = 0.05
+SKETCH_MIN = 0.01
+SKETCH_MAX = 50.0
+#   events per task when reducing the field archive in a process pool
+REDUCE_CHUNK = 100
+
+
+# functions
+def sketchBuckets( alpha=SKETCH_ALPHA, minVal=SKETCH_MIN, maxVal=SKETCH_MAX ):
+    """Bucket parameters for the quantile sketches.
+
+    Parameters
+    ----------
+    alpha : float, optional
+        Relative accuracy. The default is SKETCH_ALPHA.
+    minVal : float, optional
+        Smallest value that is represented. The default is SKETCH_MIN.
+    maxVal : float, optional
+        Largest value that is represented. Larger values go in the last
+        bucket. The default is SKETCH_MAX.
+
+    Returns
+    -------
+    logGamma : float
+        Log of the bucket growth factor, ( 1 + alpha ) / ( 1 - alpha ).
+    numBuckets : int
+        Number of buckets.
+
+    """
+    # start
+    logGamma = np.log( ( 1.0 + alpha ) / ( 1.0 - alpha ) )
+    numBuckets = int( np.ceil( np.log( maxVal / minVal ) / logGamma ) ) + 1
+    return logGamma, numBuckets
+
+
+def makeReducer( nRows, nCols, thresholds=DEPTH_THRESHOLDS,
+                 sketchFields=SKETCH_FIELDS, alpha=SKETCH_ALPHA,
+                 minVal=SKETCH_MIN, maxVal=SKETCH_MAX ):
+    """Make an empty reducer.
+
+    Parameters
+    ----------
+    nRows : int
+        Number of grid rows.
+    nCols : int
+        Number of grid columns.
+    thresholds : sequence, optional
+        Water depth thresholds, m. The default is DEPTH_THRESHOLDS.
+    sketchFields : sequence, optional
+        Fields, from STAT_FIELDS, with quantile sketches. The default is
+        SKETCH_FIELDS.
+    alpha : float, optional
+        Sketch relative accuracy. The default is SKETCH_ALPHA.
+    minVal : float, optional
+        Smallest sketch value. The default is SKETCH_MIN.
+    maxVal : float, optional
+        Largest sketch value. The default is SKETCH_MAX.
+
+    Returns
+    -------
+    Reducer : dict
+        "n" is the number of events, "shape", "thresholds", and
+        "sketch_fields" describe the reducer and "sketch" is ( alpha,
+        minVal, maxVal ). For each field there are float32 "<field>_max"
+        and float64 "<field>_mean" and "<field>_m2" grids. "exceed" is the
+        uint32 ( thresholds, nRows, nCols ) exceedance count and
+        "<field>_sketch" are uint32 ( nRows, nCols, buckets ) sketches.
+
+    """
+    # globals
+    global STAT_FIELDS
+    # start
+    Reducer = dict()
+    Reducer["n"] = 0
+    Reducer["shape"] = ( int( nRows ), int( nCols ) )
+    Reducer["thresholds"] = np.asarray( thresholds, dtype=np.float64 )
+    Reducer["sketch_fields"] = tuple( sketchFields )
+    Reducer["sketch"] = np.array( [ alpha, minVal, maxVal ], dtype=np.float64 )
+    for fName in STAT_FIELDS:
+        Reducer["%s_max" % fName] = np.zeros( ( nRows, nCols ), dtype=np.float32 )
+        Reducer["%s_mean" % fName] = np.zeros( ( nRows, nCols ), dtype=np.float64 )
+        Reducer["%s_m2" % fName] = np.zeros( ( nRows, nCols ), dtype=np.float64 )
+    # end for
+    Reducer["exceed"] = np.zeros( ( len( thresholds ), nRows, nCols ),
+                                  dtype=np.uint32 )
+    numBuckets = sketchBuckets( alpha, minVal, maxVal )[1]
+    for fName in Reducer["sketch_fields"]:
+        Reducer["%s_sketch" % fName] = np.zeros( ( nRows, nCols, numBuckets ),
+                                                 dtype=np.uint32 )
+    # end for
+    return Reducer
+
+
+def eventFields( H, U, V ):
+    """Hazard fields for one event.
+
+    Parameters
+    ----------
+    H : np.ndarray
+        ( nRows, nCols ) water depth, m.
+    U : np.ndarray
+        ( nRows, nCols ) cell x velocity, m/s.
+    V : np.ndarray
+        ( nRows, nCols ) cell y velocity, m/s.
+
+    Returns
+    -------
+    FieldDict : dict
+        STAT_FIELDS name to float32 grid.
+
+    """
+    # start
+    FieldDict = dict()
+    FieldDict["H"] = np.asarray( H, dtype=np.float32 )
+    FieldDict["VMag"] = np.hypot( np.asarray( U, dtype=np.float32 ),
+                                  np.asarray( V, dtype=np.float32 ) )
+    FieldDict["HV"] = FieldDict["H"] * FieldDict["VMag"]
+    return FieldDict
+
+
+def sketchIndex( Values, logGamma, numBuckets, minVal ):
+    """Sketch bucket for each value at or above minVal.
+
+    Parameters
+    ----------
+    Values : np.ndarray
+        Values at or above minVal.
+    logGamma : float
+        From sketchBuckets.
+    numBuckets : int
+        From sketchBuckets.
+    minVal : float
+        Smallest sketch value.
+
+    Returns
+    -------
+    BucketIdx : np.ndarray
+        int64 bucket indexes.
+
+    """
+    # start
+    BucketIdx = np.ceil( np.log( Values / minVal ) / logGamma ).astype( np.int64 )
+    return np.clip( BucketIdx, 0, numBuckets - 1 )
+
+
+def updateReducer( Reducer, H, U, V ):
+    """Add one event to a reducer.
+
+    Parameters
+    ----------
+    Reducer : dict
+        From makeReducer. Updated in place.
+    H : np.ndarray
+        ( nRows, nCols ) water depth, m.
+    U : np.ndarray
+        ( nRows, nCols ) cell x velocity, m/s.
+    V : np.ndarray
+        ( nRows, nCols ) cell y velocity, m/s.
+
+    Returns
+    -------
+    None.
+
+    """
+    # start
+    FieldDict = eventFields( H, U, V )
+    Reducer["n"] += 1
+    numEvents = Reducer["n"]
+    for fName, Values in FieldDict.items():
+        np.maximum( Reducer["%s_max" % fName], Values,
+                    out=Reducer["%s_max" % fName] )
+        # Welford update
+        Mean = Reducer["%s_mean" % fName]
+        Delta = Values - Mean
+        Mean += Delta / numEvents
+        Reducer["%s_m2" % fName] += Delta * ( Values - Mean )
+    # end for
+    for tI, thresh in enumerate( Reducer["thresholds"] ):
+        Reducer["exceed"][tI] += ( FieldDict["H"] > thresh )
+    # end for
+    alpha, minVal, maxVal = Reducer["sketch"]
+    logGamma, numBuckets = sketchBuckets( alpha, minVal, maxVal )
+    for fName in Reducer["sketch_fields"]:
+        FlatVals = FieldDict[fName].ravel()
+        CellIdx = np.flatnonzero( FlatVals >= minVal )
+        BucketIdx = sketchIndex( FlatVals[CellIdx].astype( np.float64 ),
+                                 logGamma, numBuckets, minVal )
+        # one value per cell so the flat indexes are unique
+        Reducer["%s_sketch" % fName].reshape( -1 )[
+                                    ( CellIdx * numBuckets ) + BucketIdx ] += 1
+    # end for
+    return
+
+
+def checkCompatible( ReducerA, ReducerB ):
+    """Raise if two reducers cannot be merged.
+
+    Parameters
+    ----------
+    ReducerA : dict
+        From makeReducer.
+    ReducerB : dict
+        From makeReducer.
+
+    Returns
+    -------
+    None.
+
+    Raises
+    ------
+    ValueError
+        If the grid, thresholds, or sketches differ.
+
+    """
+    # start
+    if ( ReducerA["shape"] != ReducerB["shape"] ) or \
+            ( not np.array_equal( ReducerA["thresholds"], ReducerB["thresholds"] ) ) or \
+            ( ReducerA["sketch_fields"] != ReducerB["sketch_fields"] ) or \
+            ( not np.array_equal( ReducerA["sketch"], ReducerB["sketch"] ) ):
+        raise ValueError( "Hazard reducers have different grids, thresholds, " \
+                          "or sketches" )
+    # end if
+    return
+
+
+def mergeReducers( ReducerA, ReducerB ):
+    """Merge two reducers for different events.
+
+    Parameters
+    ----------
+    ReducerA : dict
+        From makeReducer.
+    ReducerB : dict
+        From makeReducer.
+
+    Returns
+    -------
+    Reducer : dict
+        New reducer for the events in both.
+
+    Raises
+    ------
+    ValueError
+        If the reducers are not compatible.
+
+    """
+    # globals
+    global STAT_FIELDS
+    # start
+    checkCompatible( ReducerA, ReducerB )
+    Reducer = dict( ReducerA )
+    nA = ReducerA["n"]
+    nB = ReducerB["n"]
+    numEvents = nA + nB
+    Reducer["n"] = numEvents
+    for fName in STAT_FIELDS:
+        Reducer["%s_max" % fName] = np.maximum( ReducerA["%s_max" % fName],
+                                                ReducerB["%s_max" % fName] )
+        if numEvents == 0:
+            Reducer["%s_mean" % fName] = ReducerA["%s_mean" % fName].copy()
+            Reducer["%s_m2" % fName] = ReducerA["%s_m2" % fName].copy()
+            continue
+        # end if
+        # pairwise update of Chan et al.
+        Delta = ReducerB["%s_mean" % fName] - ReducerA["%s_mean" % fName]
+        Reducer["%s_mean" % fName] = ReducerA["%s_mean" % fName] + \
+                                     ( Delta * ( nB / numEvents ) )
+        Reducer["%s_m2" % fName] = ReducerA["%s_m2" % fName] + \
+                                   ReducerB["%s_m2" % fName] + \
+                                   ( np.square( Delta ) * ( nA * nB / numEvents ) )
+    # end for
+    Reducer["exceed"] = ReducerA["exceed"] + ReducerB["exceed"]
+    for fName in Reducer["sketch_fields"]:
+        Reducer["%s_sketch" % fName] = ReducerA["%s_sketch" % fName] + \
+                                       ReducerB["%s_sketch" % fName]
+    # end for
+    return Reducer
+
+
+def sketchQuantiles( Reducer, fName, Quantiles ):
+    """Per-cell quantiles from a sketch.
+
+    Matches the np.quantile "lower" method within the sketch relative
+    accuracy. Quantiles that fall among the values below the smallest
+    sketch value are 0.0.
+
+    Parameters
+    ----------
+    Reducer : dict
+        From makeReducer.
+    fName : str
+        Sketched field name.
+    Quantiles : sequence
+        Quantiles in [ 0, 1 ].
+
+    Returns
+    -------
+    QGrids : np.ndarray
+        float32 ( quantiles, nRows, nCols ).
+
+    """
+    # start
+    nRows, nCols = Reducer["shape"]
+    numEvents = Reducer["n"]
+    Quantiles = np.atleast_1d( np.asarray( Quantiles, dtype=np.float64 ) )
+    QGrids = np.zeros( ( len( Quantiles ), nRows, nCols ), dtype=np.float32 )
+    if numEvents == 0:
+        return QGrids
+    # end if
+    alpha, minVal, maxVal = Reducer["sketch"]
+    logGamma, numBuckets = sketchBuckets( alpha, minVal, maxVal )
+    gamma = np.exp( logGamma )
+    RepVals = ( 2.0 * minVal * np.exp( logGamma * np.arange( numBuckets ) ) /
+                ( gamma + 1.0 ) ).astype( np.float32 )
+    Sketch = Reducer["%s_sketch" % fName]
+    for rI in range( nRows ):
+        CumCounts = np.cumsum( Sketch[rI], axis=1, dtype=np.int64 )
+        NumBelow = numEvents - CumCounts[:, -1]
+        for qI, qVal in enumerate( Quantiles ):
+            rank = np.floor( qVal * ( numEvents - 1 ) )
+            AboveRank = ( CumCounts + NumBelow[:, np.newaxis] ) > rank
+            BucketIdx = np.argmax( AboveRank, axis=1 )
+            QGrids[qI, rI] = np.where( NumBelow > rank, 0.0, RepVals[BucketIdx] )
+        # end for
+    # end for
+    return QGrids
+
+
+def hazardMaps( Reducer, Quantiles=( 0.5, 0.9, 0.99 ) ):
+    """Hazard maps from a reducer.
+
+    Parameters
+    ----------
+    Reducer : dict
+        From makeReducer.
+    Quantiles : sequence, optional
+        Quantiles for the sketched fields. The default is ( 0.5, 0.9,
+        0.99 ).
+
+    Returns
+    -------
+    MapDict : dict
+        ( nRows, nCols ) grids: "<field>_Max", "<field>_Mean", and
+        "<field>_Std" for each field, "Prob_H_gt_<threshold>" for the
+        fraction of events with water depth over each threshold, and
+        "<field>_Q<percent>" for each sketched field and quantile.
+
+    """
+    # globals
+    global STAT_FIELDS
+    # start
+    numEvents = Reducer["n"]
+    MapDict = dict()
+    for fName in STAT_FIELDS:
+        MapDict["%s_Max" % fName] = Reducer["%s_max" % fName]
+        MapDict["%s_Mean" % fName] = Reducer["%s_mean" % fName].astype( np.float32 )
+        MapDict["%s_Std" % fName] = np.sqrt( Reducer["%s_m2" % fName] /
+                                             max( numEvents - 1, 1 ) ).astype( np.float32 )
+    # end for
+    for tI, thresh in enumerate( Reducer["thresholds"] ):
+        MapDict["Prob_H_gt_%gm" % thresh] = ( Reducer["exceed"][tI] /
+                                              max( numEvents, 1 ) ).astype( np.float32 )
+    # end for
+    for fName in Reducer["sketch_fields"]:
+        QGrids = sketchQuantiles( Reducer, fName, Quantiles )
+        for qI, qVal in enumerate( Quantiles ):
+            MapDict["%s_Q%g" % ( fName, 100.0 * qVal )] = QGrids[qI]
+        # end for
+    # end for
+    return MapDict
+
+
+def saveReducer( Reducer, outFile ):
+    """Save a reducer to a .npz file.
+
+    Parameters
+    ----------
+    Reducer : dict
+        From makeReducer.
+    outFile : str
+        FQDN for the output file.
+
+    Returns
+    -------
+    None.
+
+    """
+    # start
+    SaveDict = dict( Reducer )
+    SaveDict["n"] = np.int64( Reducer["n"] )
+    SaveDict["shape"] = np.array( Reducer["shape"], dtype=np.int64 )
+    SaveDict["sketch_fields"] = np.array( Reducer["sketch_fields"], dtype=str )
+    farch.atomicSave( outFile, np.savez, **SaveDict )
+    return
+
+
+def loadReducer( inFile ):
+    """Load a reducer from a .npz file.
+
+    Parameters
+    ----------
+    inFile : str
+        FQDN for the file from saveReducer.
+
+    Returns
+    -------
+    Reducer : dict
+        Same as from makeReducer.
+
+    """
+    # start
+    with np.load( inFile ) as RF:
+        Reducer = { x : RF[x] for x in RF.files }
+    # end with
+    Reducer["n"] = int( Reducer["n"] )
+    Reducer["shape"] = tuple( int( x ) for x in Reducer["shape"] )
+    Reducer["sketch_fields"] = tuple( str( x ) for x in Reducer["sketch_fields"] )
+    return Reducer
+
+
+def mergeReducerFiles( FileList ):
+    """Merge saved reducers, like from runs of different realizations.
+
+    Parameters
+    ----------
+    FileList : list
+        FQDN for each reducer file.
+
+    Returns
+    -------
+    Reducer : dict
+        Merged reducer.
+
+    """
+    # start
+    Reducer = loadReducer( FileList[0] )
+    for inFile in FileList[1:]:
+        Reducer = mergeReducers( Reducer, loadReducer( inFile ) )
+    # end for
+    return Reducer
+
+
+def reduceArchiveEvents( archDir, EventIdx, ReducerArgs ):
+    """Reduce some events from a consolidated field archive.
+
+    Parameters
+    ----------
+    archDir : str
+        FQDN for the consolidated field archive directory.
+    EventIdx : sequence
+        Archive event indexes.
+    ReducerArgs : dict
+        Keyword arguments for makeReducer other than the grid size.
+
+    Returns
+    -------
+    Reducer : dict
+        Reducer for these events.
+
+    """
+    # start
+    ArchDict = farch.openArchive( archDir )
+    Reducer = makeReducer( len( ArchDict["Y"] ), len( ArchDict["X"] ),
+                           **ReducerArgs )
+    for eI in EventIdx:
+        updateReducer( Reducer, ArchDict["H"][eI], ArchDict["U"][eI],
+                       ArchDict["V"][eI] )
+    # end for
+    return Reducer
+
+
+def reduceArchive( archDir, EventIdx=None, numProcs=None,
+                   chunkSize=REDUCE_CHUNK, **ReducerArgs ):
+    """Reduce events from a consolidated field archive in a process pool.
+
+    Parameters
+    ----------
+    archDir : str
+        FQDN for the consolidated field archive directory.
+    EventIdx : sequence, optional
+        Archive event indexes. If None, all events. The default is None.
+    numProcs : int, optional
+        Number of worker processes. If None, the number of CPUs. If 1, no
+        pool is used. The default is None.
+    chunkSize : int, optional
+        Events per task. The default is REDUCE_CHUNK.
+    **ReducerArgs
+        Keyword arguments for makeReducer other than the grid size.
+
+    Returns
+    -------
+    Reducer : dict
+        Merged reducer for the events.
+
+    """
+    # start
+    if EventIdx is None:
+        ArchDict = farch.openArchive( archDir )
+        EventIdx = np.arange( len( ArchDict["coords"]["RealNum"] ) )
+        del ArchDict
+    # end if
+    EventIdx = np.asarray( EventIdx, dtype=np.int64 )
+    ChunkList = [ EventIdx[x:x+chunkSize] for x in
+                  range( 0, len( EventIdx ), chunkSize ) ]
+    if len( ChunkList ) == 0:
+        ChunkList = [ EventIdx ]
+    # end if
+    if numProcs is None:
+        numProcs = os.cpu_count() or 1
+    # end if
+    if ( numProcs <= 1 ) or ( len( ChunkList ) <= 1 ):
+        return reduceArchiveEvents( archDir, EventIdx, ReducerArgs )
+    # end if
+    Reducer = None
+    with ProcessPoolExecutor( max_workers=min( numProcs, len( ChunkList ) ) ) as Pool:
+        FutList = [ Pool.submit( reduceArchiveEvents, archDir, cChunk,
+                                 ReducerArgs ) for cChunk in ChunkList ]
+        for cFut in FutList:
+            if Reducer is None:
+                Reducer = cFut.result()
+            else:
+                Reducer = mergeReducers( Reducer, cFut.result() )
+            # end if
+        # end for
+    # end with
+    return Reducer
+
+
+#EOF
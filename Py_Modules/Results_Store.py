@@ -0,0 +1,692 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Results_Store
+   :platform: Windows, Linux
+   :synopsis: Long-format columnar table of building inundation results
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides a long-format, columnar results table for the building inundation
+calculations. There is one row per event and building with the event
+attributes repeated on each row. Each driver run writes one table file
+for its realization range so the table is partitioned by realization
+range and ranges can be selected without reading the other files.
+
+While a run is in progress, event rows are streamed to a directory of
+segment files. Pending rows are written as a new segment every few events
+and the stream footer, which lists the complete segments, is then
+replaced atomically. Memory use does not grow with the number of events
+and the rows from complete segments can be read while the run continues.
+At the end of a run the segments are written to the table file one at a
+time, as Parquet row groups or Feather record batches.
+
+Parquet and Feather require pyarrow. If pyarrow is not available then
+the table is written as a pandas pickle.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import glob
+import json
+import re
+import shutil
+import numpy as np
+
+# parameters
+TABLE_FMT = "R%04dto%04d_Inundation.%s"
+TABLE_EXTS = { "parquet" : "parquet", "feather" : "feather",
+               "pickle" : "pickle" }
+#   realization range from a table file name
+TABLE_RE = re.compile( r"^R(\d{4})to(\d{4})_Inundation\.(\w+)$" )
+#   building columns from processFlooding
+BUILD_COLS = [ "Row", "Column", "Topo_m", "FloorEl_m", "FloorHeight_m",
+               "WaterDepth_m", "FloodDepth_m" ]
+#   building perimeter and footprint statistics. Not in the Excel workbook.
+BUILD_STAT_COLS = [ "Perim_Max_WaterDepth_m", "Perim_Mean_WaterDepth_m",
+                    "Perim_Max_FloodDepth_m", "Perim_Mean_FloodDepth_m",
+                    "Foot_Max_WaterDepth_m", "Foot_Mean_WaterDepth_m",
+                    "Foot_Max_FloodDepth_m", "Foot_Mean_FloodDepth_m", ]
+#   streaming of event rows during a run
+STREAM_FMT = "R%04dto%04d_Stream"
+SEGMENT_FMT = "Seg_%06d.%s"
+FOOTER_FILE = "Stream_Footer.json"
+
+
+# functions
+def getTableFormat( reqFmt ):
+    """Determine the table format that can be written.
+
+    Parameters
+    ----------
+    reqFmt : str
+        Requested format, "parquet", "feather", or "pickle".
+
+    Returns
+    -------
+    useFmt : str
+        reqFmt if it is available, otherwise "pickle".
+
+    """
+    # start
+    if reqFmt in [ "parquet", "feather" ]:
+        try:
+            import pyarrow
+        except ImportError:
+            return "pickle"
+        # end try
+    # end if
+    if not reqFmt in TABLE_EXTS:
+        return "pickle"
+    # end if
+    return reqFmt
+
+
+def syncFile( inFile ):
+    """Flush a closed file to disk.
+
+    Parameters
+    ----------
+    inFile : str
+        FQDN for the file.
+
+    Returns
+    -------
+    None.
+
+    """
+    # start
+    with open( inFile, 'ab' ) as OF:
+        os.fsync( OF.fileno() )
+    # end with
+    return
+
+
+def writeTableFile( TableDF, outFile, useFmt, doFsync=False ):
+    """Write a table file atomically, through a temporary file.
+
+    Parameters
+    ----------
+    TableDF : pd.DataFrame
+        Table to write.
+    outFile : str
+        FQDN for the table file.
+    useFmt : str
+        Format from getTableFormat.
+    doFsync : bool, optional
+        Flush the file to disk before it is moved into place. The default
+        is False.
+
+    Returns
+    -------
+    None.
+
+    """
+    # start
+    tmpFile = "%s.%d.tmp" % ( outFile, os.getpid() )
+    if useFmt == "parquet":
+        TableDF.to_parquet( tmpFile, index=False )
+    elif useFmt == "feather":
+        TableDF.reset_index( drop=True ).to_feather( tmpFile )
+    else:
+        TableDF.to_pickle( tmpFile )
+    # end if
+    if doFsync:
+        syncFile( tmpFile )
+    # end if
+    os.replace( tmpFile, outFile )
+    return
+
+
+def readTableFile( tFile, columns=None ):
+    """Read a table file of any of the formats.
+
+    Parameters
+    ----------
+    tFile : str
+        FQDN for the table file.
+    columns : list, optional
+        Columns to read. If None, all columns. The default is None.
+
+    Returns
+    -------
+    TableDF : pd.DataFrame
+        Table.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    if tFile.endswith( ".parquet" ):
+        TableDF = pd.read_parquet( tFile, columns=columns )
+    elif tFile.endswith( ".feather" ):
+        TableDF = pd.read_feather( tFile, columns=columns )
+    else:
+        TableDF = pd.read_pickle( tFile )
+        if not columns is None:
+            TableDF = TableDF[columns]
+        # end if
+    # end if
+    return TableDF
+
+
+def makeLongTable( SummaryDF, FloodDFList ):
+    """Make the long-format table of building inundation by event.
+
+    Parameters
+    ----------
+    SummaryDF : pd.DataFrame
+        One row per event, in the same order as FloodDFList. Columns are
+        the event attributes with "Realization" and "Flood Num.".
+    FloodDFList : list of pd.DataFrame
+        Building inundation from processFlooding, one per event. The index
+        is the building number.
+
+    Returns
+    -------
+    LongDF : pd.DataFrame
+        One row per event and building with the event attributes and then
+        "Building" and BUILD_COLS.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global BUILD_COLS
+    # start
+    numEvents = len( FloodDFList )
+    if numEvents == 0:
+        return pd.DataFrame()
+    # end if
+    NumBuilds = np.array( [ len( x ) for x in FloodDFList ], dtype=np.int64 )
+    EvIndex = np.repeat( np.arange( numEvents, dtype=np.int64 ), NumBuilds )
+    LongDF = SummaryDF.iloc[EvIndex].reset_index( drop=True )
+    LongDF = LongDF.rename( columns={ "Flood Num." : "Flood_Num" } )
+    LongDF["Building"] = np.concatenate( [ np.asarray( x.index, dtype=np.int32 )
+                                           for x in FloodDFList ] )
+    for cCol in BUILD_COLS:
+        LongDF[cCol] = np.concatenate( [ x[cCol].to_numpy() for x in FloodDFList ] )
+    # end for
+    return LongDF
+
+
+def splitLongTable( LongDF ):
+    """Split the long-format table back into the event summary and the
+    building inundation by event.
+
+    Parameters
+    ----------
+    LongDF : pd.DataFrame
+        From makeLongTable or readResultsTable. Rows for each event must
+        be contiguous.
+
+    Returns
+    -------
+    SummaryDF : pd.DataFrame
+        One row per event with the event attribute columns and
+        "Flood Num." for the flood index. Empty, with no columns, if
+        LongDF is empty.
+    FloodDFList : list of pd.DataFrame
+        Building inundation for each event, in SummaryDF order, with
+        BUILD_COLS and the building number as the index.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global BUILD_COLS, BUILD_STAT_COLS
+    # start
+    if len( LongDF ) == 0:
+        return pd.DataFrame(), list()
+    # end if
+    EvCols = [ x for x in LongDF.columns if not x in
+               ( [ "Building" ] + BUILD_COLS + BUILD_STAT_COLS ) ]
+    EvKeys = ( LongDF["Realization"].to_numpy( dtype=np.int64 ) * 1000 ) + \
+             LongDF["Flood_Num"].to_numpy( dtype=np.int64 )
+    EvStarts = np.flatnonzero( np.r_[ True, EvKeys[1:] != EvKeys[:-1] ] )
+    EvEnds = np.r_[ EvStarts[1:], len( EvKeys ) ]
+    SummaryDF = LongDF.iloc[EvStarts][EvCols].reset_index( drop=True )
+    SummaryDF = SummaryDF.rename( columns={ "Flood_Num" : "Flood Num." } )
+    FloodDFList = list()
+    for iS, iE in zip( EvStarts, EvEnds ):
+        curDF = LongDF.iloc[iS:iE][BUILD_COLS].copy()
+        curDF.index = LongDF["Building"].to_numpy()[iS:iE]
+        FloodDFList.append( curDF )
+    # end for
+    return SummaryDF, FloodDFList
+
+
+def writeResultsTable( LongDF, tableDir, startReal, endReal, reqFmt="parquet" ):
+    """Write the long-format table for one realization range.
+
+    Parameters
+    ----------
+    LongDF : pd.DataFrame
+        From makeLongTable.
+    tableDir : str
+        FQDN for the table directory. Created if needed.
+    startReal : int
+        First realization in the range.
+    endReal : int
+        Last realization in the range.
+    reqFmt : str, optional
+        Requested format, see getTableFormat. The default is "parquet".
+
+    Returns
+    -------
+    outFile : str
+        FQDN for the table file.
+
+    """
+    # globals
+    global TABLE_FMT, TABLE_EXTS
+    # start
+    useFmt = getTableFormat( reqFmt )
+    os.makedirs( tableDir, exist_ok=True )
+    outFile = os.path.normpath( os.path.join( tableDir,
+                        TABLE_FMT % ( startReal, endReal, TABLE_EXTS[useFmt] ) ) )
+    writeTableFile( LongDF, outFile, useFmt )
+    return outFile
+
+
+def listResultsTables( tableDir, startReal=None, endReal=None ):
+    """List the table files that overlap a realization range.
+
+    Parameters
+    ----------
+    tableDir : str
+        FQDN for the table directory.
+    startReal : int, optional
+        First realization. If None, no lower limit. The default is None.
+    endReal : int, optional
+        Last realization. If None, no upper limit. The default is None.
+
+    Returns
+    -------
+    FileList : list
+        FQDN table files sorted by realization range.
+
+    """
+    # globals
+    global TABLE_RE
+    # start
+    FileList = list()
+    for tFile in sorted( glob.glob( os.path.join( tableDir, "R*_Inundation.*" ) ) ):
+        reMatch = TABLE_RE.match( os.path.basename( tFile ) )
+        if reMatch is None:
+            continue
+        # end if
+        fStart = int( reMatch.group( 1 ) )
+        fEnd = int( reMatch.group( 2 ) )
+        if ( not startReal is None ) and ( fEnd < startReal ):
+            continue
+        # end if
+        if ( not endReal is None ) and ( fStart > endReal ):
+            continue
+        # end if
+        FileList.append( tFile )
+    # end for
+    return FileList
+
+
+def readResultsTable( tableDir, startReal=None, endReal=None, columns=None ):
+    """Read the long-format table for a realization range.
+
+    Only the files for overlapping realization ranges are read.
+
+    Parameters
+    ----------
+    tableDir : str
+        FQDN for the table directory.
+    startReal : int, optional
+        First realization. If None, no lower limit. The default is None.
+    endReal : int, optional
+        Last realization. If None, no upper limit. The default is None.
+    columns : list, optional
+        Columns to read. If None, all columns. The default is None.
+
+    Returns
+    -------
+    LongDF : pd.DataFrame
+        Rows for the realization range.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    DFList = list()
+    for tFile in listResultsTables( tableDir, startReal=startReal,
+                                    endReal=endReal ):
+        DFList.append( readTableFile( tFile, columns=columns ) )
+    # end for
+    if len( DFList ) == 0:
+        return pd.DataFrame()
+    # end if
+    LongDF = pd.concat( DFList, ignore_index=True )
+    if ( "Realization" in LongDF.columns ) and \
+            ( ( not startReal is None ) or ( not endReal is None ) ):
+        lowReal = LongDF["Realization"].min() if startReal is None else startReal
+        highReal = LongDF["Realization"].max() if endReal is None else endReal
+        LongDF = LongDF[( LongDF["Realization"] >= lowReal ) &
+                        ( LongDF["Realization"] <= highReal )]
+        LongDF = LongDF.reset_index( drop=True )
+    # end if
+    return LongDF
+
+
+def writeFooter( Stream ):
+    """Atomically replace the stream footer.
+
+    Parameters
+    ----------
+    Stream : dict
+        From openStream.
+
+    Returns
+    -------
+    None.
+
+    """
+    # globals
+    global FOOTER_FILE
+    # start
+    FootDict = { "state" : Stream["state"], "format" : Stream["fmt"],
+                 "events" : Stream["events"], "rows" : Stream["rows"],
+                 "segments" : Stream["segments"], }
+    outFile = os.path.join( Stream["dir"], FOOTER_FILE )
+    tmpFile = "%s.%d.tmp" % ( outFile, os.getpid() )
+    with open( tmpFile, 'w' ) as OF:
+        json.dump( FootDict, OF, indent=1 )
+        OF.flush()
+        if Stream["fsync"]:
+            os.fsync( OF.fileno() )
+        # end if
+    # end with
+    os.replace( tmpFile, outFile )
+    return
+
+
+def openStream( streamDir, flushEvents=20, reqFmt="parquet", doFsync=True ):
+    """Start a new stream of event rows. An existing stream in streamDir
+    is removed.
+
+    Parameters
+    ----------
+    streamDir : str
+        FQDN for the stream directory.
+    flushEvents : int, optional
+        Number of events per segment. The default is 20.
+    reqFmt : str, optional
+        Requested segment format, see getTableFormat. The default is
+        "parquet".
+    doFsync : bool, optional
+        Flush each segment and footer to disk. The default is True.
+
+    Returns
+    -------
+    Stream : dict
+        Stream state for appendStream, flushStream, and closeStream.
+
+    """
+    # start
+    if os.path.isdir( streamDir ):
+        shutil.rmtree( streamDir )
+    # end if
+    os.makedirs( streamDir )
+    Stream = dict()
+    Stream["dir"] = streamDir
+    Stream["fmt"] = getTableFormat( reqFmt )
+    Stream["flush"] = max( 1, int( flushEvents ) )
+    Stream["fsync"] = doFsync
+    Stream["state"] = "open"
+    Stream["events"] = 0
+    Stream["rows"] = 0
+    Stream["segments"] = list()
+    Stream["pend"] = list()
+    Stream["pendEvents"] = 0
+    writeFooter( Stream )
+    return Stream
+
+
+def flushStream( Stream ):
+    """Write the pending event rows as a new segment and update the footer.
+
+    Parameters
+    ----------
+    Stream : dict
+        From openStream.
+
+    Returns
+    -------
+    numRows : int
+        Number of rows written.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global SEGMENT_FMT, TABLE_EXTS
+    # start
+    if len( Stream["pend"] ) == 0:
+        return 0
+    # end if
+    SegDF = pd.concat( Stream["pend"], ignore_index=True )
+    segName = SEGMENT_FMT % ( len( Stream["segments"] ) + 1,
+                              TABLE_EXTS[Stream["fmt"]] )
+    writeTableFile( SegDF, os.path.join( Stream["dir"], segName ),
+                    Stream["fmt"], doFsync=Stream["fsync"] )
+    numRows = len( SegDF )
+    numEvents = Stream["pendEvents"]
+    Stream["segments"].append( { "file" : segName, "events" : numEvents,
+                                 "rows" : numRows } )
+    Stream["events"] += numEvents
+    Stream["rows"] += numRows
+    del Stream["pend"][:]
+    Stream["pendEvents"] = 0
+    writeFooter( Stream )
+    return numRows
+
+
+def appendStream( Stream, EventDF, numEvents=1 ):
+    """Append the rows for one or more events. A segment is written every
+    flushEvents events.
+
+    Parameters
+    ----------
+    Stream : dict
+        From openStream.
+    EventDF : pd.DataFrame
+        Long-format rows, from makeLongTable or Event_Records.longFrame.
+    numEvents : int, optional
+        Number of events in EventDF. The default is 1.
+
+    Returns
+    -------
+    numRows : int
+        Number of rows written to disk by this call.
+
+    """
+    # start
+    Stream["pend"].append( EventDF )
+    Stream["pendEvents"] += numEvents
+    if Stream["pendEvents"] >= Stream["flush"]:
+        return flushStream( Stream )
+    # end if
+    return 0
+
+
+def closeStream( Stream ):
+    """Write any pending rows and mark the stream as complete.
+
+    Parameters
+    ----------
+    Stream : dict
+        From openStream.
+
+    Returns
+    -------
+    numEvents : int
+        Total number of events in the stream.
+
+    """
+    # start
+    flushStream( Stream )
+    Stream["state"] = "closed"
+    writeFooter( Stream )
+    return Stream["events"]
+
+
+def iterStream( streamDir, columns=None ):
+    """Read the complete segments of a stream one at a time.
+
+    Parameters
+    ----------
+    streamDir : str
+        FQDN for the stream directory.
+    columns : list, optional
+        Columns to read. If None, all columns. The default is None.
+
+    Yields
+    ------
+    SegDF : pd.DataFrame
+        Rows of one segment, in the order appended.
+
+    """
+    # globals
+    global FOOTER_FILE
+    # start
+    with open( os.path.join( streamDir, FOOTER_FILE ), 'r' ) as Inf:
+        FootDict = json.load( Inf )
+    # end with
+    for cSeg in FootDict["segments"]:
+        yield readTableFile( os.path.join( streamDir, cSeg["file"] ),
+                             columns=columns )
+    # end for
+
+
+def readStream( streamDir, columns=None ):
+    """Read the rows from the complete segments of a stream. Can be used
+    while the stream is still being written.
+
+    Parameters
+    ----------
+    streamDir : str
+        FQDN for the stream directory.
+    columns : list, optional
+        Columns to read. If None, all columns. The default is None.
+
+    Returns
+    -------
+    LongDF : pd.DataFrame
+        Rows in the order appended. Empty if there are no segments.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    DFList = list( iterStream( streamDir, columns=columns ) )
+    if len( DFList ) == 0:
+        return pd.DataFrame()
+    # end if
+    return pd.concat( DFList, ignore_index=True )
+
+
+def writeStreamTable( streamDir, tableDir, startReal, endReal, reqFmt="parquet" ):
+    """Write the long-format table for one realization range from the
+    complete segments of a stream.
+
+    Segments are read and written one at a time, as Parquet row groups or
+    Feather record batches, so only one segment is held in memory. A
+    pickle table cannot be appended to so the segments are concatenated
+    in memory.
+
+    Parameters
+    ----------
+    streamDir : str
+        FQDN for the stream directory.
+    tableDir : str
+        FQDN for the table directory. Created if needed.
+    startReal : int
+        First realization in the range.
+    endReal : int
+        Last realization in the range.
+    reqFmt : str, optional
+        Requested format, see getTableFormat. The default is "parquet".
+
+    Returns
+    -------
+    outFile : str
+        FQDN for the table file.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global TABLE_FMT, TABLE_EXTS
+    # start
+    useFmt = getTableFormat( reqFmt )
+    os.makedirs( tableDir, exist_ok=True )
+    outFile = os.path.normpath( os.path.join( tableDir,
+                        TABLE_FMT % ( startReal, endReal, TABLE_EXTS[useFmt] ) ) )
+    if useFmt == "pickle":
+        writeTableFile( readStream( streamDir ), outFile, useFmt )
+        return outFile
+    # end if
+    # pyarrow is available for parquet and feather
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    tmpFile = "%s.%d.tmp" % ( outFile, os.getpid() )
+    Schema = None
+    Writer = None
+    try:
+        for SegDF in iterStream( streamDir ):
+            SegTable = pa.Table.from_pandas( SegDF, schema=Schema,
+                                             preserve_index=False )
+            if Writer is None:
+                Schema = SegTable.schema
+                if useFmt == "parquet":
+                    Writer = pq.ParquetWriter( tmpFile, Schema )
+                else:
+                    Writer = pa.ipc.new_file( tmpFile, Schema,
+                                options=pa.ipc.IpcWriteOptions( compression="lz4" ) )
+                # end if
+            # end if
+            Writer.write_table( SegTable )
+        # end for
+    finally:
+        if not Writer is None:
+            Writer.close()
+        # end if
+    # end try
+    if Writer is None:
+        # no segments
+        writeTableFile( pd.DataFrame(), outFile, useFmt )
+    else:
+        os.replace( tmpFile, outFile )
+    # end if
+    return outFile
+
+
+#EOF
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Risk_Metrics
+   :platform: Windows, Linux
+   :synopsis: Expected annual damage, loss-exceedance curves, and bootstrap CIs
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides the flood risk metrics of the climate ensemble from the long
+event by building damage table, like a Results_Store long table or the
+collated building level table. The table is indexed once by
+prepareLosses into integer realization, year, event, and building codes.
+Every metric is then a grouped sum with np.bincount or a sort of the
+annual losses, so the full ensemble metrics recompute in well under a
+second when the damage costs change, like for another damage curve.
+
+Metrics are the loss by realization and by realization year, expected
+annual damage, EAD, the aggregate and occurrence loss-exceedance curves,
+return-period losses, and the average annual loss of each building.
+Realization years without an event have zero loss, so all realizations
+of the ensemble and the year span of each realization, by default the
+2024 to 2065 events catalog, are given. The events, rows, and cost
+outside the span are reported. Return-period losses
+are the np.quantile "lower" value of the annual losses, like the
+Hazard_Maps return-period depths. Confidence intervals are from a
+bootstrap over realizations. Resampled realization counts weight the
+sorted nonzero annual losses, so all replicates are computed in a few
+vectorized blocks.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import numpy as np
+
+# local modules
+import Damage_Cost as dcost
+import Hazard_Maps as hmap
+
+# parameters
+#   ( first year, last year ) of each realization, the span of the events
+#   catalog like HAZARD_YEARS in the drivers
+SIM_YEARS = ( 2024, 2065 )
+RETURN_PERIODS = ( 10, 25, 50, 100, 250, 500 )
+#   bootstrap over realizations
+NUM_BOOT = 1000
+CI_LEVEL = 0.90
+BOOT_SEED = int( 48613 )
+#   bootstrap replicates per vectorized block
+BOOT_BLOCK = 100
+#   long table columns
+REAL_COL = "Realization"
+EVENT_COL = "Flood_Num"
+DATE_COL = "Date"
+BUILD_COL = "Building"
+DEPTH_COL = "FloodDepth_m"
+COST_COL = "Cost_Estimate"
+
+
+# functions
+def prepareLosses( TableDF, RealNums, simYears=SIM_YEARS,
+                   costFunc=dcost.costCalcArray ):
+    """Index the event by building damage table for the risk metrics.
+
+    Parameters
+    ----------
+    TableDF : pd.DataFrame
+        One row per event and building with REAL_COL, EVENT_COL, DATE_COL,
+        BUILD_COL, and DEPTH_COL or COST_COL.
+    RealNums : sequence
+        All realizations of the ensemble, including those without events.
+    simYears : tuple, optional
+        ( first year, last year ) of each realization. Events outside are
+        skipped and counted. If None, the span of the event dates in
+        TableDF. The default is SIM_YEARS.
+    costFunc : callable, optional
+        Vectorized damage cost of the flood depths, used when COST_COL is
+        not in TableDF. The default is Damage_Cost.costCalcArray.
+
+    Returns
+    -------
+    Losses : dict
+        "reals", "years", and "buildings" are the sorted key values and
+        "num_years" is the number of realization years. "real_idx",
+        "year_idx", "build_idx", and "event_idx" are int64 codes for each
+        row, "event_real" and "event_year" are the codes for each event,
+        "depth" is the row flood depth, if in TableDF, and "cost" the row
+        damage cost. "excluded" is a dictionary of the "events", "rows",
+        and "cost" outside the year span.
+
+    Raises
+    ------
+    ValueError
+        If RealNums is None or empty, or TableDF has realizations that
+        are not in RealNums.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global REAL_COL, EVENT_COL, DATE_COL, BUILD_COL, DEPTH_COL, COST_COL
+    # start
+    if RealNums is None:
+        raise ValueError( "RealNums, all realizations of the ensemble, " \
+                          "is required for the number of realization years" )
+    # end if
+    Years = pd.DatetimeIndex( TableDF[DATE_COL] ).year.to_numpy().astype( np.int64 )
+    if simYears is None:
+        simYears = hmap.yearSpan( Years )
+    # end if
+    Keep = ( Years >= simYears[0] ) & ( Years <= simYears[1] )
+    if COST_COL in TableDF.columns:
+        AllCosts = TableDF[COST_COL].to_numpy().astype( np.float64 )
+    else:
+        AllCosts = costFunc( TableDF[DEPTH_COL].to_numpy().astype( np.float64 ) )
+    # end if
+    AllReals = TableDF[REAL_COL].to_numpy().astype( np.int64 )
+    RowReals = AllReals[Keep]
+    Losses = dict()
+    Losses["excluded"] = { "events" : len( dcost.groupKeys( [ AllReals[~Keep],
+                                 TableDF[EVENT_COL].to_numpy()[~Keep] ] )[0][0] ),
+                           "rows" : int( np.count_nonzero( ~Keep ) ),
+                           "cost" : float( AllCosts[~Keep].sum() ), }
+    Losses["reals"] = np.unique( np.asarray( RealNums, dtype=np.int64 ) )
+    if len( Losses["reals"] ) == 0:
+        raise ValueError( "RealNums has no realizations" )
+    # end if
+    Losses["years"] = np.arange( simYears[0], simYears[1] + 1, dtype=np.int64 )
+    Losses["num_years"] = len( Losses["reals"] ) * len( Losses["years"] )
+    Losses["real_idx"] = np.searchsorted( Losses["reals"], RowReals )
+    if np.any( Losses["real_idx"] >= len( Losses["reals"] ) ) or \
+            np.any( Losses["reals"][np.minimum( Losses["real_idx"],
+                    len( Losses["reals"] ) - 1 )] != RowReals ):
+        raise ValueError( "Table has realizations that are not in RealNums" )
+    # end if
+    Losses["year_idx"] = Years[Keep] - simYears[0]
+    BuildKeys, Losses["build_idx"] = dcost.groupKeys(
+                        [ TableDF[BUILD_COL].to_numpy()[Keep] ] )
+    Losses["buildings"] = BuildKeys[0]
+    EventKeys, Losses["event_idx"] = dcost.groupKeys(
+                        [ RowReals, TableDF[EVENT_COL].to_numpy()[Keep] ] )
+    EventRows = np.zeros( len( EventKeys[0] ), dtype=np.int64 )
+    EventRows[Losses["event_idx"]] = np.arange( len( RowReals ), dtype=np.int64 )
+    Losses["event_real"] = Losses["real_idx"][EventRows]
+    Losses["event_year"] = Losses["year_idx"][EventRows]
+    if DEPTH_COL in TableDF.columns:
+        Losses["depth"] = TableDF[DEPTH_COL].to_numpy().astype( np.float64 )[Keep]
+    # end if
+    Losses["cost"] = AllCosts[Keep]
+    return Losses
+
+
+def annualLosses( Losses, Costs=None ):
+    """Aggregate and largest event loss of each realization year.
+
+    Parameters
+    ----------
+    Losses : dict
+        From prepareLosses.
+    Costs : np.ndarray, optional
+        Row damage costs to use instead of Losses["cost"], like from
+        another damage curve. The default is None.
+
+    Returns
+    -------
+    AnnLoss : np.ndarray
+        float64 ( realizations, years ) total loss.
+    AnnMaxLoss : np.ndarray
+        float64 ( realizations, years ) largest event loss.
+
+    """
+    # start
+    if Costs is None:
+        Costs = Losses["cost"]
+    # end if
+    numReals = len( Losses["reals"] )
+    numYrs = len( Losses["years"] )
+    EventLoss = np.bincount( Losses["event_idx"], weights=Costs,
+                             minlength=len( Losses["event_real"] ) )
+    YearIdx = ( Losses["event_real"] * numYrs ) + Losses["event_year"]
+    AnnLoss = np.bincount( YearIdx, weights=EventLoss,
+                           minlength=numReals * numYrs ).reshape( numReals, numYrs )
+    AnnMaxLoss = np.zeros( numReals * numYrs, dtype=np.float64 )
+    np.maximum.at( AnnMaxLoss, YearIdx, EventLoss )
+    return AnnLoss, AnnMaxLoss.reshape( numReals, numYrs )
+
+
+def lossExceedance( AnnValues ):
+    """Empirical loss-exceedance curve.
+
+    Parameters
+    ----------
+    AnnValues : np.ndarray
+        Loss of every realization year.
+
+    Returns
+    -------
+    CurveDF : pd.DataFrame
+        "Loss", "AEP", the fraction of realization years with at least
+        this loss, and "Return_Period_yr", from the largest loss. Only
+        nonzero losses are included.
+
+    """
+    # imports
+    import pandas as pd
+    # start
+    AnnValues = np.asarray( AnnValues, dtype=np.float64 ).ravel()
+    numYears = len( AnnValues )
+    SortLoss = -np.sort( -AnnValues[AnnValues > 0.0] )
+    Ranks = np.arange( 1, len( SortLoss ) + 1, dtype=np.float64 )
+    # tied losses all get the largest rank
+    Ranks = Ranks[np.searchsorted( -SortLoss, -SortLoss, side="right" ) - 1]
+    DataDict = { "Loss" : SortLoss, "AEP" : Ranks / numYears,
+                 "Return_Period_yr" : numYears / Ranks, }
+    return pd.DataFrame( data=DataDict )
+
+
+def returnLosses( AnnValues, returnPeriods=RETURN_PERIODS ):
+    """Empirical return-period losses.
+
+    Parameters
+    ----------
+    AnnValues : np.ndarray
+        Loss of every realization year.
+    returnPeriods : sequence, optional
+        Return periods, years. The default is RETURN_PERIODS.
+
+    Returns
+    -------
+    RPLoss : np.ndarray
+        float64 np.quantile "lower" value at 1 - 1 / T for each return
+        period.
+
+    """
+    # start
+    AnnValues = np.asarray( AnnValues, dtype=np.float64 ).ravel()
+    numYears = len( AnnValues )
+    SortLoss = -np.sort( -AnnValues )
+    return np.array( [ SortLoss[hmap.maxRank( numYears, x ) - 1]
+                       for x in returnPeriods ], dtype=np.float64 )
+
+
+def bootstrapMetrics( AnnLoss, returnPeriods=RETURN_PERIODS,
+                      numBoot=NUM_BOOT, seed=BOOT_SEED, block=BOOT_BLOCK ):
+    """Bootstrap replicates of EAD and the return-period losses over
+    realizations.
+
+    Each replicate draws the realizations with replacement. The nonzero
+    annual losses are sorted once and weighted by how many times their
+    realization is drawn, so the return-period loss of a replicate is
+    where the cumulative weight reaches the rank from
+    Hazard_Maps.maxRank.
+
+    Parameters
+    ----------
+    AnnLoss : np.ndarray
+        ( realizations, years ) annual losses from annualLosses.
+    returnPeriods : sequence, optional
+        Return periods, years. The default is RETURN_PERIODS.
+    numBoot : int, optional
+        Number of replicates. The default is NUM_BOOT.
+    seed : int, optional
+        Random seed. The default is BOOT_SEED.
+    block : int, optional
+        Replicates per vectorized block. The default is BOOT_BLOCK.
+
+    Returns
+    -------
+    BootEAD : np.ndarray
+        float64 ( numBoot, ) EAD.
+    BootRP : np.ndarray
+        float64 ( numBoot, return periods ) return-period losses.
+
+    """
+    # start
+    numReals, numYrs = AnnLoss.shape
+    numYears = numReals * numYrs
+    RealTotals = AnnLoss.sum( axis=1 )
+    RealIdx, YearIdx = np.nonzero( AnnLoss > 0.0 )
+    SortOrder = np.argsort( -AnnLoss[RealIdx, YearIdx], kind="stable" )
+    SortLoss = AnnLoss[RealIdx, YearIdx][SortOrder]
+    SortReal = RealIdx[SortOrder]
+    Ranks = np.array( [ hmap.maxRank( numYears, x ) for x in returnPeriods ],
+                      dtype=np.int64 )
+    RNG = np.random.default_rng( seed )
+    BootEAD = np.empty( numBoot, dtype=np.float64 )
+    BootRP = np.zeros( ( numBoot, len( Ranks ) ), dtype=np.float64 )
+    for bStart in range( 0, numBoot, block ):
+        bEnd = min( bStart + block, numBoot )
+        Counts = RNG.multinomial( numReals, np.full( numReals, 1.0 / numReals ),
+                                  size=bEnd - bStart )
+        BootEAD[bStart:bEnd] = ( Counts @ RealTotals ) / numYears
+        if len( SortLoss ) == 0:
+            continue
+        # end if
+        CumCount = np.cumsum( Counts[:, SortReal], axis=1 )
+        for rI, rank in enumerate( Ranks ):
+            # 0.0 when fewer than rank nonzero years were drawn
+            Pos = np.argmax( CumCount >= rank, axis=1 )
+            Found = CumCount[:, -1] >= rank
+            BootRP[bStart:bEnd, rI] = np.where( Found, SortLoss[Pos], 0.0 )
+        # end for
+    # end for
+    return BootEAD, BootRP
+
+
+def buildingLosses( Losses, Costs=None ):
+    """Average annual loss of each building.
+
+    Parameters
+    ----------
+    Losses : dict
+        From prepareLosses.
+    Costs : np.ndarray, optional
+        Row damage costs to use instead of Losses["cost"]. The default is
+        None.
+
+    Returns
+    -------
+    BuildDF : pd.DataFrame
+        BUILD_COL, "AAL", "Prob_Damage", the fraction of realization years
+        with damage, and "Share_of_EAD", sorted by AAL, largest first.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global BUILD_COL
+    # start
+    if Costs is None:
+        Costs = Losses["cost"]
+    # end if
+    numBuilds = len( Losses["buildings"] )
+    numYrs = len( Losses["years"] )
+    BuildLoss = np.bincount( Losses["build_idx"], weights=Costs,
+                             minlength=numBuilds )
+    # realization years with damage for each building
+    Damaged = Costs > 0.0
+    YearKeys = ( ( Losses["build_idx"][Damaged] * len( Losses["reals"] ) +
+                   Losses["real_idx"][Damaged] ) * numYrs ) + Losses["year_idx"][Damaged]
+    DamYears = np.bincount( np.unique( YearKeys ) // ( len( Losses["reals"] ) * numYrs ),
+                            minlength=numBuilds )
+    totLoss = max( BuildLoss.sum(), np.finfo( np.float64 ).tiny )
+    DataDict = { BUILD_COL : Losses["buildings"],
+                 "AAL" : BuildLoss / Losses["num_years"],
+                 "Prob_Damage" : DamYears / Losses["num_years"],
+                 "Share_of_EAD" : BuildLoss / totLoss, }
+    BuildDF = pd.DataFrame( data=DataDict )
+    SortOrder = np.argsort( -BuildDF["AAL"].to_numpy(), kind="stable" )
+    return BuildDF.iloc[SortOrder].reset_index( drop=True )
+
+
+def riskMetrics( Losses, Costs=None, returnPeriods=RETURN_PERIODS,
+                 numBoot=NUM_BOOT, ciLevel=CI_LEVEL, seed=BOOT_SEED ):
+    """Full ensemble risk metrics.
+
+    Parameters
+    ----------
+    Losses : dict
+        From prepareLosses.
+    Costs : np.ndarray, optional
+        Row damage costs to use instead of Losses["cost"], like
+        Damage_Curves.evalCurve( Curve, Losses["depth"] ). The default is
+        None.
+    returnPeriods : sequence, optional
+        Return periods, years. The default is RETURN_PERIODS.
+    numBoot : int, optional
+        Number of bootstrap replicates. No confidence intervals if 0. The
+        default is NUM_BOOT.
+    ciLevel : float, optional
+        Confidence level. The default is CI_LEVEL.
+    seed : int, optional
+        Bootstrap random seed. The default is BOOT_SEED.
+
+    Returns
+    -------
+    Metrics : dict
+        "realizations" is the total and mean annual loss of every
+        realization, "years" the loss and largest event loss of every
+        realization year, "summary" EAD and the return-period losses with
+        confidence intervals, "aep" and "oep" the aggregate and
+        occurrence loss-exceedance curves from lossExceedance,
+        "buildings" from buildingLosses, and "excluded" the events, rows,
+        and cost outside the year span from prepareLosses.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global REAL_COL
+    # start
+    AnnLoss, AnnMaxLoss = annualLosses( Losses, Costs=Costs )
+    numReals, numYrs = AnnLoss.shape
+    Metrics = dict()
+    RealTotals = AnnLoss.sum( axis=1 )
+    Metrics["realizations"] = pd.DataFrame( data={ REAL_COL : Losses["reals"],
+                                 "Total_Loss" : RealTotals,
+                                 "Mean_Annual_Loss" : RealTotals / numYrs, } )
+    Metrics["years"] = pd.DataFrame( data={
+                            REAL_COL : np.repeat( Losses["reals"], numYrs ),
+                            "Year" : np.tile( Losses["years"], numReals ),
+                            "Annual_Loss" : AnnLoss.ravel(),
+                            "Max_Event_Loss" : AnnMaxLoss.ravel(), } )
+    MetricNames = [ "EAD" ] + [ "Loss_%dyr" % x for x in returnPeriods ]
+    Estimates = np.concatenate( [ [ AnnLoss.mean() ],
+                                  returnLosses( AnnLoss, returnPeriods ) ] )
+    DataDict = { "Metric" : MetricNames, "Estimate" : Estimates }
+    if numBoot > 0:
+        BootEAD, BootRP = bootstrapMetrics( AnnLoss, returnPeriods=returnPeriods,
+                                            numBoot=numBoot, seed=seed )
+        BootAll = np.column_stack( [ BootEAD, BootRP ] )
+        alpha = 0.5 * ( 1.0 - ciLevel )
+        DataDict["CI_Low"] = np.quantile( BootAll, alpha, axis=0 )
+        DataDict["CI_High"] = np.quantile( BootAll, 1.0 - alpha, axis=0 )
+    # end if
+    Metrics["summary"] = pd.DataFrame( data=DataDict )
+    Metrics["aep"] = lossExceedance( AnnLoss )
+    Metrics["oep"] = lossExceedance( AnnMaxLoss )
+    Metrics["buildings"] = buildingLosses( Losses, Costs=Costs )
+    Metrics["excluded"] = dict( Losses["excluded"] )
+    return Metrics
+
+
+#EOF
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Run_Staging
+   :platform: Windows, Linux
+   :synopsis: Staging of per-event run directories on RAM-backed storage
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides staging of per-event MOD_FreeSurf2D run directories under a tmpfs
+location, like /dev/shm, so that the model input files and the solver output
+grids never touch network or shared file systems. Only the retained
+artifacts, like result plots, are copied to durable storage and these
+copies are done in batches.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import shutil
+import tempfile
+
+# parameters
+#   RAM-backed locations to try, in order, when no stage root is specified.
+TMPFS_ROOTS = ( "/dev/shm", )
+STAGE_PREFIX = "FR-PRA_R%04d_Fl%02d_"
+#   tracking of staged directories that still exist. Used for clean-up
+#   at exit.
+ACTIVE_STAGE_DIRS = list()
+
+
+# functions
+def getStageRoot( reqRoot=None ):
+    """Determine the root directory for staging run directories.
+
+    Parameters
+    ----------
+    reqRoot : str, optional
+        Requested stage root. If None, the first existing and writable
+        location in TMPFS_ROOTS is used and then the system temporary
+        directory. The default is None.
+
+    Returns
+    -------
+    stageRoot : str
+        FQDN for the stage root directory.
+
+    """
+    # globals
+    global TMPFS_ROOTS
+    # start
+    if not reqRoot is None:
+        stageRoot = os.path.normpath( os.path.abspath( reqRoot ) )
+        os.makedirs( stageRoot, exist_ok=True )
+        return stageRoot
+    # end if
+    for tRoot in TMPFS_ROOTS:
+        if os.path.isdir( tRoot ) and os.access( tRoot, os.W_OK ):
+            return tRoot
+        # end if
+    # end for
+    return tempfile.gettempdir()
+
+
+def makeStageDir( stageRoot, realNum, floodNum, resultsDir ):
+    """Make a unique run directory for one event under the stage root.
+
+    Parameters
+    ----------
+    stageRoot : str
+        FQDN for the stage root directory.
+    realNum : int
+        Realization number or index.
+    floodNum : int
+        Flood number or index within this realization.
+    resultsDir : str
+        Name of the results sub-directory to create in the run directory.
+
+    Returns
+    -------
+    stageDir : str
+        FQDN for the new run directory.
+
+    """
+    # globals
+    global STAGE_PREFIX, ACTIVE_STAGE_DIRS
+    # start
+    stageDir = tempfile.mkdtemp( prefix=STAGE_PREFIX % ( realNum, floodNum ),
+                                 dir=stageRoot )
+    os.makedirs( os.path.join( stageDir, resultsDir ), exist_ok=True )
+    ACTIVE_STAGE_DIRS.append( stageDir )
+    # return
+    return stageDir
+
+
+def removeStageDir( stageDir ):
+    """Remove a staged run directory and all of its contents.
+
+    Parameters
+    ----------
+    stageDir : str
+        FQDN for the run directory.
+
+    Returns
+    -------
+    None.
+
+    """
+    # globals
+    global ACTIVE_STAGE_DIRS
+    # start
+    shutil.rmtree( stageDir, ignore_errors=True )
+    if stageDir in ACTIVE_STAGE_DIRS:
+        ACTIVE_STAGE_DIRS.remove( stageDir )
+    # end if
+    # return
+    return
+
+
+def queueRetained( PendList, stageDir, durableDir, retainPairs ):
+    """Queue retained artifacts from a staged run directory for flushing.
+
+    Parameters
+    ----------
+    PendList : list
+        Pending flush list. Each entry is [stageDir, [(src, dst), ...]].
+    stageDir : str
+        FQDN for the staged run directory.
+    durableDir : str
+        FQDN for the durable directory to receive the artifacts.
+    retainPairs : list
+        List of (source name, destination name) tuples. Source names are
+        relative to stageDir and destination names are relative to
+        durableDir. Source files that do not exist are skipped.
+
+    Returns
+    -------
+    numQueued : int
+        Number of files queued.
+
+    """
+    # start
+    copyList = list()
+    for srcName, dstName in retainPairs:
+        srcFile = os.path.normpath( os.path.join( stageDir, srcName ) )
+        if not os.path.isfile( srcFile ):
+            continue
+        # end if
+        dstFile = os.path.normpath( os.path.join( durableDir, dstName ) )
+        copyList.append( ( srcFile, dstFile ) )
+    # end for
+    PendList.append( [ stageDir, copyList ] )
+    # return
+    return len( copyList )
+
+
+def flushRetained( PendList, LogFile ):
+    """Copy all queued artifacts to durable storage and remove the
+    corresponding staged run directories.
+
+    Parameters
+    ----------
+    PendList : list
+        Pending flush list from queueRetained. Emptied on return.
+    LogFile : str
+        FQDN log file name.
+
+    Returns
+    -------
+    retStatus : int
+        0 == success, anything else is the number of failed copies.
+
+    """
+    # parameters
+    goodReturn = 0
+    # locals
+    numBad = 0
+    # start
+    for stageDir, copyList in PendList:
+        for srcFile, dstFile in copyList:
+            try:
+                shutil.copyfile( srcFile, dstFile )
+            except OSError:
+                numBad += 1
+                with open( LogFile, 'a' ) as LF:
+                    LF.write( "Error flushing staged file %s to %s !!!\n" %
+                              ( srcFile, dstFile ) )
+                # end with
+            # end try
+        # end for
+        removeStageDir( stageDir )
+    # end for
+    del PendList[:]
+    # return
+    if numBad > 0:
+        return numBad
+    # end if
+    return goodReturn
+
+
+def cleanupStaged():
+    """Remove any staged run directories that still exist. Intended to be
+    registered with atexit so that abnormal terminations do not leave
+    run directories in RAM.
+
+    Returns
+    -------
+    None.
+
+    """
+    # globals
+    global ACTIVE_STAGE_DIRS
+    # start
+    for stageDir in list( ACTIVE_STAGE_DIRS ):
+        removeStageDir( stageDir )
+    # end for
+    # return
+    return
+
+
+#EOF
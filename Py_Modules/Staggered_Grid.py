@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Staggered_Grid
+   :platform: Windows, Linux
+   :synopsis: Vectorized staggered grid face and cell utilities
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides vectorized utilities for the MOD_FreeSurf2D staggered grid.
+Water depth, H.txt, is at the NROWS x NCOLS cell centers. The x velocity,
+U.txt, and the x-face depth, Hux.txt, are at the NROWS x (NCOLS+1) x
+faces. The y velocity, V.txt, and the y-face depth, Hvy.txt, are at the
+(NROWS+1) x NCOLS y faces. All grid files are row major with one value
+per line.
+
+Face to cell and cell to face mapping is done with reshape and slice
+operations instead of loops over the cells. The 1-based node and face
+index arrays, as made in the Layout_Plots notebook, are cached by domain
+size. For large domains, cellVelocityChunks works from blocks of face
+rows so that the face arrays are never held for the whole grid.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import numpy as np
+
+# parameters
+#   cell velocities smaller in magnitude than this are set to zero
+VEL_ZERO = 0.0001
+GRAVITY = 9.81
+#   cached index arrays by ( nRows, nCols )
+INDEX_MEMO = dict()
+
+
+# functions
+def gridIndexes( nRows, nCols ):
+    """1-based node and face indexes with their rows and columns.
+
+    Parameters
+    ----------
+    nRows : int
+        Number of cell rows.
+    nCols : int
+        Number of cell columns.
+
+    Returns
+    -------
+    IndexDict : dict
+        Read-only int32 arrays, "Node", "Node_Row", "Node_Col" for the cell
+        centers, "XFace", "XFace_Row", "XFace_Col" for the x faces, and
+        "YFace", "YFace_Row", "YFace_Col" for the y faces. Cached so the
+        same arrays are returned for the same domain size.
+
+    """
+    # globals
+    global INDEX_MEMO
+    # start
+    memoKey = ( int( nRows ), int( nCols ) )
+    if memoKey in INDEX_MEMO:
+        return INDEX_MEMO[memoKey]
+    # end if
+    IndexDict = dict()
+    for cName, cRows, cCols in [ ( "Node", nRows, nCols ),
+                                 ( "XFace", nRows, nCols + 1 ),
+                                 ( "YFace", nRows + 1, nCols ) ]:
+        IndexDict[cName] = np.arange( 1, ( cRows * cCols ) + 1, dtype=np.int32 )
+        IndexDict["%s_Row" % cName] = np.repeat( np.arange( 1, cRows + 1,
+                                                 dtype=np.int32 ), cCols )
+        IndexDict["%s_Col" % cName] = np.tile( np.arange( 1, cCols + 1,
+                                               dtype=np.int32 ), cRows )
+    # end for
+    for cArray in IndexDict.values():
+        cArray.setflags( write=False )
+    # end for
+    INDEX_MEMO[memoKey] = IndexDict
+    return IndexDict
+
+
+def xFaceGrid( UFlat, nRows, nCols ):
+    """Reshape a flat x-face array, like U.txt, to ( nRows, nCols+1 ).
+
+    Parameters
+    ----------
+    UFlat : np.ndarray
+        x-face values.
+    nRows : int
+        Number of cell rows.
+    nCols : int
+        Number of cell columns.
+
+    Returns
+    -------
+    UFace : np.ndarray
+        ( nRows, nCols+1 ) view.
+
+    """
+    # start
+    return np.reshape( UFlat, ( nRows, nCols + 1 ), order='C' )
+
+
+def yFaceGrid( VFlat, nRows, nCols ):
+    """Reshape a flat y-face array, like V.txt, to ( nRows+1, nCols ).
+
+    Parameters
+    ----------
+    VFlat : np.ndarray
+        y-face values.
+    nRows : int
+        Number of cell rows.
+    nCols : int
+        Number of cell columns.
+
+    Returns
+    -------
+    VFace : np.ndarray
+        ( nRows+1, nCols ) view.
+
+    """
+    # start
+    return np.reshape( VFlat, ( nRows + 1, nCols ), order='C' )
+
+
+def xFaceToCell( UFlat, nRows, nCols ):
+    """Average x-face values to the cell centers.
+
+    Parameters
+    ----------
+    UFlat : np.ndarray
+        x-face values, flat or ( nRows, nCols+1 ).
+    nRows : int
+        Number of cell rows.
+    nCols : int
+        Number of cell columns.
+
+    Returns
+    -------
+    UCell : np.ndarray
+        ( nRows, nCols ) cell center values.
+
+    """
+    # start
+    UFace = xFaceGrid( UFlat, nRows, nCols )
+    return 0.5 * ( UFace[:, :-1] + UFace[:, 1:] )
+
+
+def yFaceToCell( VFlat, nRows, nCols ):
+    """Average y-face values to the cell centers.
+
+    Parameters
+    ----------
+    VFlat : np.ndarray
+        y-face values, flat or ( nRows+1, nCols ).
+    nRows : int
+        Number of cell rows.
+    nCols : int
+        Number of cell columns.
+
+    Returns
+    -------
+    VCell : np.ndarray
+        ( nRows, nCols ) cell center values.
+
+    """
+    # start
+    VFace = yFaceGrid( VFlat, nRows, nCols )
+    return 0.5 * ( VFace[:-1, :] + VFace[1:, :] )
+
+
+def cellToXFace( Cell ):
+    """Average cell center values to the x faces. Boundary faces take the
+    value of the adjacent cell.
+
+    Parameters
+    ----------
+    Cell : np.ndarray
+        ( nRows, nCols ) cell center values.
+
+    Returns
+    -------
+    UFace : np.ndarray
+        ( nRows, nCols+1 ) x-face values.
+
+    """
+    # start
+    nRows, nCols = Cell.shape
+    UFace = np.empty( ( nRows, nCols + 1 ), dtype=Cell.dtype )
+    UFace[:, 1:-1] = 0.5 * ( Cell[:, :-1] + Cell[:, 1:] )
+    UFace[:, 0] = Cell[:, 0]
+    UFace[:, -1] = Cell[:, -1]
+    return UFace
+
+
+def cellToYFace( Cell ):
+    """Average cell center values to the y faces. Boundary faces take the
+    value of the adjacent cell.
+
+    Parameters
+    ----------
+    Cell : np.ndarray
+        ( nRows, nCols ) cell center values.
+
+    Returns
+    -------
+    VFace : np.ndarray
+        ( nRows+1, nCols ) y-face values.
+
+    """
+    # start
+    nRows, nCols = Cell.shape
+    VFace = np.empty( ( nRows + 1, nCols ), dtype=Cell.dtype )
+    VFace[1:-1, :] = 0.5 * ( Cell[:-1, :] + Cell[1:, :] )
+    VFace[0, :] = Cell[0, :]
+    VFace[-1, :] = Cell[-1, :]
+    return VFace
+
+
+def maskByDepth( Vel, HFace, depthCutoff ):
+    """Zero face velocities where the face depth is at or below a cutoff.
+
+    Parameters
+    ----------
+    Vel : np.ndarray
+        Face velocities, like U.txt.
+    HFace : np.ndarray
+        Face depths with the same shape, like Hux.txt.
+    depthCutoff : float
+        Depth, m, at or below which the face is dry.
+
+    Returns
+    -------
+    MaskVel : np.ndarray
+        Velocities with dry faces set to 0.0.
+
+    """
+    # start
+    return np.where( HFace <= depthCutoff, 0.0, Vel )
+
+
+def cellVelocities( UFlat, HuxFlat, VFlat, HvyFlat, nRows, nCols,
+                    depthCutoff, velZero=VEL_ZERO ):
+    """Cell center velocities from the solver face velocities and depths.
+
+    Dry faces are masked, face velocities are averaged to the cells, and
+    cell velocities smaller in magnitude than velZero are set to zero.
+
+    Parameters
+    ----------
+    UFlat : np.ndarray
+        x-face velocities, U.txt.
+    HuxFlat : np.ndarray
+        x-face depths, Hux.txt.
+    VFlat : np.ndarray
+        y-face velocities, V.txt.
+    HvyFlat : np.ndarray
+        y-face depths, Hvy.txt.
+    nRows : int
+        Number of cell rows.
+    nCols : int
+        Number of cell columns.
+    depthCutoff : float
+        Depth, m, at or below which a face is dry.
+    velZero : float, optional
+        Magnitude below which cell velocities are zero. The default is
+        VEL_ZERO.
+
+    Returns
+    -------
+    UCell : np.ndarray
+        ( nRows, nCols ) x velocity.
+    VCell : np.ndarray
+        ( nRows, nCols ) y velocity.
+
+    """
+    # start
+    UCell = xFaceToCell( maskByDepth( UFlat, HuxFlat, depthCutoff ), nRows, nCols )
+    VCell = yFaceToCell( maskByDepth( VFlat, HvyFlat, depthCutoff ), nRows, nCols )
+    UCell = np.where( np.abs( UCell ) < velZero, 0.0, UCell )
+    VCell = np.where( np.abs( VCell ) < velZero, 0.0, VCell )
+    return UCell, VCell
+
+
+def rowChunks( nRows, chunkRows=None ):
+    """Row ranges for processing a grid in blocks of rows.
+
+    Parameters
+    ----------
+    nRows : int
+        Number of rows.
+    chunkRows : int, optional
+        Rows per block. If None, one block. The default is None.
+
+    Returns
+    -------
+    RowRanges : list
+        ( first row, last row + 1 ) 0-based for each block.
+
+    """
+    # start
+    if ( chunkRows is None ) or ( chunkRows >= nRows ):
+        return [ ( 0, nRows ) ]
+    # end if
+    return [ ( r0, min( r0 + chunkRows, nRows ) ) for r0 in
+             range( 0, nRows, chunkRows ) ]
+
+
+def cellVelocityChunks( URows, HuxRows, VRows, HvyRows, nRows, nCols,
+                        depthCutoff, velZero=VEL_ZERO, UOut=None, VOut=None ):
+    """Cell center velocities from blocks of face rows.
+
+    Same values as cellVelocities, but the face arrays are consumed one
+    block of rows at a time, like from Grid_IO.iterGridRows, so that only
+    the cell velocities are held for the whole grid. The y-face blocks
+    can have any number of rows; the last face row of each block is
+    carried to the next.
+
+    Parameters
+    ----------
+    URows : iterable
+        ( rows, nCols+1 ) blocks of x-face velocities, U.txt.
+    HuxRows : iterable
+        x-face depth blocks, Hux.txt, with the same rows as URows.
+    VRows : iterable
+        ( rows, nCols ) blocks of y-face velocities, V.txt.
+    HvyRows : iterable
+        y-face depth blocks, Hvy.txt, with the same rows as VRows.
+    nRows : int
+        Number of cell rows.
+    nCols : int
+        Number of cell columns.
+    depthCutoff : float
+        Depth, m, at or below which a face is dry.
+    velZero : float, optional
+        Magnitude below which cell velocities are zero. The default is
+        VEL_ZERO.
+    UOut : np.ndarray, optional
+        ( nRows, nCols ) output for the x velocity, which can be memory
+        mapped. If None, allocated. The default is None.
+    VOut : np.ndarray, optional
+        ( nRows, nCols ) output for the y velocity. The default is None.
+
+    Returns
+    -------
+    UCell : np.ndarray
+        ( nRows, nCols ) x velocity.
+    VCell : np.ndarray
+        ( nRows, nCols ) y velocity.
+
+    Raises
+    ------
+    ValueError
+        If the blocks do not have the number of face rows for the grid.
+
+    """
+    # start
+    r0 = 0
+    for UBlock, HBlock in zip( URows, HuxRows ):
+        MaskBlock = maskByDepth( UBlock, HBlock, depthCutoff )
+        CellBlock = 0.5 * ( MaskBlock[:, :-1] + MaskBlock[:, 1:] )
+        if UOut is None:
+            UOut = np.empty( ( nRows, nCols ), dtype=CellBlock.dtype )
+        # end if
+        r1 = r0 + CellBlock.shape[0]
+        if r1 > nRows:
+            r0 = r1
+            break
+        # end if
+        UOut[r0:r1] = np.where( np.abs( CellBlock ) < velZero, 0.0, CellBlock )
+        r0 = r1
+    # end for
+    if r0 != nRows:
+        raise ValueError( "x-face rows do not match %d cell rows" % nRows )
+    # end if
+    r0 = 0
+    PrevRow = None
+    for VBlock, HBlock in zip( VRows, HvyRows ):
+        MaskBlock = maskByDepth( VBlock, HBlock, depthCutoff )
+        if not PrevRow is None:
+            MaskBlock = np.concatenate( [ PrevRow, MaskBlock ], axis=0 )
+        # end if
+        PrevRow = MaskBlock[-1:]
+        CellBlock = 0.5 * ( MaskBlock[:-1, :] + MaskBlock[1:, :] )
+        if VOut is None:
+            VOut = np.empty( ( nRows, nCols ), dtype=CellBlock.dtype )
+        # end if
+        r1 = r0 + CellBlock.shape[0]
+        if r1 > nRows:
+            r0 = r1
+            break
+        # end if
+        VOut[r0:r1] = np.where( np.abs( CellBlock ) < velZero, 0.0, CellBlock )
+        r0 = r1
+    # end for
+    if r0 != nRows:
+        raise ValueError( "y-face rows do not match %d cell rows" % nRows )
+    # end if
+    return UOut, VOut
+
+
+def velocityMagnitude( U, V ):
+    """Velocity magnitude.
+
+    Parameters
+    ----------
+    U : np.ndarray
+        x velocity.
+    V : np.ndarray
+        y velocity, same shape as U.
+
+    Returns
+    -------
+    VMag : np.ndarray
+        Magnitude.
+
+    """
+    # start
+    return np.hypot( U, V )
+
+
+def froudeNumber( U, V, H, depthCutoff=0.0, gravity=GRAVITY ):
+    """Froude number at the cell centers.
+
+    Parameters
+    ----------
+    U : np.ndarray
+        x velocity.
+    V : np.ndarray
+        y velocity, same shape as U.
+    H : np.ndarray
+        Water depth, m, same shape as U.
+    depthCutoff : float, optional
+        Depth at or below which the cell is dry and the Froude number is
+        0.0. The default is 0.0.
+    gravity : float, optional
+        Gravitational acceleration, m/s2. The default is GRAVITY.
+
+    Returns
+    -------
+    Froude : np.ndarray
+        Froude number.
+
+    """
+    # start
+    Wet = H > depthCutoff
+    Celerity = np.sqrt( gravity * np.where( Wet, H, 1.0 ) )
+    return np.where( Wet, velocityMagnitude( U, V ) / Celerity, 0.0 )
+
+
+#EOF
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: Weather_Ingest
+   :platform: Windows, Linux
+   :synopsis: Parallel ingest of synthetic weather realizations to the events store
+
+.. moduleauthor:: Nick Martin <nick.martin@alumni.stanford.edu>
+
+Provides the ingest of the synthetic Frio weather realizations into the
+indexed events store of Events_Cache. Each realization pickle,
+Frio_R%d_DF.pickle, is read in a worker process, only the daily
+precipitation is kept, and the threshold filter and discharge scaling
+are applied as vectorized operations in the worker. The events are
+returned in realization order so that the store matches the Events sheet
+made by Process_Synthetic_Frio.ipynb.
+
+Can be run from the command line, see parseArgs.
+
+"""
+# Copyright and License
+"""
+Copyright 2024 Vodanube LLC
+
+Module Author: Nick Martin <nick.martin@alumni.stanford.edu>
+
+This file is part of a Flood Risk PRA example study, hereafter Flood Risk PRA.
+
+Flood Risk PRA is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Flood Risk PRA is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with Flood Risk PRA.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# imports
+import os
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# local modules
+import Events_Cache as evc
+
+# parameters
+FILE_TEMP = "Frio_R%d_DF.pickle"
+#   24-hour event depths and base discharge from Process_Synthetic_Frio
+NEW_25YR = 236.0
+EST_25YR_DISCHARGE = 180.0
+PRECIP_COL = "Precip_mm"
+STORE_NAME = "All_Events_Summary-Processed"
+
+
+# functions
+def ingestRealization( inDir, realNum, threshold=NEW_25YR,
+                       baseDischarge=EST_25YR_DISCHARGE, baseDepth=NEW_25YR ):
+    """Extract the events for one realization.
+
+    Parameters
+    ----------
+    inDir : str
+        FQDN for the directory with the realization pickles.
+    realNum : int
+        Realization number.
+    threshold : float, optional
+        Minimum 24-hour precipitation depth, mm, for an event. The default
+        is NEW_25YR.
+    baseDischarge : float, optional
+        Discharge, cms, for the base event. Event discharge is
+        precipitation depth times baseDischarge / baseDepth, like
+        Event_Extraction.ratioScaling. The default is EST_25YR_DISCHARGE.
+    baseDepth : float, optional
+        Precipitation depth, mm, for the base event. The default is
+        NEW_25YR.
+
+    Returns
+    -------
+    Events : np.ndarray
+        Events_Cache.EVENTS_DTYPE records in date order. RowIndex is 0.
+
+    """
+    # imports
+    import pandas as pd
+    # globals
+    global FILE_TEMP, PRECIP_COL
+    # start
+    InFiler = os.path.normpath( os.path.join( inDir, FILE_TEMP % realNum ) )
+    PrecipSer = pd.read_pickle( InFiler, compression='zip' )[PRECIP_COL]
+    Precip = PrecipSer.to_numpy()
+    EvMask = Precip >= threshold
+    EvPrecip = Precip[EvMask]
+    Events = np.zeros( len( EvPrecip ), dtype=evc.EVENTS_DTYPE )
+    Events["RealNum"] = realNum
+    Events["DateTime"] = PrecipSer.index.to_numpy()[EvMask].astype( "datetime64[s]" )
+    Events["Precip_mm"] = EvPrecip
+    # same operation order and precision as the notebook
+    Events["Discharge_cms"] = EvPrecip * ( baseDischarge / baseDepth )
+    return Events
+
+
+def ingestRealizations( inDir, RealNums, threshold=NEW_25YR,
+                        baseDischarge=EST_25YR_DISCHARGE, baseDepth=NEW_25YR,
+                        numProcs=None ):
+    """Extract the events for many realizations in a process pool.
+
+    Parameters
+    ----------
+    inDir : str
+        FQDN for the directory with the realization pickles.
+    RealNums : list
+        Realization numbers.
+    threshold : float, optional
+        Minimum 24-hour precipitation depth, mm. The default is NEW_25YR.
+    baseDischarge : float, optional
+        Discharge, cms, for the base event. The default is
+        EST_25YR_DISCHARGE.
+    baseDepth : float, optional
+        Precipitation depth, mm, for the base event. The default is
+        NEW_25YR.
+    numProcs : int, optional
+        Number of worker processes. If None, the number of CPUs. If 1, no
+        pool is used. The default is None.
+
+    Returns
+    -------
+    Events : np.ndarray
+        Events_Cache.EVENTS_DTYPE records in realization and then date
+        order with RowIndex numbered from 0.
+
+    """
+    # start
+    RealNums = list( RealNums )
+    numReal = len( RealNums )
+    if numProcs is None:
+        numProcs = os.cpu_count() or 1
+    # end if
+    if ( numProcs <= 1 ) or ( numReal <= 1 ):
+        EventList = [ ingestRealization( inDir, rR, threshold=threshold,
+                                         baseDischarge=baseDischarge,
+                                         baseDepth=baseDepth )
+                      for rR in RealNums ]
+    else:
+        with ProcessPoolExecutor( max_workers=numProcs ) as Pool:
+            EventList = list( Pool.map( ingestRealization,
+                                        [ inDir ] * numReal, RealNums,
+                                        [ threshold ] * numReal,
+                                        [ baseDischarge ] * numReal,
+                                        [ baseDepth ] * numReal,
+                                        chunksize=max( 1, numReal // ( 4 * numProcs ) ) ) )
+        # end with
+    # end if
+    if numReal == 0:
+        return np.zeros( 0, dtype=evc.EVENTS_DTYPE )
+    # end if
+    Events = np.concatenate( EventList )
+    Events["RowIndex"] = np.arange( len( Events ), dtype=np.int64 )
+    return Events
+
+
+def ingestToStore( inDir, outDir, RealNums, threshold=NEW_25YR,
+                   baseDischarge=EST_25YR_DISCHARGE, baseDepth=NEW_25YR,
+                   numProcs=None, storeName=STORE_NAME ):
+    """Ingest realizations and write the indexed events store.
+
+    The store is marked with Events_Cache.INGEST_KEY, so that
+    Events_Cache.openEventsCache uses it as is, even when a workbook with
+    the same base name is in outDir.
+
+    Parameters
+    ----------
+    inDir : str
+        FQDN for the directory with the realization pickles.
+    outDir : str
+        FQDN for the store directory.
+    RealNums : list
+        Realization numbers.
+    threshold : float, optional
+        Minimum 24-hour precipitation depth, mm. The default is NEW_25YR.
+    baseDischarge : float, optional
+        Discharge, cms, for the base event. The default is
+        EST_25YR_DISCHARGE.
+    baseDepth : float, optional
+        Precipitation depth, mm, for the base event. The default is
+        NEW_25YR.
+    numProcs : int, optional
+        Number of worker processes. The default is None.
+    storeName : str, optional
+        Store base name, the workbook name without extension that the
+        branch scripts use. The default is STORE_NAME.
+
+    Returns
+    -------
+    Events : np.ndarray
+        Events_Cache.EVENTS_DTYPE records written to the store.
+
+    """
+    # start
+    Events = ingestRealizations( inDir, RealNums, threshold=threshold,
+                                 baseDischarge=baseDischarge,
+                                 baseDepth=baseDepth, numProcs=numProcs )
+    cacheFile, indexFile = evc.cacheFileNames( os.path.join( outDir,
+                                               storeName + ".xlsx" ) )
+    evc.saveEventsStore( Events, cacheFile, indexFile, srcKey=evc.INGEST_KEY )
+    return Events
+
+
+def parseArgs( argList ):
+    """Parse the command line.
+
+    Parameters
+    ----------
+    argList : list
+        Command line arguments without the script name.
+
+    Returns
+    -------
+    CmdArgs : argparse.Namespace
+        Parsed arguments.
+
+    """
+    # imports
+    import argparse
+    # start
+    Parser = argparse.ArgumentParser( description="Ingest synthetic Frio " \
+                                      "weather realizations to the events store" )
+    Parser.add_argument( "in_dir", help="directory with the realization pickles" )
+    Parser.add_argument( "--out-dir", dest="out_dir", default=".",
+                         help="store directory, default current directory" )
+    Parser.add_argument( "--start", type=int, default=1,
+                         help="first realization, default 1" )
+    Parser.add_argument( "--end", type=int, default=1000,
+                         help="last realization, default 1000" )
+    Parser.add_argument( "--threshold", type=float, default=NEW_25YR,
+                         help="event precipitation depth, mm, default %g" % NEW_25YR )
+    Parser.add_argument( "--base-discharge", dest="base_discharge",
+                         type=float, default=EST_25YR_DISCHARGE,
+                         help="discharge for the base event depth, cms, " \
+                              "default %g" % EST_25YR_DISCHARGE )
+    Parser.add_argument( "--base-depth", dest="base_depth",
+                         type=float, default=NEW_25YR,
+                         help="base event precipitation depth, mm, " \
+                              "default %g" % NEW_25YR )
+    Parser.add_argument( "--procs", type=int, default=None,
+                         help="worker processes, default number of CPUs" )
+    Parser.add_argument( "--name", default=STORE_NAME,
+                         help="store base name, default %s" % STORE_NAME )
+    CmdArgs = Parser.parse_args( argList )
+    return CmdArgs
+
+
+#standalone execution block
+if __name__ == "__main__":
+    CmdArgs = parseArgs( sys.argv[1:] )
+    AllEvents = ingestToStore( CmdArgs.in_dir, os.path.abspath( CmdArgs.out_dir ),
+                               range( CmdArgs.start, CmdArgs.end + 1 ),
+                               threshold=CmdArgs.threshold,
+                               baseDischarge=CmdArgs.base_discharge,
+                               baseDepth=CmdArgs.base_depth,
+                               numProcs=CmdArgs.procs,
+                               storeName=CmdArgs.name )
+    print( "Ingested %d events from realizations %d to %d" %
+           ( len( AllEvents ), CmdArgs.start, CmdArgs.end ) )
+    # done
+
+#EOF